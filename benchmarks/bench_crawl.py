@@ -0,0 +1,58 @@
+"""
+Index discovery against a local mock forum server: a full crawl of every index page at
+several worker counts, then an incremental crawl that stops at the first up-to-date page.
+
+Usage: python benchmarks/bench_crawl.py [--pages N] [--per-page N] [--latency S]
+"""
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir
+DATA_DIR = use_scratch_data_dir()
+
+from contextlib import redirect_stdout
+from cli_args import pop_option
+from benchmarks.mock_server import MockForumServer
+import index_crawler
+
+SECTION = "politics"
+
+def crawl(server, workers, is_current=None):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        found = index_crawler.crawl_index([SECTION], workers=workers, rate=0, is_current=is_current,
+                                          base_url=f"{server.base_url}/boardforum")
+    return found, time.perf_counter() - start
+
+def run(pages, per_page, latency):
+    total = pages * per_page
+    print(f"{pages} index pages x {per_page} threads, {latency * 1000:.0f}ms latency")
+    print(f"{'mode':<12} {'workers':>7} {'seconds':>8} {'pages':>6} {'threads':>8}")
+    for workers in (1, 4, 8):
+        with MockForumServer(latency=latency, index_pages=pages, per_page=per_page) as server:
+            found, elapsed = crawl(server, workers)
+        assert sorted(found) == list(range(1, total + 1)), "full crawl missed threads"
+        print(f"{'full':<12} {workers:>7} {elapsed:>8.2f} {server.requests:>6} {len(found):>8}")
+
+    # Everything below the third page is already in the archive
+    newest_current = total - 3 * per_page
+    def is_current(page):
+        return all(thread_id <= newest_current for thread_id in page)
+
+    with MockForumServer(latency=latency, index_pages=pages, per_page=per_page) as server:
+        found, elapsed = crawl(server, 4, is_current)
+    assert set(range(newest_current + 1, total + 1)) <= set(found), "incremental crawl missed new threads"
+    print(f"{'incremental':<12} {4:>7} {elapsed:>8.2f} {server.requests:>6} {len(found):>8}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--pages", int, 40),
+            pop_option(args, "--per-page", int, 50),
+            pop_option(args, "--latency", float, 0.05))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,148 @@
+"""
+sync_board.py --daemon against the local mock forum server, driven from a second thread:
+the initial sync, the poll interval backing off while the board is quiet, a burst of new
+posts (time until they are archived, interval reset), failing index requests, periodic
+maintenance, and a SIGTERM that stops the daemon after its current poll. A quiet daemon
+poll, with its warm session and connection, is compared with a one-shot no-op sync
+started from scratch as cron would.
+
+Usage: python benchmarks/bench_daemon.py [--threads N] [--posts N] [--min-interval S] [--max-interval S]
+"""
+import io
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import ROOT, use_scratch_data_dir
+from benchmarks.mock_server import MockForumServer
+
+DATA_DIR = use_scratch_data_dir()
+SERVER = MockForumServer()
+os.environ["TUI_APP_FORUM_URL"] = SERVER.base_url
+
+from cli_args import pop_option
+from config import FORUM_DB_PATH, LOGS_DIR
+from sync_daemon import SyncDaemon
+
+HEALTH_PATH = os.path.join(LOGS_DIR, "sync_daemon.json")
+
+def post_count():
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+    finally:
+        conn.close()
+
+def wait_for(condition, timeout, step=0.02):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not reached")
+        time.sleep(step)
+
+def cold_sync_ms(repeat=3):
+    """Wall time of a no-op `python sync_board.py` in a fresh interpreter."""
+    code = "import sys, sync_board; sys.argv = ['sync_board.py']; sync_board.main()"
+    walls = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                             check=True).stdout
+        walls.append(time.perf_counter() - start)
+        assert "No new or updated threads" in out, out
+    return statistics.median(walls) * 1000
+
+def drive(daemon, thread_count, posts, results):
+    """The scenario, run beside the daemon; results are checked once it has stopped."""
+    health = daemon.health
+    start = time.perf_counter()
+    wait_for(lambda: health["threads_synced"] >= thread_count and health["status"] == "idle", 120)
+    results["initial"] = time.perf_counter() - start
+    assert post_count() == thread_count * posts
+
+    # Quiet board: the interval should climb to the maximum, then stay there
+    intervals, quiet_polls = [], []
+    polls = health["polls"]
+    while health["interval"] < daemon.max_interval or len(intervals) < 2:
+        wait_for(lambda: health["polls"] > polls, 30)
+        polls = health["polls"]
+        intervals.append(health["interval"])
+        quiet_polls.append(health["last_poll_seconds"])
+    results["intervals"] = intervals
+    results["quiet_poll_ms"] = statistics.median(quiet_polls) * 1000
+
+    # New posts in every thread
+    SERVER.posts = posts + 5
+    changed_at = time.perf_counter()
+    wait_for(lambda: post_count() == thread_count * (posts + 5), 120)
+    results["archived_after"] = time.perf_counter() - changed_at
+    wait_for(lambda: health["status"] == "idle", 30)
+    results["interval_after_change"] = health["interval"]
+
+    # Failing index requests count as errors and back off like a quiet poll
+    daemon.fetcher.retries = 0
+    SERVER.error_rate = 1.0
+    errors = health["errors"]
+    wait_for(lambda: health["errors"] >= errors + 2, 30)
+    SERVER.error_rate = 0.0
+    wait_for(lambda: health["consecutive_errors"] == 0 and health["status"] == "idle", 30)
+    results["errors"] = health["errors"] - errors
+
+    wait_for(lambda: health["maintenance_runs"] >= 1, 30)
+    results["stop_requested"] = time.perf_counter()
+    os.kill(os.getpid(), signal.SIGTERM)
+
+def run(thread_count, posts, min_interval, max_interval):
+    SERVER.per_page = thread_count
+    SERVER.posts = posts
+    daemon = SyncDaemon(workers=4, rate=0, min_interval=min_interval, max_interval=max_interval, backoff=2.0,
+                        maintenance_interval=1.0, health_path=HEALTH_PATH)
+    results = {}
+    driver = threading.Thread(target=drive, args=(daemon, thread_count, posts, results), daemon=True)
+    driver.start()
+    with redirect_stdout(io.StringIO()):
+        daemon.run()
+    stopped = time.perf_counter()
+    driver.join(5)
+    assert "stop_requested" in results, "the daemon stopped before the scenario finished"
+
+    with open(HEALTH_PATH, encoding="utf-8") as f:
+        health = json.load(f)
+    assert health["status"] == "stopped", health["status"]
+    assert results["intervals"][-1] == max_interval and results["interval_after_change"] == min_interval
+    assert not any(c["busy"] for c in health["checkpoints"].values()), health["checkpoints"]
+
+    print(f"{thread_count} threads x {posts} posts, polling every {min_interval:g}-{max_interval:g}s")
+    print(f"initial sync:            {results['initial']:.2f}s")
+    print(f"quiet board intervals:   {' → '.join(f'{i:g}' for i in results['intervals'])}s")
+    print(f"new posts archived in:   {results['archived_after']:.2f}s (interval then reset to "
+          f"{results['interval_after_change']:g}s)")
+    print(f"failing index requests:  {results['errors']} errors recorded, recovered")
+    print(f"maintenance:             {health['maintenance_runs']} runs, checkpointed "
+          f"{', '.join(health['checkpoints'])}")
+    print(f"SIGTERM to exit:         {stopped - results['stop_requested']:.2f}s, health status {health['status']!r}")
+    print(f"quiet poll:              {results['quiet_poll_ms']:.1f}ms warm daemon vs "
+          f"{cold_sync_ms():.0f}ms one-shot sync_board.py")
+    print("[✓] Daemon synced, backed off, recovered and shut down cleanly")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    SERVER.start()
+    try:
+        run(pop_option(args, "--threads", int, 20),
+            pop_option(args, "--posts", int, 10),
+            pop_option(args, "--min-interval", float, 0.1),
+            pop_option(args, "--max-interval", float, 0.8))
+    finally:
+        SERVER.stop()
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
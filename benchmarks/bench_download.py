@@ -0,0 +1,48 @@
+"""
+Download throughput against a local mock forum server.
+
+Usage: python benchmarks/bench_download.py [--threads N] [--latency S] [--error-rate F]
+"""
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, reset_raw_store
+DATA_DIR = use_scratch_data_dir()
+
+from cli_args import pop_option
+from benchmarks.mock_server import MockForumServer
+import http_client
+from fetcher import thread_downloader
+
+# (workers, requests/sec); 0 disables the rate limit
+SCENARIOS = [(1, 1.0), (1, 0), (4, 0), (8, 0), (16, 0)]
+
+def run(thread_count, latency, error_rate):
+    thread_ids = list(range(1, thread_count + 1))
+    http_client.DOWNLOAD_BACKOFF = 0.05  # keep injected-503 retries from dominating the timing
+    print(f"{'workers':>7} {'rate':>6} {'seconds':>8} {'threads/s':>9} {'peak conns':>10} {'503s':>5}")
+    for workers, rate in SCENARIOS:
+        if rate and thread_count / rate > 60:
+            continue  # the polite default would take minutes; skip on large runs
+        reset_raw_store()
+        with MockForumServer(latency=latency, error_rate=error_rate) as server:
+            start = time.perf_counter()
+            results = thread_downloader.download_threads(
+                thread_ids, workers=workers, rate=rate, base_url=f"{server.base_url}/boardthread")
+            elapsed = time.perf_counter() - start
+        assert all(results.values()), "some downloads failed"
+        print(f"{workers:>7} {rate or '-':>6} {elapsed:>8.2f} {thread_count / elapsed:>9.1f} "
+              f"{server.max_in_flight:>10} {server.errors:>5}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 40),
+            pop_option(args, "--latency", float, 0.05),
+            pop_option(args, "--error-rate", float, 0.0))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,169 @@
+"""
+exporter.py on a synthetic forum.db (500k posts by default): each format against reading
+the posts into Python dicts in one go, with time and peak Python memory; an incremental
+export after more posts arrive; and an export running while another connection keeps
+inserting, with that writer's commit latency. The JSONL output is read back and compared
+with the database.
+
+Usage: python benchmarks/bench_export.py [--threads N] [--posts N] [--chunk N]
+"""
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, synthetic_posts
+DATA_DIR = use_scratch_data_dir()
+
+from cli_args import pop_option
+from config import FORUM_DB_PATH, EXPORT_DIR
+from migrations import migrate
+import exporter
+
+INSERT_SQL = """
+    INSERT INTO posts (post_id, thread_id, thread_title, poster, tag, raw_timestamp, iso_timestamp, content)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def add_threads(conn, rng, thread_ids, posts):
+    with conn:
+        for thread_id in thread_ids:
+            conn.executemany(INSERT_SQL, [
+                (p["post_id"], thread_id, f"Thread {thread_id}", p["poster"], p["tag"], p["raw_timestamp"],
+                 p["iso_timestamp"], p["content"]) for p in synthetic_posts(rng, thread_id, posts)])
+
+def read_all():
+    """The naive snapshot: every post as a dict in one list."""
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(exporter.COLUMNS)} FROM posts ORDER BY id")
+        return len([dict(zip(exporter.COLUMNS, row)) for row in cursor.fetchall()])
+    finally:
+        conn.close()
+
+def measure(func):
+    """(result, seconds, peak traced bytes); memory is traced on a second, untimed run."""
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rows = func()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return rows, elapsed, peak
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def jsonl_rows(fmt_dir):
+    rows = {}
+    for root, _, names in os.walk(fmt_dir):
+        for name in names:
+            with gzip.open(os.path.join(root, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    post = json.loads(line)
+                    rows[post["id"]] = tuple(post[column] for column in exporter.COLUMNS)
+    return rows
+
+def check_round_trip():
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        expected = {row[0]: row for row in conn.execute(f"SELECT {', '.join(exporter.COLUMNS)} FROM posts")}
+    finally:
+        conn.close()
+    exported = jsonl_rows(os.path.join(EXPORT_DIR, "jsonl"))
+    assert exported == expected, f"{len(exported)} posts exported, {len(expected)} in the database"
+
+def concurrent_writer(rng, next_thread, posts, chunk):
+    """Exports everything again while another connection inserts a thread every few milliseconds."""
+    latencies, stop = [], threading.Event()
+    def write():
+        conn = sqlite3.connect(FORUM_DB_PATH, timeout=60)
+        thread_id = next_thread
+        while not stop.is_set():
+            start = time.perf_counter()
+            add_threads(conn, rng, [thread_id], posts)
+            latencies.append(time.perf_counter() - start)
+            thread_id += 1
+            time.sleep(0.005)
+        conn.close()
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            rows = exporter.export("jsonl", partition="year", chunk_rows=chunk, full=True)
+            elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        writer.join()
+    return rows, elapsed, latencies
+
+def run(thread_count, posts, chunk):
+    rng = random.Random(0)
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    migrate(conn)
+    conn.execute("PRAGMA journal_mode=WAL")
+    add_threads(conn, rng, range(1, thread_count + 1), posts)
+    total = thread_count * posts
+    print(f"{thread_count} threads x {posts} posts = {total} rows, chunks of {chunk}")
+
+    print(f"{'export':<16} {'seconds':>8} {'rows/s':>9} {'peak MB':>8} {'size MB':>8}")
+    rows, elapsed, peak = measure(read_all)
+    print(f"{'read_all':<16} {elapsed:>8.2f} {rows / elapsed:>9.0f} {peak / 2**20:>8.1f} {'-':>8}")
+    formats = [fmt for fmt in exporter.FORMATS if fmt != "parquet" or exporter.pyarrow is not None]
+    for fmt in formats:
+        for partition in ("year", "thread"):
+            rows, elapsed, peak = measure(lambda: exporter.export(fmt, partition=partition, chunk_rows=chunk,
+                                                                  full=True))
+            assert rows == total, f"{fmt}: {rows} posts exported, expected {total}"
+            size = directory_size(os.path.join(EXPORT_DIR, fmt))
+            print(f"{fmt + '/' + partition:<16} {elapsed:>8.2f} {rows / elapsed:>9.0f} {peak / 2**20:>8.1f} "
+                  f"{size / 2**20:>8.1f}")
+    if exporter.pyarrow is None:
+        print("(parquet skipped: pyarrow is not installed)")
+
+    # jsonl was last exported by thread range; start it over by year for what follows
+    with redirect_stdout(io.StringIO()):
+        exporter.export("jsonl", partition="year", chunk_rows=chunk, full=True)
+    added = max(1, thread_count // 100)
+    add_threads(conn, rng, range(thread_count + 1, thread_count + added + 1), posts)
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rows = exporter.export("jsonl", partition="year", chunk_rows=chunk)
+        elapsed = time.perf_counter() - start
+    assert rows == added * posts, f"incremental export wrote {rows} posts, expected {added * posts}"
+    check_round_trip()
+    print(f"incremental: {rows} new posts exported in {elapsed:.3f}s; JSONL matches the database")
+
+    conn.close()
+    rows, elapsed, latencies = concurrent_writer(rng, thread_count + added + 1, posts, chunk)
+    latencies.sort()
+    print(f"while {len(latencies)} threads were inserted concurrently: exported {rows} posts in {elapsed:.2f}s; "
+          f"writer insert p50 {statistics.median(latencies) * 1000:.1f}ms, "
+          f"max {latencies[-1] * 1000:.1f}ms")
+    with redirect_stdout(io.StringIO()):
+        exporter.export("jsonl", partition="year", chunk_rows=chunk)
+    check_round_trip()
+    print("[✓] Export after the writer stopped picked up the rest; JSONL matches the database")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 5000),
+            pop_option(args, "--posts", int, 100),
+            pop_option(args, "--chunk", int, 50000))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
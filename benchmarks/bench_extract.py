@@ -0,0 +1,133 @@
+"""
+extract_posts before/after: the original per-post re-parse against the single-pass
+extractor, on large synthetic threads. Fails if the two disagree on any post.
+
+Usage: python benchmarks/bench_extract.py [--posts N] [--threads N]
+"""
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir
+DATA_DIR = use_scratch_data_dir()
+
+from contextlib import redirect_stdout
+from bs4 import BeautifulSoup
+from cli_args import pop_option
+from benchmarks.corpus import thread_html, ANCHOR
+from formatter.html_parser import extract_posts
+from utils.timestamp_utils import infer_year
+
+# Cells that exercise the cleanup rules: links inside and around the timestamp, anchors
+# without href, comments, scripts, entities and nested markup.
+EDGE_CELLS = [
+    '<font>Mon May 19 10:00:00</font> plain',
+    '<font size="1">Mon May 19 10:00:00 <a href="x">in font</a></font><br>after',
+    '<a href="http://a"><font>Mon May 19 10:00:00</font> wrapped</a> tail',
+    '<font>Mon May 19 10:00:00</font><a name="top">no href</a><a href="">empty</a><a href="u"> spaced  label </a>',
+    '<font>Mon May 19 10:00:00</font><!-- hidden --><script>var x = 1;</script>text &amp; &lt;b&gt; &nbsp;x',
+    '<font>Mon May 19 10:00:00</font><a href="o">outer <a href="i">inner</a> end</a>',
+    '<font>Mon May 19 10:00:00</font><blockquote><font>quoted font</font><br>q</blockquote> <i> </i>',
+    '<p><font>Mon May 19 10:00:00</font></p><ul><li>one</li><li><a href="l">two</a></li></ul>',
+]
+
+def legacy_extract_posts(soup, thread_id):
+    """extract_posts as it was before the single-pass extractor."""
+    posts = []
+
+    full_text = soup.get_text()
+    anchor_match = re.search(r"The current time is (\w{3}) (\w{3}) (\d{1,2}) (\d{2}:\d{2}:\d{2}) (\d{4})", full_text)
+    if not anchor_match:
+        print(f"[!] Could not find anchor timestamp in thread {thread_id}")
+        return posts
+
+    anchor = datetime.strptime(" ".join(anchor_match.groups()[1:]), "%b %d %H:%M:%S %Y")
+
+    for row in soup.find_all("tr"):
+        tds = row.find_all("td")
+        if len(tds) != 2:
+            continue
+        if not tds[0].get_text(strip=True):
+            continue
+        if not tds[1].find("font"):
+            continue
+
+        try:
+            username_lines = list(tds[0].stripped_strings)
+            username = username_lines[0].lower()
+            member_tag = username_lines[1] if len(username_lines) > 1 else "Unknown"
+
+            raw_timestamp = tds[1].find("font").get_text(strip=True)
+            dow, rest = raw_timestamp.split(" ", 1)
+            iso_timestamp = infer_year(anchor, dow, rest).isoformat()
+
+            content_td = tds[1].decode_contents()
+            soup_block = BeautifulSoup(content_td, 'html.parser')
+            font_tag = soup_block.find("font")
+            if font_tag:
+                font_tag.extract()
+
+            for a in soup_block.find_all('a'):
+                href = a.get('href')
+                label = a.get_text(strip=True)
+                if href:
+                    a.replace_with(f"[{label}]({href})")
+
+            content = soup_block.get_text(separator="\n", strip=True)
+
+            posts.append({
+                "thread_id": thread_id,
+                "username": username,
+                "member_tag": member_tag,
+                "raw_timestamp": raw_timestamp,
+                "iso_timestamp": iso_timestamp,
+                "content": content
+            })
+
+        except Exception as e:
+            print(f"[!] Error parsing post in thread {thread_id}: {e}")
+            continue
+
+    return posts
+
+def edge_case_html():
+    rows = "".join(f"<tr><td><b>user{i}</b><br>Member</td><td>{cell}</td></tr>" for i, cell in enumerate(EDGE_CELLS))
+    return (f"<html><body><table>{rows}</table>"
+            f"<p>The current time is {ANCHOR.strftime('%a %b %d %H:%M:%S %Y')}</p></body></html>")
+
+def check_equivalence(pages):
+    for thread_id, html in pages:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            old = legacy_extract_posts(BeautifulSoup(html, "html.parser"), thread_id)
+            new = extract_posts(BeautifulSoup(html, "html.parser"), thread_id)
+        assert old == new, f"thread {thread_id}: single-pass output differs from the legacy extractor"
+
+def timed(extract, soups):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        total = sum(len(extract(soup, thread_id)) for thread_id, soup in soups)
+    return time.perf_counter() - start, total
+
+def run(posts, thread_count):
+    pages = [(thread_id, thread_html(thread_id, posts)) for thread_id in range(1, thread_count + 1)]
+    check_equivalence(pages + [(0, edge_case_html())])
+    print("single-pass output identical to legacy extractor")
+
+    soups = [(thread_id, BeautifulSoup(html, "html.parser")) for thread_id, html in pages]
+    legacy_time, total = timed(legacy_extract_posts, soups)
+    new_time, _ = timed(extract_posts, soups)
+    print(f"{thread_count} threads x {posts} posts ({total} posts)")
+    print(f"legacy      {legacy_time:>7.2f}s {total / legacy_time:>9.0f} posts/s")
+    print(f"single-pass {new_time:>7.2f}s {total / new_time:>9.0f} posts/s  ({legacy_time / new_time:.1f}x)")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--posts", int, 2000), pop_option(args, "--threads", int, 3))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,118 @@
+"""
+batch_insert on a synthetic corpus (1M posts by default). Modes: the original path
+(text_phrased re-read, per-post execute, a commit per thread), the per-thread mode
+(--no-bulk), both on the rollback journal forum.db had before it was always WAL, and bulk
+mode (WAL, executemany, several threads per transaction), with and without search index
+maintenance. All but the first read the parser's JSON handoff.
+
+Usage: python benchmarks/bench_insert.py [--threads N] [--posts N] [--threads-per-txn N]
+"""
+import os
+import random
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, synthetic_posts, write_text_phrased
+DATA_DIR = use_scratch_data_dir()
+
+import sqlite3
+from contextlib import redirect_stdout
+from cli_args import pop_option
+from inserter import db_inserter
+from handoff import write_handoff, read_handoff
+from migrations import migrate
+
+LEGACY_INSERT_SQL = """
+    INSERT OR IGNORE INTO posts (
+        post_id, thread_id, thread_title, poster, tag,
+        raw_timestamp, iso_timestamp, content
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def rollback_journal_connect():
+    """connect_db as it was before forum.db was always WAL."""
+    os.makedirs(os.path.dirname(db_inserter.DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(db_inserter.DB_PATH, timeout=60)
+    migrate(conn)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    return conn
+
+def legacy_insert(thread_ids):
+    """The original write path: one execute per post, one commit per thread, rollback journal."""
+    conn = rollback_journal_connect()
+    for thread_id in thread_ids:
+        file_path = os.path.join(db_inserter.TEXT_PHRASED_DIR, f"thread_{thread_id}.txt")
+        title, posts = db_inserter.read_text_phrased(file_path, thread_id)
+        cursor = conn.cursor()
+        for post in posts:
+            cursor.execute(LEGACY_INSERT_SQL, (
+                post["post_id"], post["thread_id"], title, post["poster"], post["tag"],
+                post["raw_timestamp"], post["iso_timestamp"], post["content"]))
+        conn.commit()
+    conn.close()
+
+def per_thread_insert(thread_ids):
+    """batch_insert --no-bulk on a rollback journal connection."""
+    conn = rollback_journal_connect()
+    try:
+        db_inserter.batch_insert(thread_ids, bulk=False, conn=conn)
+    finally:
+        conn.close()
+
+def reset_db():
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(db_inserter.DB_PATH + suffix):
+            os.remove(db_inserter.DB_PATH + suffix)
+
+def run(thread_count, posts, threads_per_txn):
+    rng = random.Random(0)
+    thread_ids = list(range(1, thread_count + 1))
+    for thread_id in thread_ids:
+        thread_posts = synthetic_posts(rng, thread_id, posts)
+        write_text_phrased(db_inserter.TEXT_PHRASED_DIR, thread_id, f"Thread {thread_id}", thread_posts)
+        write_handoff({"thread_id": thread_id, "thread_title": f"Thread {thread_id}",
+                       "content_hash": None, "posts": thread_posts})
+    total = thread_count * posts
+
+    # Time the reads alone so the SQLite share of each mode is visible
+    start = time.perf_counter()
+    for thread_id in thread_ids:
+        db_inserter.read_text_phrased(os.path.join(db_inserter.TEXT_PHRASED_DIR, f"thread_{thread_id}.txt"), thread_id)
+    text_read_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for thread_id in thread_ids:
+        read_handoff(thread_id)
+    json_read_time = time.perf_counter() - start
+
+    modes = [
+        ("legacy", text_read_time, lambda: legacy_insert(thread_ids)),
+        ("per-thread", json_read_time, lambda: per_thread_insert(thread_ids)),
+        ("bulk", json_read_time, lambda: db_inserter.batch_insert(thread_ids, bulk=True, threads_per_txn=threads_per_txn)),
+        ("bulk+fts", json_read_time, lambda: db_inserter.batch_insert(thread_ids, bulk=True, threads_per_txn=threads_per_txn)),
+    ]
+    print(f"{thread_count} threads x {posts} posts = {total} rows")
+    print(f"reading alone: text_phrased {text_read_time:.2f}s, JSON handoff {json_read_time:.2f}s")
+    print(f"{'mode':<11} {'seconds':>8} {'rows/s':>9} {'sqlite s':>8}")
+    for name, read_time, insert in modes:
+        reset_db()
+        db_inserter.FTS_SYNC_ON_INSERT = name.endswith("+fts")
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            insert()
+        elapsed = time.perf_counter() - start
+        with sqlite3.connect(db_inserter.DB_PATH) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        assert count == total, f"{name}: expected {total} rows, found {count}"
+        print(f"{name:<11} {elapsed:>8.2f} {total / elapsed:>9.0f} {max(0.0, elapsed - read_time):>8.2f}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 2000),
+            pop_option(args, "--posts", int, 500),
+            pop_option(args, "--threads-per-txn", int, db_inserter.INSERT_THREADS_PER_TXN))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,117 @@
+"""
+Instrumentation cost and coverage. Times a timed() stage with metrics off and on against
+the undecorated function, parses a corpus both ways, then runs the whole pipeline against
+the mock server with metrics on (parse workers included) and checks that the counters add
+up: posts parsed = rows inserted = posts served. A second run over --processes workers checks
+that the helper processes' metrics reach the parent's report.
+
+Usage: python benchmarks/bench_metrics.py [--threads N] [--posts N] [--jobs N] [--processes N] [--calls N]
+"""
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, write_corpus
+DATA_DIR = use_scratch_data_dir()
+
+from cli_args import pop_option
+from benchmarks.mock_server import MockForumServer
+from config import LOGS_DIR
+from formatter import html_parser
+from pipeline import run_pipeline
+import fetch_state
+import metrics
+
+def noop(x):
+    return x
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e9
+
+def parse_seconds(thread_ids):
+    html_parser.PARSE_CACHE = False  # both runs parse every page
+    fetch_state.get_store().conn.execute("UPDATE fetch_state SET parsed_hash = NULL")
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        html_parser.batch_parse(thread_ids, jobs=1)
+    return time.perf_counter() - start
+
+def run(thread_count, posts, jobs, processes, calls):
+    timed_noop = metrics.timed("bench")(noop)
+    plain = per_call_ns(noop, calls)
+    off = per_call_ns(timed_noop, calls)
+    thread_ids = list(range(1, thread_count + 1))
+    write_corpus(thread_ids, posts)
+    parse_off = parse_seconds(thread_ids)
+
+    metrics.enable()
+    on = per_call_ns(timed_noop, calls)
+    parse_on = parse_seconds(thread_ids)
+    metrics.drain()
+
+    print(f"{'':<16} {'ns/call':>8} {'parse s':>8}")
+    print(f"{'undecorated':<16} {plain:>8.0f} {'':>8}")
+    print(f"{'metrics off':<16} {off:>8.0f} {parse_off:>8.3f}")
+    print(f"{'metrics on':<16} {on:>8.0f} {parse_on:>8.3f}")
+    print(f"disabled overhead: {off - plain:.0f} ns per timed call, "
+          f"{(off - plain) * 1e-9 * thread_count * (posts + 1) / parse_off * 100:.4f}% of the parse")
+
+    # End to end, with the insert stage profiled and parse pool workers merged back
+    metrics._profile_stages.add("insert")
+    new_ids = [thread_id + thread_count for thread_id in thread_ids]
+    with MockForumServer(posts=posts) as server, redirect_stdout(io.StringIO()):
+        run_pipeline(new_ids, workers=4, rate=0, jobs=jobs, base_url=f"{server.base_url}/boardthread")
+    counters = metrics.report()["counters"]
+    histograms = metrics.report()["histograms"]
+    expected = len(new_ids) * posts
+    assert counters["parse.posts"] == expected, counters
+    assert counters["insert.rows"] == expected, counters
+    assert counters["download.bytes"] > 0, counters
+    assert histograms["parse.seconds"]["count"] == len(new_ids), histograms["parse.seconds"]
+    assert histograms["download.seconds"]["count"] == len(new_ids), histograms["download.seconds"]
+
+    report_path = metrics.write_report(os.path.join(LOGS_DIR, "metrics.json"))
+    prom_path = metrics.write_prometheus(os.path.join(LOGS_DIR, "metrics.prom"))
+    profiles = metrics.write_profiles(LOGS_DIR)
+    with open(report_path) as f:
+        assert json.load(f)["counters"] == counters
+    with open(prom_path) as f:
+        assert f"tui_insert_rows_total {expected}" in f.read()
+    assert profiles, "no profile written"
+    metrics.print_summary()
+    print(f"\npipeline: {len(new_ids)} threads x {posts} posts, {jobs} parse jobs; "
+          f"counters consistent, report, Prometheus file and {len(profiles)} profile written")
+
+    # Small batches so every --processes worker claims some of the threads
+    metrics.drain()
+    more_ids = [thread_id + 2 * thread_count for thread_id in thread_ids]
+    with MockForumServer(posts=posts) as server, redirect_stdout(io.StringIO()):
+        run_pipeline(more_ids, workers=4, rate=0, jobs=1, processes=processes, batch_size=5,
+                     base_url=f"{server.base_url}/boardthread")
+    counters = metrics.report()["counters"]
+    histograms = metrics.report()["histograms"]
+    expected = len(more_ids) * posts
+    assert counters["parse.posts"] == expected, counters
+    assert counters["insert.rows"] == expected, counters
+    assert histograms["download.seconds"]["count"] == len(more_ids), histograms["download.seconds"]
+    print(f"pipeline --processes {processes}: counters cover all {len(more_ids)} threads")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 40),
+            pop_option(args, "--posts", int, 50),
+            pop_option(args, "--jobs", int, 2),
+            pop_option(args, "--processes", int, 3),
+            pop_option(args, "--calls", int, 200000))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,58 @@
+"""
+Serial vs process-pool batch_parse on a synthetic corpus. Also checks that every
+worker count writes byte-identical handoff output.
+
+Usage: python benchmarks/bench_parse.py [--threads N] [--posts N] [--jobs N]
+"""
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, write_corpus
+DATA_DIR = use_scratch_data_dir()
+
+from contextlib import redirect_stdout
+from cli_args import pop_option
+from formatter import html_parser
+from handoff import PARSED_DIR
+
+def snapshot(directory):
+    result = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as f:
+            result[name] = f.read()
+    return result
+
+def run(thread_count, posts, max_jobs):
+    thread_ids = list(range(1, thread_count + 1))
+    write_corpus(thread_ids, posts)
+    html_parser.FORCE_PARSE = True  # every run parses from scratch
+    html_parser.PARSE_CACHE = False
+
+    baseline = None
+    serial_time = None
+    print(f"{'jobs':>4} {'seconds':>8} {'threads/s':>9} {'speedup':>7} identical")
+    for jobs in sorted({1, 2, max_jobs}):
+        shutil.rmtree(PARSED_DIR, ignore_errors=True)
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            html_parser.batch_parse(thread_ids, jobs=jobs)
+        elapsed = time.perf_counter() - start
+        output = snapshot(PARSED_DIR)
+        if baseline is None:
+            baseline, serial_time = output, elapsed
+        print(f"{jobs:>4} {elapsed:>8.2f} {thread_count / elapsed:>9.1f} "
+              f"{serial_time / elapsed:>6.2f}x {output == baseline}")
+        assert output == baseline, f"--jobs {jobs} output differs from serial"
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 200),
+            pop_option(args, "--posts", int, 100),
+            pop_option(args, "--jobs", int, os.cpu_count() or 2))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,135 @@
+"""
+The parse cache on a synthetic corpus: a FORCE_PARSE rerun with and without it, a rerun
+after a few threads changed, after only their "The current time is" footers moved (same
+content_hash, different post years), a PARSER_VERSION bump, and a cache small enough to evict.
+Every cached run must write handoffs byte-identical to an uncached parse.
+
+Usage: python benchmarks/bench_parse_cache.py [--threads N] [--posts N] [--changed N]
+"""
+import io
+import os
+import shutil
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, write_corpus
+DATA_DIR = use_scratch_data_dir()
+
+from cli_args import pop_option
+from config import PARSE_CACHE_DB_PATH
+from fetch_state import ANCHOR_PATTERN, content_hash
+from formatter import html_parser
+from handoff import PARSED_DIR
+from raw_store import get_raw_store
+import metrics
+import parse_cache
+
+def snapshot(directory):
+    result = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as f:
+            result[name] = f.read()
+    return result
+
+def parse(thread_ids, force=True, cache=True):
+    """(seconds, counters, handoffs) of one batch_parse of `thread_ids`."""
+    html_parser.FORCE_PARSE = force
+    html_parser.PARSE_CACHE = cache
+    metrics.drain()
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        html_parser.batch_parse(thread_ids, jobs=1)
+    elapsed = time.perf_counter() - start
+    return elapsed, metrics.drain()[0], snapshot(PARSED_DIR)
+
+def row(label, elapsed, counters, reference):
+    hits, misses = counters.get("parse.cache_hit", 0), counters.get("parse.cache_miss", 0)
+    parsed = counters.get("parse.full", 0)
+    print(f"{label:<28} {elapsed:>8.3f} {parsed:>6} {hits:>6} {misses:>6} {reference / elapsed:>7.1f}x")
+
+def run(thread_count, posts, changed):
+    thread_ids = list(range(1, thread_count + 1))
+    write_corpus(thread_ids, posts)
+    metrics.enable()
+    print(f"{thread_count} threads x {posts} posts, --jobs 1")
+    print(f"{'run':<28} {'seconds':>8} {'parsed':>6} {'hits':>6} {'misses':>6} {'speedup':>8}")
+
+    uncached, counters, baseline = parse(thread_ids, cache=False)
+    row("FORCE_PARSE, no cache", uncached, counters, uncached)
+    elapsed, counters, output = parse(thread_ids)
+    row("FORCE_PARSE, cold cache", elapsed, counters, uncached)
+    assert output == baseline and counters["parse.cache_miss"] == thread_count, counters
+    elapsed, counters, output = parse(thread_ids)
+    row("FORCE_PARSE, warm cache", elapsed, counters, uncached)
+    assert output == baseline, "handoffs from the cache differ from a fresh parse"
+    assert counters["parse.cache_hit"] == thread_count, counters
+
+    # A few threads gain posts; only those miss
+    grown = thread_ids[:changed]
+    write_corpus(grown, posts + 3)
+    elapsed, counters, output = parse(thread_ids)
+    row(f"{changed} threads changed", elapsed, counters, uncached)
+    assert counters["parse.cache_miss"] == changed and counters["parse.cache_hit"] == thread_count - changed
+    _, _, reference = parse(thread_ids, cache=False)
+    assert output == reference, "handoffs differ from a fresh parse after the change"
+
+    # Only the "The current time is" footer moves: content_hash is unchanged, but post years
+    # are inferred from that footer, so these threads must miss and match a fresh parse
+    moved = thread_ids[changed:2 * changed]
+    store = get_raw_store()
+    for thread_id in moved:
+        html = store.read(thread_id)
+        footer = ANCHOR_PATTERN.sub("The current time is Wed Jan 03 09:15:00 2031", html)
+        assert content_hash(footer) == content_hash(html)
+        store.put(thread_id, footer)
+    elapsed, counters, output = parse(thread_ids)
+    row(f"{changed} footers moved", elapsed, counters, uncached)
+    assert counters["parse.cache_miss"] == changed, counters
+    _, _, footer_reference = parse(thread_ids, cache=False)
+    assert output == footer_reference, "a cache hit ignored the page's anchor time"
+    assert any(output[f"thread_{t}.json"] != reference[f"thread_{t}.json"] for t in moved), \
+        "moving the footer changed no post years; pick another anchor"
+    reference = footer_reference
+
+    # Without FORCE_PARSE nothing is parsed; after a version bump everything is, from scratch
+    elapsed, counters, _ = parse(thread_ids, force=False)
+    assert counters.get("parse.skipped") == thread_count, counters
+    html_parser.PARSER_VERSION += 1
+    elapsed, counters, output = parse(thread_ids, force=False)
+    row("PARSER_VERSION bumped", elapsed, counters, uncached)
+    assert counters["parse.full"] == thread_count and counters["parse.cache_miss"] == thread_count, counters
+    assert output == reference
+    cache = parse_cache.get_parse_cache()
+    versions = {version: (entries, stored) for version, entries, stored in cache.stats()}
+    entries, stored = versions[html_parser.PARSER_VERSION]
+    handoff_bytes = sum(len(data) for data in output.values())
+    print(f"cache: {entries} threads, {stored / 2**20:.2f} MB per parser version "
+          f"({handoff_bytes / stored:.1f}x smaller than the handoffs)")
+
+    # A cache with room for about a third of the threads keeps itself under its limit
+    limit_mb = stored / 3 / 2**20
+    cache.max_bytes = int(limit_mb * 2**20)
+    cache.trim(html_parser.PARSER_VERSION)
+    _, counters, output = parse(thread_ids)
+    after = {version: (entries, stored) for version, entries, stored in cache.stats()}
+    kept, kept_bytes = after[html_parser.PARSER_VERSION]
+    assert kept_bytes <= cache.max_bytes and len(after) == 1, after
+    assert output == reference
+    # The threads parsed last were used most recently and are still cached
+    _, counters, _ = parse(thread_ids[-kept // 2:])
+    assert counters["parse.cache_hit"] == len(thread_ids[-kept // 2:]), counters
+    print(f"limit {limit_mb:.2f} MB: {kept} threads, {kept_bytes / 2**20:.2f} MB kept, "
+          f"old version and least recently used entries evicted")
+    print(f"[✓] Cached handoffs match a fresh parse; {os.path.basename(PARSE_CACHE_DB_PATH)} stays within its limit")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 300),
+            pop_option(args, "--posts", int, 50),
+            pop_option(args, "--changed", int, 10))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
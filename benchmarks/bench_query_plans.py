@@ -0,0 +1,73 @@
+"""
+EXPLAIN QUERY PLAN for every queries.py query, the keyset-paged variants included, on a
+scratch forum.db built by migrate(): once empty and once filled with synthetic posts and
+ANALYZEd, since the planner can choose differently once it has statistics. Exits non-zero
+if any plan scans a table or index or sorts in a temporary b-tree.
+
+Usage: python benchmarks/bench_query_plans.py [--threads N] [--posts N]
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, synthetic_posts
+DATA_DIR = use_scratch_data_dir()
+
+from cli_args import pop_option
+from config import FORUM_DB_PATH
+from migrations import migrate
+from queries import check_query_plans
+
+INSERT_SQL = """
+    INSERT INTO posts (post_id, thread_id, thread_title, poster, tag, raw_timestamp, iso_timestamp, content, poster_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, (SELECT poster_id FROM posters WHERE name = ?))
+"""
+
+def fill(conn, thread_count, posts):
+    rng = random.Random(0)
+    with conn:
+        for thread_id in range(1, thread_count + 1):
+            rows = synthetic_posts(rng, thread_id, posts)
+            conn.executemany("INSERT OR IGNORE INTO posters (name) VALUES (?)", {(p["poster"],) for p in rows})
+            conn.executemany(INSERT_SQL, [
+                (p["post_id"], thread_id, f"Thread {thread_id}", p["poster"], p["tag"], p["raw_timestamp"],
+                 p["iso_timestamp"], p["content"], p["poster"]) for p in rows])
+    conn.execute("ANALYZE")
+
+def report(label, conn):
+    """Prints each query's plan; returns the names of the queries with a problem."""
+    print(f"{label}:")
+    failed = []
+    for name, (plan, problems) in check_query_plans(conn).items():
+        print(f"  {'FAIL' if problems else 'ok  '} {name}: {' | '.join(plan)}")
+        if problems:
+            failed.append(name)
+    return failed
+
+def run(thread_count, posts):
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        migrate(conn)
+        failed = report("empty database", conn)
+        fill(conn, thread_count, posts)
+        failed += report(f"{thread_count} threads x {posts} posts, analyzed", conn)
+    finally:
+        conn.close()
+    if failed:
+        print(f"[!] Scans or temporary sorts in: {', '.join(sorted(set(failed)))}")
+        return False
+    print("[✓] Every query is an index search")
+    return True
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        ok = run(pop_option(args, "--threads", int, 500),
+                 pop_option(args, "--posts", int, 50))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
+    sys.exit(0 if ok else 1)
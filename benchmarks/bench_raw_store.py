@@ -0,0 +1,68 @@
+"""
+Raw HTML storage: html_raw/ files against the compressed pack. Compares bytes on disk,
+write and read time, and checks that every page reads back unchanged.
+
+Usage: python benchmarks/bench_raw_store.py [--threads N] [--posts N]
+"""
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir
+DATA_DIR = use_scratch_data_dir()
+
+from benchmarks.corpus import thread_html
+from cli_args import pop_option
+from config import HTML_RAW_DIR, RAW_DB_PATH
+from raw_store import FileRawStore, PackRawStore
+
+def disk_usage(*paths):
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+def run(thread_count, posts):
+    pages = {thread_id: thread_html(thread_id, posts) for thread_id in range(1, thread_count + 1)}
+    raw_bytes = sum(len(html.encode("utf-8")) for html in pages.values())
+    print(f"{thread_count} threads x {posts} posts, {raw_bytes / 1e6:.1f} MB of HTML")
+    print(f"{'store':<6} {'MB on disk':>10} {'write s':>8} {'read s':>7}")
+
+    stores = {
+        "files": (FileRawStore(), [HTML_RAW_DIR]),
+        "pack": (PackRawStore(fallback_dir=None), [RAW_DB_PATH, RAW_DB_PATH + "-wal"]),
+    }
+    for name, (store, paths) in stores.items():
+        start = time.perf_counter()
+        for thread_id, html in pages.items():
+            store.put(thread_id, html)
+        write_time = time.perf_counter() - start
+        if name == "pack":
+            store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        start = time.perf_counter()
+        for thread_id, html in pages.items():
+            assert store.read(thread_id) == html, f"{name}: thread {thread_id} did not round-trip"
+        read_time = time.perf_counter() - start
+        print(f"{name:<6} {disk_usage(*paths) / 1e6:>10.1f} {write_time:>8.2f} {read_time:>7.2f}")
+
+    # A refetch with nothing new adds no snapshot; a changed page adds one
+    pack = stores["pack"][0]
+    assert pack.put(1, pages[1]) is None
+    assert pack.put(1, thread_html(1, posts + 1)) is not None
+    assert len(pack.versions(1)) == 2
+    pack.close()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 500),
+            pop_option(args, "--posts", int, 100))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
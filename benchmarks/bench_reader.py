@@ -0,0 +1,263 @@
+"""
+Readers against forum.db while db_inserter.batch_insert loads a backfill in another process:
+  - before: rollback journal, per-thread commits (--no-bulk), every reader thread on its own
+    plain connection running the queries.py functions;
+  - after: WAL, bulk inserts, the reader threads sharing one reader.ForumReader (pooled
+    read-only connections, keyset pages, cached hot pages invalidated by each commit).
+Reader latency (p50 / p99 / max), `database is locked` errors and the writer's time are
+compared. Then keyset pages against OFFSET at increasing depth, and checks that paging
+returns every post exactly once and that the cache never serves a page from before a commit.
+
+Usage: python benchmarks/bench_reader.py [--threads N] [--posts N] [--backfill N] [--readers N]
+"""
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, close_stores, synthetic_posts
+DATA_DIR = use_scratch_data_dir()
+
+from cli_args import pop_option
+from config import FORUM_DB_PATH
+from handoff import write_handoff
+from inserter import db_inserter
+from migrations import migrate
+from reader import ForumReader
+from search import rebuild_fts
+import queries
+
+BASE_DB_PATH = os.path.join(DATA_DIR, "base.db")
+HOT_THREADS = 20
+PAGE = 25
+THINK = 0.002  # pause between one reader's requests
+
+INSERT_SQL = """
+    INSERT INTO posts (post_id, thread_id, thread_title, poster, tag, raw_timestamp, iso_timestamp, content, poster_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, (SELECT poster_id FROM posters WHERE name = ?))
+"""
+
+def build_base(thread_count, posts):
+    """forum.db with `thread_count` threads, indexed for search, kept aside as base.db."""
+    rng = random.Random(0)
+    conn = sqlite3.connect(BASE_DB_PATH)
+    migrate(conn)
+    with conn:
+        for thread_id in range(1, thread_count + 1):
+            rows = synthetic_posts(rng, thread_id, posts)
+            conn.executemany("INSERT OR IGNORE INTO posters (name) VALUES (?)", {(p["poster"],) for p in rows})
+            conn.executemany(INSERT_SQL, [
+                (p["post_id"], thread_id, f"Thread {thread_id}", p["poster"], p["tag"], p["raw_timestamp"],
+                 p["iso_timestamp"], p["content"], p["poster"]) for p in rows])
+    rebuild_fts(conn)
+    posters = [row[0] for row in conn.execute("SELECT name FROM posters ORDER BY poster_id LIMIT 20")]
+    conn.close()
+    return posters
+
+def write_backfill(thread_ids, posts):
+    """Handoffs for the threads the writer inserts, as the parser would leave them."""
+    rng = random.Random(1)
+    for thread_id in thread_ids:
+        write_handoff({"thread_id": thread_id, "thread_title": f"Thread {thread_id}", "content_hash": None,
+                       "posts": synthetic_posts(rng, thread_id, posts)})
+
+def restore(journal_mode):
+    close_stores()
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(FORUM_DB_PATH + suffix):
+            os.remove(FORUM_DB_PATH + suffix)
+    shutil.copyfile(BASE_DB_PATH, FORUM_DB_PATH)
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.close()
+
+def rollback_journal_connect(path=FORUM_DB_PATH):
+    """connect_db as it was before forum.db was always WAL."""
+    conn = sqlite3.connect(path, timeout=60)
+    migrate(conn)
+    return conn
+
+def write(thread_ids, bulk):
+    if not bulk:
+        db_inserter.connect_db = rollback_journal_connect
+    with redirect_stdout(io.StringIO()):
+        try:
+            db_inserter.batch_insert(thread_ids, bulk=bulk)
+        except sqlite3.OperationalError as e:
+            print(f"[!] Writer failed: {e}", file=sys.stderr)
+            sys.exit(1)
+
+def pick(rng, thread_count, posters):
+    """A frontend's request mix: mostly the first pages of a few hot threads and posters."""
+    hot = rng.random() < 0.8
+    if rng.random() < 0.7:
+        thread_id = rng.randint(1, HOT_THREADS) if hot else rng.randint(1, thread_count)
+        return "thread", thread_id, rng.choice((0, PAGE)) if hot else rng.randrange(0, 50, PAGE)
+    return "poster", rng.choice(posters[:5] if hot else posters), None
+
+def plain_reader(thread_count, posters, stop, latencies, errors, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    while not stop.is_set():
+        kind, key, after = pick(rng, thread_count, posters)
+        start = time.perf_counter()
+        try:
+            if kind == "thread":
+                queries.thread_posts(conn, key, after, PAGE)
+            else:
+                queries.poster_posts(conn, key, limit=PAGE)
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+        time.sleep(THINK)
+    conn.close()
+
+def pooled_reader(reader, thread_count, posters, stop, latencies, errors, seed):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        kind, key, after = pick(rng, thread_count, posters)
+        start = time.perf_counter()
+        try:
+            if kind == "thread":
+                reader.thread_page(key, after, PAGE)
+            else:
+                reader.poster_page(key, limit=PAGE)
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+        time.sleep(THINK)
+
+def during_backfill(label, target, args, thread_ids, bulk, readers):
+    """Runs `readers` reader threads for as long as the writer process takes."""
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=target, args=(*args, stop, latencies, errors, seed)) for seed in range(readers)]
+    for thread in threads:
+        thread.start()
+    writer = multiprocessing.Process(target=write, args=(thread_ids, bulk))
+    start = time.perf_counter()
+    writer.start()
+    writer.join()
+    writer_seconds = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if writer.exitcode:
+        errors.append(f"the writer failed (exit code {writer.exitcode})")
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<26} {len(latencies) / writer_seconds:>8.0f} {statistics.median(latencies) * 1000:>8.2f} "
+          f"{p99 * 1000:>8.1f} {latencies[-1] * 1000:>8.1f} {len(errors):>7} {writer_seconds:>8.2f}")
+    return errors
+
+def offset_page_sql(offset):
+    sql, params = queries.window_posts_sql("0000", "9999", PAGE)
+    return sql.replace("LIMIT ?", "LIMIT ? OFFSET ?"), params + [offset]
+
+def deep_pages(reader, total):
+    """Time to fetch one page at increasing depth of the whole time-ordered list."""
+    conn = sqlite3.connect(f"file:{FORUM_DB_PATH}?mode=ro", uri=True)
+    ordered = [row[0] for row in conn.execute("SELECT id FROM posts ORDER BY iso_timestamp, id")]
+    keys = {row[1]: (row[0], row[1]) for row in conn.execute("SELECT iso_timestamp, id FROM posts")}
+    print(f"{'page at depth':<14} {'OFFSET ms':>9} {'keyset ms':>9}")
+    for depth in (0, total // 10, total // 2, total - PAGE):
+        start = time.perf_counter()
+        by_offset = [row[0] for row in conn.execute(*offset_page_sql(depth))]
+        offset_ms = (time.perf_counter() - start) * 1000
+        after = keys[ordered[depth - 1]] if depth else None
+        reader.cache.clear()
+        start = time.perf_counter()
+        posts, _ = reader.window_page("0000", "9999", after, PAGE)
+        keyset_ms = (time.perf_counter() - start) * 1000
+        assert by_offset == [post["id"] for post in posts], f"page at {depth} differs"
+        print(f"{depth:<14} {offset_ms:>9.2f} {keyset_ms:>9.2f}")
+    conn.close()
+
+def check_paging(reader, thread_count):
+    """Paging a thread, a poster and the whole board returns every post once, in order."""
+    conn = sqlite3.connect(f"file:{FORUM_DB_PATH}?mode=ro", uri=True)
+    expected = [row[0] for row in conn.execute("SELECT id FROM posts ORDER BY iso_timestamp, id")]
+    poster = conn.execute("SELECT name FROM posters ORDER BY poster_id LIMIT 1").fetchone()[0]
+    poster_expected = [row[0] for row in conn.execute(
+        "SELECT p.id FROM posts p JOIN posters s ON s.poster_id = p.poster_id WHERE s.name = ? "
+        "ORDER BY p.iso_timestamp, p.id", (poster,))]
+    thread_expected = [row[0] for row in conn.execute("SELECT post_id FROM posts WHERE thread_id = ? ORDER BY post_id",
+                                                      (thread_count,))]
+    conn.close()
+
+    def collect(page, key):
+        seen, after = [], None
+        while True:
+            posts, after = page(after)
+            seen.extend(post[key] for post in posts)
+            if after is None:
+                return seen
+    assert collect(lambda after: reader.window_page("0000", "9999", after, 500), "id") == expected
+    assert collect(lambda after: reader.poster_page(poster, after, limit=7), "id") == poster_expected
+    assert collect(lambda after: reader.thread_page(thread_count, after or 0, 7), "post_id") == thread_expected
+
+def check_invalidation(reader, thread_id, posts):
+    """A cached page is dropped as soon as another connection commits."""
+    before, _ = reader.thread_page(thread_id, 0, posts + 10)
+    hits = reader.stats()["hits"]
+    assert reader.thread_page(thread_id, 0, posts + 10)[0] == before and reader.stats()["hits"] == hits + 1
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    with conn:
+        conn.execute("INSERT INTO posts (post_id, thread_id, poster, iso_timestamp, content) "
+                     "VALUES (?, ?, 'late', '2099-01-01T00:00:00', 'x')", (posts + 1, thread_id))
+    conn.close()
+    after, _ = reader.thread_page(thread_id, 0, posts + 10)
+    assert len(after) == len(before) + 1, "the cache served a page from before the insert"
+
+def run(thread_count, posts, backfill, readers):
+    posters = build_base(thread_count, posts)
+    new_ids = list(range(thread_count + 1, thread_count + backfill + 1))
+    write_backfill(new_ids, posts)
+    print(f"{thread_count} threads x {posts} posts in forum.db; writer inserts {backfill} more threads; "
+          f"{readers} reader threads")
+    print(f"{'':<26} {'reads/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'writer s':>8}")
+
+    restore("DELETE")
+    before = during_backfill("rollback journal, plain", plain_reader, (thread_count, posters), new_ids, False, readers)
+    restore("WAL")
+    reader = ForumReader()
+    try:
+        after = during_backfill("WAL, ForumReader", pooled_reader, (reader, thread_count, posters), new_ids, True,
+                                readers)
+        stats = reader.stats()
+        print(f"ForumReader: {stats['hits']} cache hits, {stats['misses']} misses, {stats['invalidations']} "
+              f"invalidations, {stats['connections']} connections")
+        if before:
+            print(f"before: {len(before)} errors, e.g. {before[0]!r}")
+        assert not after, f"readers failed during the WAL backfill: {after[:3]}"
+
+        conn = sqlite3.connect(f"file:{FORUM_DB_PATH}?mode=ro", uri=True)
+        problems = {name: plan for name, (plan, found) in queries.check_query_plans(conn).items() if found}
+        conn.close()
+        assert not problems, f"queries scan or sort: {problems}"
+        total = (thread_count + backfill) * posts
+        deep_pages(reader, total)
+        check_paging(reader, thread_count + backfill)
+        check_invalidation(reader, 1, posts)
+    finally:
+        reader.close()
+    print("[✓] Readers never failed during the WAL backfill; keyset pages and cache invalidation check out")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 2000),
+            pop_option(args, "--posts", int, 50),
+            pop_option(args, "--backfill", int, 1000),
+            pop_option(args, "--readers", int, 4))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
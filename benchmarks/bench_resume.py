@@ -0,0 +1,143 @@
+"""
+Resumable pipeline runs against the local mock forum server:
+  - a backfill killed partway through, then finished with --resume, against a full rerun;
+  - flaky downloads: stages retried with backoff, then --retry-failed for the rest;
+  - the same backfill with 1 and N worker processes claiming batches from the job queue.
+Each scenario checks that every post ends up in the database exactly once.
+
+Usage: python benchmarks/bench_resume.py [--threads N] [--posts N] [--processes N] [--batch N]
+"""
+import io
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, reset_data_dir
+from benchmarks.mock_server import MockForumServer
+
+DATA_DIR = use_scratch_data_dir()
+SERVER = MockForumServer()
+os.environ["TUI_APP_FORUM_URL"] = SERVER.base_url
+
+from cli_args import pop_option
+from config import FORUM_DB_PATH
+from job_queue import JobQueue
+from pipeline import run_pipeline
+import http_client
+import job_queue as job_queue_module
+import metrics
+
+def quiet(func, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+def post_count():
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*), COUNT(DISTINCT thread_id || ':' || post_id) FROM posts").fetchone()
+    finally:
+        conn.close()
+
+def inserted(run_id=None):
+    queue = JobQueue()
+    try:
+        return queue.counts(run_id or queue.latest_run()).get("inserted", 0)
+    finally:
+        queue.close()
+
+def stage_calls():
+    _, histograms = metrics.drain()
+    return {name[:-len(".seconds")]: h.count for name, h in histograms.items() if name.endswith(".seconds")}
+
+def interrupted_backfill(thread_ids, posts, batch):
+    reset_data_dir()
+    start = time.perf_counter()
+    quiet(run_pipeline, thread_ids, workers=4, rate=0, batch_size=batch)
+    full = time.perf_counter() - start
+
+    reset_data_dir()
+    child = multiprocessing.Process(target=quiet, args=(run_pipeline, thread_ids),
+                                    kwargs=dict(workers=4, rate=0, batch_size=batch))
+    child.start()
+    while child.is_alive() and inserted() < len(thread_ids) // 2:
+        time.sleep(0.05)
+    child.kill()
+    child.join()
+    done_before = inserted()
+
+    stage_calls()
+    start = time.perf_counter()
+    quiet(run_pipeline, [], workers=4, rate=0, resume=True, batch_size=batch)
+    resumed = time.perf_counter() - start
+    calls = stage_calls()
+    total, distinct = post_count()
+    assert total == distinct == len(thread_ids) * posts, f"{total} posts ({distinct} distinct)"
+    print(f"killed with {done_before}/{len(thread_ids)} threads inserted; resume downloaded {calls.get('download', 0)}, "
+          f"parsed {calls.get('parse', 0)}, inserted {calls.get('insert', 0)}")
+    print(f"{'full run':<22} {full:>7.2f}s")
+    print(f"{'resume after kill':<22} {resumed:>7.2f}s")
+
+def flaky_downloads(thread_ids, posts, batch):
+    reset_data_dir()
+    retries, backoff = http_client.DOWNLOAD_RETRIES, job_queue_module.JOB_BACKOFF
+    SERVER.error_rate = 0.4
+    http_client.DOWNLOAD_RETRIES = 0
+    job_queue_module.JOB_BACKOFF = 0.05
+    try:
+        start = time.perf_counter()
+        quiet(run_pipeline, thread_ids, workers=4, rate=0, batch_size=batch)
+        first = time.perf_counter() - start
+        queue = JobQueue()
+        run_id = queue.latest_run()
+        counts = queue.counts(run_id)
+        queue.close()
+        SERVER.error_rate = 0.0
+        quiet(run_pipeline, [], workers=4, rate=0, resume=True, retry_failed=True, batch_size=batch)
+    finally:
+        SERVER.error_rate = 0.0
+        http_client.DOWNLOAD_RETRIES = retries
+        job_queue_module.JOB_BACKOFF = backoff
+    total, distinct = post_count()
+    assert total == distinct == len(thread_ids) * posts, f"{total} posts ({distinct} distinct)"
+    assert counts.get("inserted", 0) + counts.get("failed", 0) == len(thread_ids), counts
+    print(f"40% of requests failing, no HTTP retries: {counts.get('inserted', 0)} inserted and "
+          f"{counts.get('failed', 0)} failed after {job_queue_module.JOB_MAX_ATTEMPTS} attempts in {first:.2f}s; "
+          f"--retry-failed finished the rest")
+
+def scale_out(thread_ids, posts, batch, processes):
+    print(f"{'processes':>9} {'seconds':>8} {'threads/s':>9}   ({os.cpu_count()} CPUs)")
+    for count in sorted({1, processes}):
+        reset_data_dir()
+        start = time.perf_counter()
+        quiet(run_pipeline, thread_ids, workers=4, rate=0, processes=count, batch_size=batch)
+        elapsed = time.perf_counter() - start
+        total, distinct = post_count()
+        assert total == distinct == len(thread_ids) * posts, f"{total} posts ({distinct} distinct)"
+        print(f"{count:>9} {elapsed:>8.2f} {len(thread_ids) / elapsed:>9.1f}")
+
+def run(thread_count, posts, processes, batch):
+    SERVER.posts = posts
+    metrics.enable()
+    thread_ids = list(range(1, thread_count + 1))
+    print(f"{thread_count} threads x {posts} posts, batches of {batch}")
+    interrupted_backfill(thread_ids, posts, batch)
+    flaky_downloads(thread_ids, posts, batch)
+    scale_out(thread_ids, posts, batch, processes)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    SERVER.start()
+    try:
+        run(pop_option(args, "--threads", int, 120),
+            pop_option(args, "--posts", int, 50),
+            pop_option(args, "--processes", int, 4),
+            pop_option(args, "--batch", int, 10))
+    finally:
+        SERVER.stop()
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
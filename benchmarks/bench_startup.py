@@ -0,0 +1,130 @@
+"""
+Start-up cost of the entry points, in fresh interpreters: `python -X importtime` for
+sync_board and pipeline (median of --repeat runs, with the slowest imports under
+sync_board), then a whole no-op sync against the local mock forum server, which must
+fetch the index, find nothing new and exit without loading requests, BeautifulSoup, the
+pipeline, the parser or the inserter. Exits non-zero if the no-op sync loads any of them
+or `import sync_board` takes longer than --target-ms.
+
+Usage: python benchmarks/bench_startup.py [--repeat N] [--target-ms MS] [--threads N]
+"""
+import functools
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import ROOT, use_scratch_data_dir
+from benchmarks.mock_server import MockForumServer
+
+DATA_DIR = use_scratch_data_dir()
+SERVER = MockForumServer()
+os.environ["TUI_APP_FORUM_URL"] = SERVER.base_url
+
+from cli_args import pop_option
+
+HEAVY_MODULES = ("requests", "urllib3", "bs4", "pipeline", "http_client", "formatter.html_parser",
+                 "inserter.db_inserter", "fetcher.thread_downloader")
+
+NOOP_SYNC = f"""
+import sys
+import sync_board
+sys.argv = ["sync_board.py"]
+sync_board.main()
+print("loaded:", ",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+def python(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+def import_times(module):
+    """[(name, depth, self us, cumulative us)] for one fresh `import module`, in importtime's order."""
+    times = []
+    for line in python("-X", "importtime", "-c", f"import {module}").stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2, int(self_us), int(cumulative)))
+    return times
+
+def median_import_ms(module, repeat):
+    """(median cumulative ms of `import module`, the last run's imports directly under it)."""
+    runs = [import_times(module) for _ in range(repeat)]
+    total = statistics.median(next(us for name, depth, _, us in run if name == module and depth == 0)
+                              for run in runs)
+    # Children are listed before their parent, after whatever site imported at start-up
+    last = runs[-1]
+    start = next(i for i, (name, depth, _, _) in enumerate(last) if name == "site" and depth == 0) + 1
+    children = [(us, name) for name, depth, _, us in last[start:] if depth == 1]
+    return total / 1000, children
+
+def wall_ms(*args):
+    start = time.perf_counter()
+    python(*args)
+    return (time.perf_counter() - start) * 1000
+
+def populate(thread_count):
+    """Syncs the mock board once, so the next sync has nothing to do."""
+    import pipeline
+    import sync_board
+    SERVER.per_page = thread_count
+    run_pipeline = pipeline.run_pipeline
+    pipeline.run_pipeline = functools.partial(run_pipeline, workers=4, rate=0)
+    argv = sys.argv
+    sys.argv = ["sync_board.py"]
+    try:
+        with redirect_stdout(io.StringIO()):
+            sync_board.main()
+    finally:
+        sys.argv = argv
+        pipeline.run_pipeline = run_pipeline
+
+def run(repeat, target_ms, thread_count):
+    print(f"{'import':<12} {'median ms':>9}")
+    sync_ms, children = median_import_ms("sync_board", repeat)
+    pipeline_ms, _ = median_import_ms("pipeline", repeat)
+    print(f"{'sync_board':<12} {sync_ms:>9.1f}")
+    print(f"{'pipeline':<12} {pipeline_ms:>9.1f}   (what every sync used to import)")
+    print("slowest under sync_board: " + ", ".join(f"{name} {us / 1000:.1f}ms"
+                                                    for us, name in sorted(children, reverse=True)[:6]))
+
+    populate(thread_count)
+    walls, loaded = [], ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = python("-c", NOOP_SYNC).stdout
+        walls.append(time.perf_counter() - start)
+        assert "No new or updated threads" in out, out
+        loaded = next(line for line in out.splitlines() if line.startswith("loaded:"))[len("loaded:"):].strip()
+    bare = statistics.median(wall_ms("-c", "pass") for _ in range(repeat))
+    print(f"no-op sync of {thread_count} threads: {statistics.median(walls) * 1000:.0f}ms wall "
+          f"(bare interpreter {bare:.0f}ms)")
+
+    failures = []
+    if loaded:
+        failures.append(f"the no-op sync loaded {loaded}")
+    if sync_ms > target_ms:
+        failures.append(f"import sync_board took {sync_ms:.1f}ms, target {target_ms:.0f}ms")
+    for failure in failures:
+        print(f"[!] {failure}")
+    if not failures:
+        print(f"[✓] No-op sync loads none of {', '.join(HEAVY_MODULES)}; import sync_board within {target_ms:.0f}ms")
+    return not failures
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    SERVER.start()
+    try:
+        ok = run(pop_option(args, "--repeat", int, 5),
+                 pop_option(args, "--target-ms", float, 100.0),
+                 pop_option(args, "--threads", int, 50))
+    finally:
+        SERVER.stop()
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,91 @@
+"""
+Updating threads that gained a few posts: full re-parse and re-insert against the
+tail-only mode sync_board uses. Also checks that both leave identical posts tables.
+
+Usage: python benchmarks/bench_tail.py [--threads N] [--posts N] [--new N]
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, write_corpus, close_stores
+DATA_DIR = use_scratch_data_dir()
+
+from contextlib import redirect_stdout
+from cli_args import pop_option
+from config import DB_DIR, PARSED_DIR
+from formatter import html_parser
+from inserter import db_inserter
+
+STATE_DIRS = (DB_DIR, PARSED_DIR)
+
+def restore_state():
+    """Puts the databases and handoff files back as they were before the threads grew."""
+    close_stores()
+    for directory in STATE_DIRS:
+        shutil.rmtree(directory)
+        shutil.copytree(directory + ".before", directory)
+
+def quiet(func, *args, **kwargs):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        func(*args, **kwargs)
+    return time.perf_counter() - start
+
+def dump_posts():
+    conn = sqlite3.connect(db_inserter.DB_PATH)
+    try:
+        return conn.execute(
+            "SELECT post_id, thread_id, thread_title, poster, tag, raw_timestamp, iso_timestamp, content "
+            "FROM posts ORDER BY thread_id, post_id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+def update(thread_ids, tail):
+    """Parses and inserts the grown threads. Returns (parse seconds, insert seconds)."""
+    tails = None
+    if tail:
+        conn = db_inserter.connect_db()
+        try:
+            tails = db_inserter.get_tails(conn, thread_ids)
+        finally:
+            conn.close()
+    parse_time = quiet(html_parser.batch_parse, thread_ids, jobs=1, tails=tails)
+    insert_time = quiet(db_inserter.batch_insert, thread_ids)
+    return parse_time, insert_time
+
+def run(thread_count, posts, new):
+    thread_ids = list(range(1, thread_count + 1))
+    write_corpus(thread_ids, posts + new, keep=posts)
+    update(thread_ids, tail=False)
+    close_stores()
+    for directory in STATE_DIRS:
+        shutil.copytree(directory, directory + ".before")
+
+    print(f"{thread_count} threads grown from {posts} to {posts + new} posts")
+    print(f"{'mode':<6} {'parse s':>8} {'insert s':>8} {'total s':>8}")
+    results = {}
+    for mode in ("full", "tail"):
+        restore_state()
+        write_corpus(thread_ids, posts + new)
+        parse_time, insert_time = update(thread_ids, tail=mode == "tail")
+        results[mode] = dump_posts()
+        print(f"{mode:<6} {parse_time:>8.2f} {insert_time:>8.2f} {parse_time + insert_time:>8.2f}")
+
+    assert len(results["full"]) == thread_count * (posts + new), "full update lost posts"
+    assert results["tail"] == results["full"], "tail update differs from a full update"
+    print("identical: True")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        run(pop_option(args, "--threads", int, 50),
+            pop_option(args, "--posts", int, 400),
+            pop_option(args, "--new", int, 5))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,92 @@
+"""
+infer_year against infer_year_slow. First a randomized equivalence check over anchors,
+weekdays and date strings (Feb 29, impossible dates, out-of-range times, other spellings),
+comparing results and error messages; then a microbenchmark on realistic post timestamps.
+
+Usage: python benchmarks/bench_timestamps.py [--cases N] [--posts N] [--seed N]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cli_args import pop_option
+from benchmarks.corpus import post_times
+from utils import timestamp_utils
+from utils.timestamp_utils import infer_year, infer_year_slow, infer_years, WEEKDAYS
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def outcome(func, anchor, dow, date_str):
+    try:
+        return func(anchor, dow, date_str)
+    except ValueError as e:
+        return f"ValueError: {e}"
+
+def random_case(rng):
+    anchor = datetime(rng.randint(2005, 2030), 1, 1) + timedelta(seconds=rng.randint(0, 366 * 86400 - 1))
+    roll = rng.random()
+    if roll < 0.5:
+        # A real post time before the anchor, in the board's format
+        when = anchor - timedelta(seconds=rng.randint(0, 20 * 365 * 86400))
+        dow, date_str = when.strftime("%a"), when.strftime("%b %d %H:%M:%S")
+    elif roll < 0.65:
+        dow, date_str = rng.choice(WEEKDAYS), f"Feb 29 {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+    else:
+        month = rng.choice(MONTH_NAMES + ["mar", "MAY", "Foo"])
+        day = rng.choice([str(rng.randint(0, 32)), f"{rng.randint(1, 9):02d}", f" {rng.randint(1, 9)}"])
+        clock = f"{rng.randint(0, 25):02d}:{rng.randint(0, 61):02d}:{rng.randint(0, 61):02d}"
+        if rng.random() < 0.1:
+            clock = clock.lstrip("0")
+        dow = rng.choice(WEEKDAYS + ["wed", "Xyz"])
+        date_str = f"{month} {day} {clock}"
+    return anchor, dow, date_str
+
+def check_equivalence(cases, seed):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        anchor, dow, date_str = random_case(rng)
+        expected = outcome(infer_year_slow, anchor, dow, date_str)
+        actual = outcome(infer_year, anchor, dow, date_str)
+        assert actual == expected, f"{anchor} {dow!r} {date_str!r}: {actual!r} != {expected!r}"
+    print(f"equivalence: {cases} random cases identical to infer_year_slow")
+
+def clear_caches():
+    timestamp_utils.infer_year.cache_clear()
+    timestamp_utils.year_table.cache_clear()
+
+def run(cases, posts, seed):
+    check_equivalence(cases, seed)
+
+    rng = random.Random(seed)
+    anchor = datetime(2025, 5, 19, 16, 52, 12)
+    stamps = [(when.strftime("%a"), when.strftime("%b %d %H:%M:%S")) for when in post_times(rng, posts, anchor)]
+
+    start = time.perf_counter()
+    expected = [infer_year_slow(anchor, dow, rest) for dow, rest in stamps]
+    slow = time.perf_counter() - start
+
+    clear_caches()
+    start = time.perf_counter()
+    cold = [infer_year(anchor, dow, rest) for dow, rest in stamps]
+    cold_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = infer_years(anchor, stamps)
+    warm_time = time.perf_counter() - start
+    assert cold == expected and batch == expected
+
+    print(f"{posts} post timestamps, anchor {anchor}")
+    print(f"{'version':<22} {'seconds':>8} {'us/post':>8} {'speedup':>8}")
+    for name, seconds in (("infer_year_slow", slow), ("infer_year (cold)", cold_time),
+                          ("infer_years (cached)", warm_time)):
+        print(f"{name:<22} {seconds:>8.3f} {seconds / posts * 1e6:>8.1f} {slow / seconds:>7.1f}x")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(pop_option(args, "--cases", int, 20000),
+        pop_option(args, "--posts", int, 20000),
+        pop_option(args, "--seed", int, 0))
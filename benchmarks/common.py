@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def use_scratch_data_dir():
+    """
+    Points config at a fresh temporary data directory. Must run before any
+    project module is imported, since config resolves its paths at import time.
+    """
+    data_dir = tempfile.mkdtemp(prefix="tui_bench_")
+    os.environ["TUI_APP_DATA_DIR"] = data_dir
+    for name in ("logs", "html_raw", "database"):
+        os.makedirs(os.path.join(data_dir, name), exist_ok=True)
+    return data_dir
+
+def close_stores():
+    """Closes this process's shared fetch-state, raw-store and parse-cache connections."""
+    import fetch_state
+    import parse_cache
+    import raw_store
+    for stores in (fetch_state._stores, raw_store._stores, parse_cache._caches):
+        for store in stores.values():
+            store.conn.close()
+        stores.clear()
+
+def reset_data_dir():
+    """Empties the scratch data directory: databases, raw pages, handoffs and logs."""
+    import shutil
+    from config import DATA_ROOT
+    close_stores()
+    for name in ("database", "html_raw", "parsed", "text_phrased", "logs"):
+        shutil.rmtree(os.path.join(DATA_ROOT, name), ignore_errors=True)
+    for name in ("logs", "html_raw", "database"):
+        os.makedirs(os.path.join(DATA_ROOT, name), exist_ok=True)
+
+def write_corpus(thread_ids, posts, seed=0, keep=None):
+    """Stores synthetic threads in the raw store, as if they had just been downloaded."""
+    from benchmarks.corpus import thread_html
+    from raw_store import get_raw_store
+    store = get_raw_store()
+    for thread_id in thread_ids:
+        store.put(thread_id, thread_html(thread_id, posts, seed, keep=keep))
+
+def reset_raw_store():
+    """Drops every downloaded page from the raw store and html_raw/."""
+    import shutil
+    import raw_store
+    from config import HTML_RAW_DIR, RAW_DB_PATH
+    for store in raw_store._stores.values():
+        if hasattr(store, "close"):
+            store.close()
+    raw_store._stores.clear()
+    shutil.rmtree(HTML_RAW_DIR, ignore_errors=True)
+    os.makedirs(HTML_RAW_DIR)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(RAW_DB_PATH + suffix):
+            os.remove(RAW_DB_PATH + suffix)
+
+def synthetic_posts(rng, thread_id, count):
+    """Post dicts shaped like the parser's output, without generating HTML."""
+    from benchmarks.corpus import WORDS, TAGS, post_times
+    posts = []
+    for post_id, when in enumerate(post_times(rng, count), 1):
+        posts.append({
+            "post_id": post_id,
+            "thread_id": thread_id,
+            "poster": f"{rng.choice(WORDS)}{rng.randint(1, 500)}",
+            "tag": rng.choice(TAGS),
+            "raw_timestamp": when.strftime("%a %b %d %H:%M:%S"),
+            "iso_timestamp": when.isoformat(),
+            "content": "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 18)))
+                                 for _ in range(rng.randint(1, 4))),
+        })
+    return posts
+
+def write_text_phrased(text_dir, thread_id, title, posts):
+    """Writes posts in the legacy text_phrased format."""
+    os.makedirs(text_dir, exist_ok=True)
+    with open(os.path.join(text_dir, f"thread_{thread_id}.txt"), "w", encoding="utf-8") as out:
+        out.write(f"=== THREAD TITLE ===\n{title}\n=== END TITLE ===\n\n")
+        for post in posts:
+            out.write(f"PostID {post['post_id']}\n")
+            out.write(f"ThreadID: {post['thread_id']}\n")
+            out.write(f"Poster: {post['poster']}\n")
+            out.write(f"Tag: {post['tag']}\n")
+            out.write(f"RawTime: {post['raw_timestamp']}\n")
+            out.write(f"ISOTime: {post['iso_timestamp']}\n")
+            out.write(f"Content:\n{post['content']}\n")
+            out.write("=== END POST ===\n\n")
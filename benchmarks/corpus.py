@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+
+# Synthetic thread HTML in the board's layout: two-<td> post rows, a <font>
+# timestamp heading each message and the "The current time is ..." anchor.
+
+ANCHOR = datetime(2025, 5, 19, 16, 52, 12)
+EARLIEST = datetime(2009, 1, 1)
+
+WORDS = (
+    "the senate vote budget war tax policy election poll debate reform court "
+    "law economy trade border health speech campaign party leader press rally"
+).split()
+TAGS = ["Member", "Senior Member", "Moderator", "Newbie"]
+
+def _sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 18))).capitalize() + "."
+
+def _post_body(rng, thread_id):
+    lines = []
+    for _ in range(rng.randint(1, 6)):
+        line = _sentence(rng)
+        roll = rng.random()
+        if roll < 0.15:
+            line += f' <a href="http://example.com/{thread_id}/{rng.randint(1, 9999)}">{rng.choice(WORDS)} link</a>'
+        elif roll < 0.25:
+            line = f"<i>{line}</i>"
+        elif roll < 0.3:
+            line = f"&quot;{line}&quot; &amp; more"
+        lines.append(line)
+    return "<br>\n".join(lines)
+
+def post_times(rng, count, anchor=ANCHOR):
+    """Returns `count` ascending datetimes between EARLIEST and the anchor."""
+    span = int((anchor - EARLIEST).total_seconds())
+    start = EARLIEST + timedelta(seconds=rng.randint(0, span))
+    remaining = int((anchor - start).total_seconds())
+    offsets = sorted(rng.randint(0, remaining) for _ in range(count))
+    return [start + timedelta(seconds=s) for s in offsets]
+
+def thread_html(thread_id, posts=50, seed=0, anchor=ANCHOR, keep=None):
+    """
+    Renders a deterministic synthetic thread page with `posts` posts. With `keep`, only the
+    first `keep` of them are rendered: the same thread as it was before the rest were posted.
+    """
+    rng = random.Random(seed * 1_000_003 + thread_id)
+    rows = ['<tr class="highlight"><td><b>Author</b></td><td><b>Message</b></td></tr>']
+    for when in post_times(rng, posts, anchor):
+        user = f"{rng.choice(WORDS).capitalize()}{rng.randint(1, 500)}"
+        stamp = when.strftime("%a %b %d %H:%M:%S")
+        rows.append(
+            f'<tr>\n<td valign="top" width="15%"><b>{user}</b><br>\n<small>{rng.choice(TAGS)}</small></td>\n'
+            f'<td valign="top"><font size="1" color="#666666">{stamp}</font><br>\n'
+            f'{_post_body(rng, thread_id)}\n</td>\n</tr>'
+        )
+    if keep is not None:
+        rows = rows[:1 + keep]
+    return (
+        "<html>\n<head><title>"
+        f"{_sentence(rng)[:60]} (thread {thread_id})"
+        "</title></head>\n<body>\n<table width=\"100%\" cellpadding=\"4\">\n"
+        + "\n".join(rows)
+        + "\n</table>\n<p><small>The current time is "
+        + anchor.strftime("%a %b %d %H:%M:%S %Y")
+        + "</small></p>\n</body>\n</html>\n"
+    )
+
+def index_html(section, page, pages, per_page=50, posts=50):
+    """
+    Renders page `page` of a synthetic section index: `pages` pages of `per_page` threads,
+    newest thread first, linking to the nearby pages and the first and last ones.
+    """
+    first = (pages - page + 1) * per_page
+    rows = ['<tr class="highlight"><td><b>Topic</b></td><td><b>Posts</b></td></tr>']
+    for thread_id in range(first, first - per_page, -1):
+        rows.append(
+            f'<tr><td><a href="boardthread?id={section}&amp;thread={thread_id}">Thread {thread_id}</a></td>'
+            f'<td>{posts}</td></tr>'
+        )
+    nearby = sorted({1, pages} | set(range(max(1, page - 5), min(pages, page + 5) + 1)))
+    links = " ".join(
+        f"<b>{n}</b>" if n == page else f'<a href="boardforum?id={section}&amp;page={n}">{n}</a>'
+        for n in nearby
+    )
+    return (
+        f"<html>\n<head><title>{section}</title></head>\n<body>\n<p>Pages: {links}</p>\n"
+        "<table width=\"100%\">\n" + "\n".join(rows) + "\n</table>\n</body>\n</html>\n"
+    )
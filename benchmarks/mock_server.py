@@ -0,0 +1,102 @@
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from benchmarks.corpus import thread_html, index_html
+
+class MockForumServer(ThreadingHTTPServer):
+    """
+    Local stand-in for utopiaforums.com. Serves synthetic threads at
+    /boardthread?id=<section>&thread=<n> and `index_pages` pages of thread index at
+    /boardforum?id=<section>&page=<n>, with optional latency and injected 503s.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, posts=50, seed=0, latency=0.0, error_rate=0.0, index_pages=1, per_page=50):
+        super().__init__(("127.0.0.1", port), MockForumHandler)
+        self.posts = posts
+        self.seed = seed
+        self.latency = latency
+        self.error_rate = error_rate
+        self.index_pages = index_pages
+        self.per_page = per_page
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class MockForumHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            fail = server.rng.random() < server.error_rate
+            if fail:
+                server.errors += 1
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            if fail:
+                self._send(503, "Service Unavailable")
+                return
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/boardthread" and "thread" in query:
+                thread_id = int(query["thread"][0])
+                body = thread_html(thread_id, server.posts, server.seed)
+                etag = '"%s"' % hashlib.md5(body.encode("utf-8")).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, "", etag)
+                else:
+                    self._send(200, body, etag)
+            elif url.path == "/boardforum" and "id" in query:
+                page = int(query.get("page", ["1"])[0])
+                if 1 <= page <= server.index_pages:
+                    self._send(200, index_html(query["id"][0], page, server.index_pages, server.per_page, server.posts))
+                else:
+                    self._send(404, "Not Found")
+            else:
+                self._send(404, "Not Found")
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status, body, etag=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
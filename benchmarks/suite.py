@@ -0,0 +1,248 @@
+"""
+End-to-end and per-stage benchmarks against the local mock forum server: download_threads,
+batch_parse (serial, --jobs N, and answered from the parse cache), batch_insert, the whole pipeline, and sync_board.main
+crawling the index from scratch and again with nothing new. Every case starts from an empty
+data directory and runs --repeat times; the median is kept, along with the per-stage time
+breakdown from metrics (summed over workers, so it can exceed the wall time).
+
+Results are appended to benchmarks/results.jsonl with the commit they were measured at, and
+compared against the latest earlier run, or the latest one at --baseline REF (any git
+revision), flagging cases that got slower by more than --threshold.
+
+Usage: python benchmarks/suite.py [--threads N] [--posts N] [--pages N] [--jobs N] [--workers N]
+       [--latency S] [--repeat N] [--only CASE,...] [--baseline REF] [--threshold F]
+       [--results PATH] [--no-save]
+"""
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import use_scratch_data_dir, reset_data_dir, write_corpus
+from benchmarks.mock_server import MockForumServer
+
+# The server has to be up before config is imported, so the app resolves its forum URLs to it
+DATA_DIR = use_scratch_data_dir()
+SERVER = MockForumServer()
+os.environ["TUI_APP_FORUM_URL"] = SERVER.base_url
+
+from cli_args import pop_option, pop_flag
+from config import PROJECT_ROOT, FORUM_DB_PATH, PARSED_DIR
+from fetcher.thread_downloader import download_threads
+from formatter.html_parser import batch_parse
+from inserter.db_inserter import batch_insert
+from pipeline import run_pipeline
+import metrics
+import pipeline
+import sync_board
+
+RESULTS_PATH = os.path.join(PROJECT_ROOT, "benchmarks", "results.jsonl")
+
+def _git(*args):
+    return subprocess.run(["git", *args], cwd=os.path.dirname(os.path.realpath(__file__)),
+                          capture_output=True, text=True, check=True).stdout.strip()
+
+def git_revision(ref="HEAD"):
+    """(short commit hash of `ref`, whether tracked files have uncommitted changes)."""
+    try:
+        return _git("rev-parse", "--short", ref), bool(_git("status", "--porcelain", "--untracked-files=no"))
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown" if ref == "HEAD" else ref, False
+
+class Suite:
+    def __init__(self, threads, posts, pages, jobs, workers):
+        self.pages = pages
+        self.per_page = max(1, threads // pages)
+        self.thread_ids = list(range(1, pages * self.per_page + 1))
+        self.posts = posts
+        self.jobs = jobs
+        self.workers = workers
+
+    def corpus(self):
+        write_corpus(self.thread_ids, self.posts)
+
+    def parsed_corpus(self):
+        self.corpus()
+        batch_parse(self.thread_ids, jobs=self.jobs)
+
+    def parse_cache_only(self):
+        """Parsed once, handoffs gone: the next parse is answered from the parse cache."""
+        self.parsed_corpus()
+        shutil.rmtree(PARSED_DIR)
+
+    def archived(self, expected):
+        """Checks that the forum database ended up with every post of the corpus."""
+        def check():
+            conn = sqlite3.connect(FORUM_DB_PATH)
+            try:
+                count = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+            finally:
+                conn.close()
+            assert count == expected, f"{count} posts archived, expected {expected}"
+        return check
+
+    def sync(self, all_pages=True):
+        argv = sys.argv
+        sys.argv = ["sync_board.py", "--crawl", "--rate", "0", "--workers", str(self.workers)]
+        if all_pages:
+            sys.argv.append("--all")
+        try:
+            sync_board.main()
+        finally:
+            sys.argv = argv
+
+    def cases(self):
+        """{name: (setup, timed run, check, items processed, unit)}"""
+        n = len(self.thread_ids)
+        archived = self.archived(n * self.posts)
+        # sync_board.main runs the pipeline with the polite download defaults; lift them here
+        pipeline.run_pipeline = functools.partial(run_pipeline, workers=self.workers, rate=0, jobs=self.jobs)
+        cases = {
+            "download": (None, lambda: download_threads(self.thread_ids, workers=self.workers, rate=0), None,
+                         n, "threads"),
+            "parse": (self.corpus, lambda: batch_parse(self.thread_ids, jobs=1), None, n, "threads"),
+            "parse_cached": (self.parse_cache_only, lambda: batch_parse(self.thread_ids, jobs=1), None,
+                             n, "threads"),
+            "insert": (self.parsed_corpus, lambda: batch_insert(self.thread_ids), archived, n * self.posts, "rows"),
+            "pipeline": (None, lambda: run_pipeline(self.thread_ids, workers=self.workers, rate=0, jobs=self.jobs),
+                         archived, n, "threads"),
+            "sync": (None, self.sync, archived, n, "threads"),
+            "sync_noop": (self.sync, lambda: self.sync(all_pages=False), archived, 1, "runs"),
+        }
+        if self.jobs > 1:
+            cases["parse_jobs"] = (self.corpus, lambda: batch_parse(self.thread_ids, jobs=self.jobs), None,
+                                   n, "threads")
+        return cases
+
+def stage_seconds():
+    """Seconds spent in each timed stage since the last call."""
+    _, histograms = metrics.drain()
+    return {name[:-len(".seconds")]: round(h.sum, 4) for name, h in sorted(histograms.items())
+            if name.endswith(".seconds")}
+
+def run_case(setup, func, check, repeat):
+    times, stages = [], {}
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            reset_data_dir()
+            if setup:
+                setup()
+            stage_seconds()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        if check:
+            check()
+        times.append(elapsed)
+        stages = stage_seconds()
+    return times, stages
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def find_baseline(runs, ref=None):
+    """The latest stored run at commit `ref`, or the latest run if none is given."""
+    for run in reversed(runs):
+        if ref is None or run["commit"].startswith(ref) or ref.startswith(run["commit"]):
+            return run
+    return None
+
+def compare(result, baseline, threshold):
+    label = baseline["commit"] + ("+" if baseline.get("dirty") else "")
+    print(f"\nCompared with {label} ({baseline['date']}):")
+    if baseline["params"] != result["params"]:
+        print(f"[!] Parameters differ: {baseline['params']} then, {result['params']} now")
+    regressions = 0
+    for name, case in result["cases"].items():
+        before = baseline["cases"].get(name)
+        if not before:
+            print(f"  {name:<11} new")
+            continue
+        change = case["seconds"] / before["seconds"] - 1 if before["seconds"] else 0.0
+        slower = change > threshold
+        regressions += slower
+        print(f"  {name:<11} {before['seconds']:>8.3f}s → {case['seconds']:>8.3f}s {change:>+7.1%}"
+              + ("  [!] slower" if slower else ""))
+    print(f"[{'!' if regressions else '✓'}] {regressions} regressions over {threshold:.0%}")
+    return regressions
+
+def run(threads, posts, pages, jobs, workers, latency, repeat, only, baseline_ref, threshold, results_path, save):
+    suite = Suite(threads, posts, pages, jobs, workers)
+    SERVER.posts = posts
+    SERVER.latency = latency
+    SERVER.index_pages = pages
+    SERVER.per_page = suite.per_page
+    metrics.enable()
+
+    cases = suite.cases()
+    unknown = set(only or ()) - set(cases)
+    if unknown:
+        raise ValueError(f"unknown cases: {', '.join(sorted(unknown))} (have {', '.join(cases)})")
+
+    commit, dirty = git_revision()
+    params = {"threads": len(suite.thread_ids), "posts": posts, "pages": pages, "jobs": jobs,
+              "workers": workers, "latency": latency}
+    print(f"{len(suite.thread_ids)} threads x {posts} posts on {pages} index pages, {jobs} parse jobs, "
+          f"{workers} download workers, {latency * 1000:.0f}ms latency, median of {repeat} "
+          f"@ {commit}{'+' if dirty else ''}")
+    print(f"{'case':<11} {'seconds':>8} {'rate':>16}  stages")
+
+    result = {"commit": commit, "dirty": dirty, "date": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "params": params, "cases": {}}
+    for name, (setup, func, check, items, unit) in cases.items():
+        if only and name not in only:
+            continue
+        times, stages = run_case(setup, func, check, repeat)
+        seconds = statistics.median(times)
+        result["cases"][name] = {"seconds": round(seconds, 4), "runs": [round(t, 4) for t in times],
+                                 "items": items, "unit": unit, "stages": stages}
+        rate = f"{items / seconds:.1f} {unit}/s" if seconds else "-"
+        breakdown = " ".join(f"{stage}={value:.2f}" for stage, value in stages.items())
+        print(f"{name:<11} {seconds:>8.3f} {rate:>16}  {breakdown}")
+
+    runs = load_results(results_path)
+    baseline = find_baseline(runs, git_revision(baseline_ref)[0] if baseline_ref else None)
+    if baseline:
+        compare(result, baseline, threshold)
+    elif baseline_ref:
+        print(f"[!] No stored run at {baseline_ref} in {results_path}")
+
+    if save:
+        os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"[✓] Results appended to {results_path}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    SERVER.start()
+    try:
+        run(pop_option(args, "--threads", int, 40),
+            pop_option(args, "--posts", int, 50),
+            pop_option(args, "--pages", int, 4),
+            pop_option(args, "--jobs", int, 2),
+            pop_option(args, "--workers", int, 4),
+            pop_option(args, "--latency", float, 0.01),
+            pop_option(args, "--repeat", int, 3),
+            pop_option(args, "--only", lambda value: [s for s in value.split(",") if s], None),
+            pop_option(args, "--baseline"),
+            pop_option(args, "--threshold", float, 0.1),
+            pop_option(args, "--results", default=RESULTS_PATH),
+            not pop_flag(args, "--no-save"))
+    finally:
+        SERVER.stop()
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,23 @@
+def pop_option(args, name, cast=str, default=None):
+    """
+    Removes '--name value' (or '--name=value') from args and returns the cast value.
+    Raises ValueError if the flag is present without a value.
+    """
+    for i, arg in enumerate(args):
+        if arg == name:
+            if i + 1 >= len(args):
+                raise ValueError(f"{name} requires a value")
+            value = args[i + 1]
+            del args[i:i + 2]
+            return cast(value)
+        if arg.startswith(name + "="):
+            del args[i]
+            return cast(arg.split("=", 1)[1])
+    return default
+
+def pop_flag(args, name):
+    """Removes a boolean '--name' flag from args and returns whether it was present."""
+    if name in args:
+        args.remove(name)
+        return True
+    return False
@@ -2,15 +2,20 @@ import os
 
 # === PATHS ===
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_ROOT = os.environ.get("TUI_APP_DATA_DIR", PROJECT_ROOT)  # Relocate data dirs (benchmarks, scratch runs)
 
-HTML_RAW_DIR = os.path.join(PROJECT_ROOT, "html_raw")
-TEXT_PHRASED_DIR = os.path.join(PROJECT_ROOT, "text_phrased")
-LOGS_DIR = os.path.join(PROJECT_ROOT, "logs")
-DB_DIR = os.path.join(PROJECT_ROOT, "database")
+HTML_RAW_DIR = os.path.join(DATA_ROOT, "html_raw")
+TEXT_PHRASED_DIR = os.path.join(DATA_ROOT, "text_phrased")
+PARSED_DIR = os.path.join(DATA_ROOT, "parsed")
+LOGS_DIR = os.path.join(DATA_ROOT, "logs")
+DB_DIR = os.path.join(DATA_ROOT, "database")
+EXPORT_DIR = os.path.join(DATA_ROOT, "export")
 SCHEMA_DIR = os.path.join(PROJECT_ROOT, "schema")
 
 FORUM_DB_PATH = os.path.join(DB_DIR, "forum.db")
 METADATA_DB_PATH = os.path.join(DB_DIR, "metadata.db")
+RAW_DB_PATH = os.path.join(DB_DIR, "raw.db")
+PARSE_CACHE_DB_PATH = os.path.join(DB_DIR, "parse_cache.db")
 
 FORUM_SCHEMA_PATH = os.path.join(SCHEMA_DIR, "forum_schema.sql")
 METADATA_SCHEMA_PATH = os.path.join(SCHEMA_DIR, "metadata_schema.sql")
@@ -19,11 +24,79 @@ METADATA_SCHEMA_PATH = os.path.join(SCHEMA_DIR, "metadata_schema.sql")
 OVERWRITE_MODE = False      # If True, re-inserts or overwrites duplicates in DB
 LOG_LEVEL = "INFO"          # DEBUG, INFO, WARNING, ERROR
 FORCE_DOWNLOAD = False      # Override download skipping logic
-FORCE_PARSE = False         # Override parsing skip checks
+FORCE_PARSE = False         # Override parsing skip checks (unchanged pages still come from the parse cache)
+FORCE_INSERT = False        # Override the insert skip check (duplicate posts are still ignored)
+WRITE_TEXT_DUMP = False     # Also write the human-readable text_phrased/ dump (debugging only)
+
+# === RAW HTML STORE ===
+RAW_STORE = "pack"          # "pack": compressed, versioned database/raw.db; "files": html_raw/thread_N.html
+RAW_CODEC = "auto"          # Pack compression: "zstd" (needs the zstandard package), "gzip", or "auto"
+
+# === PARSE CACHE ===
+PARSE_CACHE = True          # Reuse what the parser extracted from unchanged HTML (keyed on the page's sha256 + PARSER_VERSION)
+PARSE_CACHE_MAX_MB = 256    # Compressed size above which the least recently used entries are dropped
 
 # === FORUM CONFIG ===
-FORUM_BASE_URL = "http://utopiaforums.com/boardthread"
+FORUM_URL = os.environ.get("TUI_APP_FORUM_URL", "http://utopiaforums.com")  # Point at another host (benchmarks' mock server)
+FORUM_BASE_URL = f"{FORUM_URL}/boardthread"
 FORUM_SECTION = "politics"  # Hardcoded for now — could be generalized later
+FORUM_INDEX_URL = f"{FORUM_URL}/boardforum"
+FORUM_SECTIONS = [FORUM_SECTION]  # Sections index_crawler.py walks by default
+
+# === DOWNLOAD TUNING ===
+DOWNLOAD_WORKERS = 1        # Concurrent download threads (1 = serial)
+DOWNLOAD_RATE = 1.0         # Requests per second across all workers (0 = unlimited)
+DOWNLOAD_BURST = 1          # Token bucket capacity: requests allowed back-to-back
+DOWNLOAD_MAX_PER_HOST = 4   # Open requests allowed against a single host
+DOWNLOAD_RETRIES = 3        # Retries on timeouts, connection errors, 429 and 5xx
+DOWNLOAD_BACKOFF = 2.0      # Base seconds for exponential retry backoff
+DOWNLOAD_MAX_RETRY_AFTER = 300  # Longest Retry-After (seconds) honoured on 429/503; longer waits are capped
+DOWNLOAD_TIMEOUT = 30       # Per-request timeout in seconds
+
+# === INDEX CRAWL ===
+INDEX_WORKERS = 4           # Index pages fetched concurrently by the crawler
+INDEX_RATE = 2.0            # Index page requests per second (0 = unlimited)
+
+# === PIPELINE ===
+PIPELINE_STREAMING = False  # Overlap download, parse and insert instead of running them as barriers
+PIPELINE_QUEUE_DEPTH = 32   # Threads buffered between streaming stages
+PARSE_JOBS = 1              # Worker processes for batch_parse (1 = serial)
+PIPELINE_PROCESSES = 1      # Pipeline worker processes claiming batches from the job queue
+
+# === JOB QUEUE ===
+JOB_BATCH_SIZE = 200        # Threads a pipeline worker claims and takes through all stages at a time
+JOB_MAX_ATTEMPTS = 3        # Attempts at a stage before a thread is marked failed
+JOB_BACKOFF = 5.0           # Base seconds before a failed stage is retried (doubles per attempt)
+JOB_LEASE = 900             # Seconds after which a claim with no progress can be taken over
+
+# === SYNC DAEMON ===
+DAEMON_MIN_INTERVAL = 60.0  # Seconds between index polls while threads are active (sync_board.py --daemon)
+DAEMON_MAX_INTERVAL = 1800.0  # Longest wait between polls once the board is quiet
+DAEMON_BACKOFF = 2.0        # Poll interval multiplier after a poll that finds nothing new (or fails)
+DAEMON_MAINTENANCE_INTERVAL = 3600.0  # Seconds between PRAGMA optimize and WAL checkpoints
+DAEMON_HEALTH_PATH = os.path.join(LOGS_DIR, "sync_daemon.json")  # Daemon status, rewritten after every poll
+
+# === DATABASE WRITES ===
+INSERT_BULK = True          # synchronous=NORMAL, several threads per transaction (forum.db is always WAL)
+INSERT_THREADS_PER_TXN = 50 # Threads committed together in bulk mode
+INSERT_CACHE_KB = 65536     # SQLite page cache for bulk inserts, in KiB
+FTS_SYNC_ON_INSERT = True   # Index new posts for search.py in the same transaction; off = run search.py --sync later
+
+# === READERS ===
+READER_POOL_SIZE = 4        # Read-only forum.db connections shared by reader.py's callers
+READER_PAGE_SIZE = 50       # Posts per page
+READER_CACHE_ENTRIES = 256  # Pages kept in memory until the next write to forum.db
+
+# === EXPORT ===
+EXPORT_CHUNK_ROWS = 50000   # Posts read and written per chunk; bounds exporter memory
+EXPORT_PARTITION = "year"   # Export file layout: "year" (post year), "thread" (thread ID ranges) or "none"
+EXPORT_THREAD_BUCKET = 10000  # Thread IDs per directory with EXPORT_PARTITION = "thread"
+EXPORT_PARQUET_COMPRESSION = "zstd"  # Parquet codec (needs the pyarrow package for Parquet at all)
+
+# === METRICS ===
+METRICS_ENABLED = False     # Time stages and count bytes/posts/rows; pipeline.py --metrics turns it on per run
+METRICS_PROFILE = []        # Stages to run under a profiler, e.g. ["parse", "insert"]
+METRICS_PROFILER = "cprofile"  # "cprofile" or "pyinstrument" (needs the pyinstrument package)
 
 # === LOGGING DEFAULTS ===
 LOG_FILE_NAME = "utopia_tui.log"
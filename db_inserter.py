@@ -2,18 +2,69 @@ import os
 import sys
 import sqlite3
 import re
+import time
+from datetime import datetime, timezone
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, "database", "forum.db")
-TEXT_PHRASED_DIR = os.path.join(BASE_DIR, "text_phrased")
+from config import (
+    FORUM_DB_PATH as DB_PATH, TEXT_PHRASED_DIR,
+    INSERT_BULK, INSERT_THREADS_PER_TXN, INSERT_CACHE_KB, FTS_SYNC_ON_INSERT, FORCE_INSERT,
+)
+from fetch_state import get_store
+from handoff import read_handoff
+from search import sync_fts
+from migrations import migrate
+from cli_args import pop_option, pop_flag
+import metrics
 
-def insert_thread_to_db(thread_id, conn):
-    file_path = os.path.join(TEXT_PHRASED_DIR, f"thread_{thread_id}.txt")
-    if not os.path.exists(file_path):
-        print(f"[!] Thread {thread_id} file not found.")
-        return
+INSERT_POST_SQL = """
+    INSERT OR IGNORE INTO posts (
+        post_id, thread_id, thread_title, poster, tag,
+        raw_timestamp, iso_timestamp, content, poster_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, (SELECT poster_id FROM posters WHERE name = ?))
+"""
 
+UPSERT_THREAD_SQL = """
+    INSERT INTO threads (thread_id, title) VALUES (?, ?)
+    ON CONFLICT(thread_id) DO UPDATE SET title = excluded.title
+"""
+
+# Recomputed from the thread's own rows (a range of the (thread_id, post_id) index), so it
+# stays correct whether the insert added every post, some of them or none.
+UPSERT_THREAD_STATE_SQL = """
+    INSERT INTO thread_state (thread_id, post_count, max_post_id, last_post_time, last_synced, content_hash)
+    SELECT ?, COUNT(*), MAX(post_id),
+           (SELECT iso_timestamp FROM posts WHERE thread_id = ? ORDER BY post_id DESC LIMIT 1),
+           ?, ?
+    FROM posts WHERE thread_id = ?
+    ON CONFLICT(thread_id) DO UPDATE SET
+        post_count = excluded.post_count,
+        max_post_id = excluded.max_post_id,
+        last_post_time = excluded.last_post_time,
+        last_synced = excluded.last_synced,
+        content_hash = COALESCE(excluded.content_hash, thread_state.content_hash)
+"""
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def stored_state(conn, thread_id):
+    """(content_hash, max_post_id) from a thread's thread_state row, or (None, None) if it has none."""
+    row = conn.execute("SELECT content_hash, max_post_id FROM thread_state WHERE thread_id = ?",
+                       (thread_id,)).fetchone()
+    return tuple(row) if row else (None, None)
+
+def update_thread_state(conn, thread_id, digest=None):
+    """Refreshes a thread's thread_state row inside the caller's transaction."""
+    conn.execute(UPSERT_THREAD_STATE_SQL, (thread_id, thread_id, _now(), digest, thread_id))
+
+def read_text_phrased(file_path, thread_id):
+    """
+    Reads a text_phrased file back into (thread_title, posts). Only needed for threads
+    parsed before the JSON handoff existed; content lines starting with "PostID" or
+    "=== END POST ===" are misread by this format.
+    """
     with open(file_path, "r", encoding="utf-8") as f:
         lines = f.readlines()
 
@@ -88,21 +139,54 @@ def insert_thread_to_db(thread_id, conn):
         current_post_data["content"] = "\n".join(current_content_lines).strip()
         posts.append(current_post_data)
 
+    return thread_title, posts
+
+@metrics.timed("insert")
+def insert_thread_to_db(thread_id, conn, commit=True, parsed=None):
+    """
+    Inserts one parsed thread: `parsed` when the parser hands it over in memory, otherwise
+    its handoff file, falling back to a text_phrased file from older runs.
+    Returns (posts inserted, parsed hash). With commit=False the caller owns the
+    transaction and records the hash via mark_inserted after committing.
+
+    A thread is skipped when forum.db's own thread_state row already carries the hash just
+    parsed: that row is written in the same transaction as the posts, so a lost or replaced
+    forum.db is refilled rather than trusted from metadata.db. FORCE_INSERT skips the check.
+    """
+    state = get_store().get(thread_id)
+    stored_hash, max_post_id = stored_state(conn, thread_id)
+    if not FORCE_INSERT and state and state["parsed_hash"] and stored_hash == state["parsed_hash"]:
+        print(f"[=] Thread {thread_id} unchanged since last insert, skipping")
+        metrics.count("insert.skipped")
+        conn.execute("UPDATE thread_state SET last_synced = ? WHERE thread_id = ?", (_now(), thread_id))
+        if commit:
+            conn.commit()
+        return 0, None
+
+    if parsed is None:
+        parsed = read_handoff(thread_id)
+    if parsed is not None:
+        thread_title, posts = parsed["thread_title"], parsed["posts"]
+        if parsed.get("tail_after") and (max_post_id or 0) < parsed["tail_after"]:
+            # A tail handoff continues posts this database does not have (e.g. a new forum.db)
+            raise ValueError(f"handoff holds only the posts after #{parsed['tail_after']}, which are "
+                             f"not in the database; parse the thread again with FORCE_PARSE")
+    else:
+        file_path = os.path.join(TEXT_PHRASED_DIR, f"thread_{thread_id}.txt")
+        if not os.path.exists(file_path):
+            print(f"[!] Thread {thread_id} file not found.")
+            return 0, None
+        thread_title, posts = read_text_phrased(file_path, thread_id)
+
     # Insert into DB
-    cursor = conn.cursor()
+    rows = []
+    required_keys = ["post_id", "thread_id", "poster", "tag", "raw_timestamp", "iso_timestamp", "content"]
     for post in posts:
         # Ensure all required keys are present before insertion
-        required_keys = ["post_id", "thread_id", "poster", "tag", "raw_timestamp", "iso_timestamp", "content"]
         if not all(key in post for key in required_keys):
             print(f"Skipping incomplete post from thread {thread_id}: {post}")
             continue
-
-        cursor.execute("""
-            INSERT OR IGNORE INTO posts (
-                post_id, thread_id, thread_title, poster, tag,
-                raw_timestamp, iso_timestamp, content
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        rows.append((
             post["post_id"],
             post["thread_id"],
             thread_title,
@@ -110,37 +194,145 @@ def insert_thread_to_db(thread_id, conn):
             post["tag"],
             post["raw_timestamp"],
             post["iso_timestamp"],
-            post["content"]
+            post["content"],
+            post["poster"]
         ))
-    conn.commit()
-    print(f"[✓] Inserted {len(posts)} posts from thread {thread_id}")
-
-def batch_insert(thread_ids):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            post_id INTEGER,
-            thread_id INTEGER,
-            thread_title TEXT,
-            poster TEXT,
-            tag TEXT,
-            raw_timestamp TEXT,
-            iso_timestamp TEXT,
-            content TEXT,
-            UNIQUE(thread_id, post_id)
-        );
-    """)
+    conn.execute(UPSERT_THREAD_SQL, (thread_id, thread_title))
+    conn.executemany("INSERT OR IGNORE INTO posters (name) VALUES (?)", {(row[3],) for row in rows})
+    inserted = conn.executemany(INSERT_POST_SQL, rows).rowcount
+    metrics.count("insert.rows", inserted)
+
+    digest = state["parsed_hash"] if state else None
+    update_thread_state(conn, thread_id, digest or (parsed or {}).get("content_hash"))
+    if commit:
+        if FTS_SYNC_ON_INSERT:
+            sync_fts(conn)
+        conn.commit()
+        if digest:
+            get_store().mark_inserted(thread_id, digest)
+    print(f"[✓] Inserted {inserted} posts from thread {thread_id}")
+    return inserted, digest
+
+TAIL_SQL = """
+    SELECT ts.max_post_id, p.poster, p.raw_timestamp, p.iso_timestamp
+    FROM thread_state ts JOIN posts p ON p.thread_id = ts.thread_id AND p.post_id = ts.max_post_id
+    WHERE ts.thread_id = ?
+"""
+
+@metrics.timed("plan.tails")
+def get_tails(conn, thread_ids):
+    """
+    Returns {thread_id: {"after", "poster", "raw_timestamp", "iso_timestamp"}} describing the last stored post
+    of each thread already in the database, for tail-only parses.
+    """
+    tails = {}
     for thread_id in thread_ids:
-        insert_thread_to_db(thread_id, conn)
-    conn.close()
+        row = conn.execute(TAIL_SQL, (thread_id,)).fetchone()
+        if row and row[0]:
+            tails[thread_id] = {"after": row[0], "poster": row[1], "raw_timestamp": row[2], "iso_timestamp": row[3]}
+    return tails
+
+def connect_db(path=DB_PATH):
+    """Opens the forum database, bringing its schema up to date."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=60)  # pipeline worker processes take turns writing
+    # WAL in every mode, so reader.py's readers never wait on a writer. The mode is stored in
+    # the database file; switching needs a moment without readers, so only do it once
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+        conn.execute("PRAGMA journal_mode=WAL")
+    migrate(conn)
+    return conn
+
+def apply_bulk_pragmas(conn, cache_kb=INSERT_CACHE_KB):
+    """
+    synchronous=NORMAL on the WAL journal: commits stay atomic and the database consistent
+    after a crash, but no longer fsync on every commit.
+    """
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_kb)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def batch_insert(thread_ids, bulk=INSERT_BULK, threads_per_txn=INSERT_THREADS_PER_TXN, conn=None):
+    """
+    Inserts a list of parsed threads. In bulk mode threads are grouped `threads_per_txn`
+    to a transaction on a WAL connection; otherwise each thread commits on its own.
+    A thread that fails is rolled back on its own and the rest of its batch still commits.
+    A caller's `conn` (from connect_db) is used instead of opening one, and left open.
+    Returns {thread_id: error} for the threads that failed.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    if bulk:
+        apply_bulk_pragmas(conn)
+    else:
+        threads_per_txn = 1
+
+    start = time.perf_counter()
+    total_rows = 0
+    pending = []  # (thread_id, parsed hash) awaiting the next commit
+    errors = {}
+    try:
+        for thread_id in thread_ids:
+            if not conn.in_transaction:
+                # IMMEDIATE: the skip check reads first, and a read transaction that later
+                # writes gets "database is locked" at once if another process committed meanwhile
+                conn.execute("BEGIN IMMEDIATE")
+            conn.execute("SAVEPOINT thread")
+            try:
+                rows, digest = insert_thread_to_db(thread_id, conn, commit=False)
+            except Exception as e:
+                conn.execute("ROLLBACK TO thread")
+                conn.execute("RELEASE thread")
+                errors[thread_id] = f"{type(e).__name__}: {e}"
+                print(f"[!] Error inserting thread {thread_id}: {e}")
+                continue
+            conn.execute("RELEASE thread")
+            total_rows += rows
+            pending.append((thread_id, digest))
+            if len(pending) >= threads_per_txn:
+                _commit(conn, pending)
+        _commit(conn, pending)
+    finally:
+        if own_conn:
+            conn.close()
+        elif conn.in_transaction:
+            conn.rollback()  # an uncommitted batch must not ride along with the caller's next commit
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed else 0.0
+    print(f"[✓] Inserted {total_rows} rows from {len(thread_ids)} threads in {elapsed:.1f}s ({rate:.0f} rows/s)")
+    if errors:
+        print(f"[!] {len(errors)} threads failed to insert")
+    return errors
+
+@metrics.timed("commit")
+def _commit(conn, pending):
+    """Commits the open transaction, then records the threads it covered as inserted."""
+    if FTS_SYNC_ON_INSERT:
+        sync_fts(conn)
+    conn.commit()
+    store = get_store()
+    for thread_id, digest in pending:
+        if digest:
+            store.mark_inserted(thread_id, digest)
+    pending.clear()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python inserter/db_inserter.py <id1> <id2> ...")
+    args = sys.argv[1:]
+    try:
+        bulk = not pop_flag(args, "--no-bulk") and INSERT_BULK
+        FORCE_INSERT = pop_flag(args, "--force") or FORCE_INSERT
+        threads_per_txn = pop_option(args, "--threads-per-txn", int, INSERT_THREADS_PER_TXN)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not args:
+        print("Usage: python inserter/db_inserter.py [--no-bulk] [--force] [--threads-per-txn N] <id1> <id2> ...")
     else:
         try:
-            thread_ids = [int(arg) for arg in sys.argv[1:]]
-            batch_insert(thread_ids)
+            thread_ids = [int(arg) for arg in args]
+            batch_insert(thread_ids, bulk=bulk, threads_per_txn=threads_per_txn)
         except ValueError:
             print("Error: Thread IDs must be integers.")
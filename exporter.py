@@ -0,0 +1,263 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from config import (
+    FORUM_DB_PATH, EXPORT_DIR, EXPORT_CHUNK_ROWS, EXPORT_PARTITION, EXPORT_THREAD_BUCKET,
+    EXPORT_PARQUET_COMPRESSION,
+)
+from cli_args import pop_option, pop_flag
+import metrics
+
+# Archive snapshots of the posts table for analysis outside the app:
+#
+#   export/<format>/<partition>/part-<first id>.<ext>     one file per partition per export
+#   export/manifest.json                                   per format: last exported id, files
+#
+# Posts are only ever inserted, so, like the search index, an export only has to pick up the
+# rows whose id is above the last one it wrote. Each export reads one consistent snapshot in
+# bounded chunks, keyed on id. On a WAL database the read transaction does not block the
+# inserter; otherwise the database is copied first. Files are written under a temporary name
+# and named after the first id they cover, so an export that dies is simply redone.
+
+COLUMNS = ["id", "thread_id", "post_id", "thread_title", "poster", "tag", "raw_timestamp", "iso_timestamp",
+           "content"]
+FORMATS = ("jsonl", "parquet", "sqlite")
+PARTITIONS = ("year", "thread", "none")
+EXTENSIONS = {"jsonl": ".jsonl.gz", "parquet": ".parquet", "sqlite": ".db"}
+MANIFEST_NAME = "manifest.json"
+
+CHUNK_SQL = f"SELECT {', '.join(COLUMNS)} FROM posts WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def partition_key(partition, row):
+    """Directory (relative to the format's) a post goes in; '' for no partitioning."""
+    if partition == "year":
+        iso_timestamp = row[7]
+        return f"year={iso_timestamp[:4] if iso_timestamp else 'unknown'}"
+    if partition == "thread":
+        low = row[1] // EXPORT_THREAD_BUCKET * EXPORT_THREAD_BUCKET
+        return f"threads={low}-{low + EXPORT_THREAD_BUCKET - 1}"
+    return ""
+
+class JsonlWriter:
+    """gzip-compressed JSON lines, one object per post."""
+    def __init__(self, path):
+        self.file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+
+    def write(self, rows):
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        self.file.write("".join(f"{encode(dict(zip(COLUMNS, row)))}\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Columnar Parquet, a row group per chunk."""
+    def __init__(self, path):
+        if pyarrow is None:
+            raise RuntimeError("Parquet export needs the pyarrow package")
+        self.schema = pyarrow.schema(
+            [(name, pyarrow.int64()) for name in COLUMNS[:3]] + [(name, pyarrow.string()) for name in COLUMNS[3:]]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=EXPORT_PARQUET_COMPRESSION)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(pyarrow.table(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
+
+class SqliteWriter:
+    """A standalone, read-only SQLite file of posts, indexed for thread and time lookups."""
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("""
+            CREATE TABLE posts (
+                id INTEGER PRIMARY KEY,
+                thread_id INTEGER,
+                post_id INTEGER,
+                thread_title TEXT,
+                poster TEXT,
+                tag TEXT,
+                raw_timestamp TEXT,
+                iso_timestamp TEXT,
+                content TEXT
+            );
+        """)
+
+    def write(self, rows):
+        self.conn.executemany(f"INSERT INTO posts VALUES ({', '.join('?' for _ in COLUMNS)})", rows)
+
+    def close(self):
+        self.conn.execute("CREATE INDEX idx_posts_thread ON posts(thread_id, post_id)")
+        self.conn.execute("CREATE INDEX idx_posts_time ON posts(iso_timestamp)")
+        self.conn.commit()
+        self.conn.close()
+        os.chmod(self.path, 0o444)
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter, "sqlite": SqliteWriter}
+
+@contextmanager
+def snapshot(db_path=FORUM_DB_PATH, scratch_dir=EXPORT_DIR):
+    """
+    A read-only connection holding one read transaction, so every chunk sees the same
+    posts. A database not in WAL mode is backed up to a scratch copy first, since a long
+    read there would hold off writers.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    copy_path = None
+    try:
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            print("[=] Database is not in WAL mode, exporting from a copy")
+            os.makedirs(scratch_dir, exist_ok=True)
+            copy_path = os.path.join(scratch_dir, f".snapshot-{os.getpid()}.db")
+            copy = sqlite3.connect(copy_path)
+            conn.backup(copy)
+            conn.close()
+            conn = copy
+            conn.isolation_level = None
+        conn.execute("BEGIN")
+        yield conn
+    finally:
+        conn.close()
+        if copy_path and os.path.exists(copy_path):
+            os.remove(copy_path)
+
+def read_chunks(conn, after, upto, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yields posts with after < id <= upto, `chunk_rows` at a time, in id order."""
+    while after < upto:
+        rows = conn.execute(CHUNK_SQL, (after, upto, chunk_rows)).fetchall()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+def load_manifest(out_dir=EXPORT_DIR):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(manifest, out_dir=EXPORT_DIR):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+@metrics.timed("export")
+def export(fmt, out_dir=EXPORT_DIR, partition=EXPORT_PARTITION, chunk_rows=EXPORT_CHUNK_ROWS, full=False,
+           db_path=FORUM_DB_PATH):
+    """
+    Exports the posts added since the last export of `fmt` into `out_dir` (all of them with
+    `full`, which starts the format's directory over). Returns the number of posts written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"unknown export format {fmt!r} (have {', '.join(FORMATS)})")
+    if partition not in PARTITIONS:
+        raise ValueError(f"unknown partition scheme {partition!r} (have {', '.join(PARTITIONS)})")
+    if fmt == "parquet" and pyarrow is None:
+        raise RuntimeError("Parquet export needs the pyarrow package")
+    format_dir = os.path.join(out_dir, fmt)
+    manifest = load_manifest(out_dir)
+    if full:
+        shutil.rmtree(format_dir, ignore_errors=True)
+        manifest.pop(fmt, None)
+    state = manifest.setdefault(fmt, {"last_id": 0, "rows": 0, "partition": partition, "files": []})
+    if state["partition"] != partition:
+        raise ValueError(f"{format_dir} is partitioned by {state['partition']}; export with --full to change it")
+    after = state["last_id"]
+
+    start = time.perf_counter()
+    writers = {}  # partition directory -> (writer, temporary path, final path)
+    written = 0
+    with snapshot(db_path, out_dir) as conn:
+        upto = conn.execute("SELECT COALESCE(MAX(id), 0) FROM posts").fetchone()[0]
+        if upto <= after:
+            print(f"[=] No posts added since the last {fmt} export (id {after})")
+            return 0
+        try:
+            for rows in read_chunks(conn, after, upto, chunk_rows):
+                groups = {}
+                for row in rows:
+                    groups.setdefault(partition_key(partition, row), []).append(row)
+                for key, group in groups.items():
+                    if key not in writers:
+                        directory = os.path.join(format_dir, key)
+                        os.makedirs(directory, exist_ok=True)
+                        path = os.path.join(directory, f"part-{after + 1:010d}{EXTENSIONS[fmt]}")
+                        tmp_path = f"{path}.tmp"
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        writers[key] = (WRITERS[fmt](tmp_path), tmp_path, path)
+                    writers[key][0].write(group)
+                written += len(rows)
+        finally:
+            for writer, _, _ in writers.values():
+                writer.close()
+
+    files = []
+    for _, tmp_path, path in writers.values():
+        os.replace(tmp_path, path)
+        files.append(os.path.relpath(path, out_dir))
+    state["files"] = sorted(set(state["files"]) | set(files))
+    state["last_id"] = upto
+    state["rows"] += written
+    state.setdefault("exports", []).append({"at": _now(), "after_id": after, "last_id": upto, "rows": written})
+    save_manifest(manifest, out_dir)
+    metrics.count("export.rows", written)
+
+    elapsed = time.perf_counter() - start
+    rate = written / elapsed if elapsed else 0.0
+    print(f"[✓] Exported {written} posts (ids {after + 1}-{upto}) to {len(files)} {fmt} files in {format_dir} "
+          f"in {elapsed:.1f}s ({rate:.0f} posts/s)")
+    return written
+
+def main():
+    args = sys.argv[1:]
+    try:
+        out_dir = pop_option(args, "--out", default=EXPORT_DIR)
+        partition = pop_option(args, "--partition", default=EXPORT_PARTITION)
+        chunk_rows = pop_option(args, "--chunk", int, EXPORT_CHUNK_ROWS)
+        full = pop_flag(args, "--full")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    if len(args) != 1 or args[0] not in FORMATS:
+        print(f"Usage: python exporter.py [--out DIR] [--partition year|thread|none] [--chunk N] [--full] "
+              f"{{{'|'.join(FORMATS)}}}")
+        return
+    if not os.path.exists(FORUM_DB_PATH):
+        print(f"[!] {FORUM_DB_PATH} not found")
+        return
+    try:
+        export(args[0], out_dir, partition, chunk_rows, full)
+    except (RuntimeError, ValueError) as e:
+        print(f"[!] {e}")
+
+if __name__ == "__main__":
+    main()
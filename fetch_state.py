@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import METADATA_DB_PATH
+
+# The footer changes on every request, so it is masked before hashing
+ANCHOR_PATTERN = re.compile(r"The current time is \w{3} \w{3} \d{1,2} \d{2}:\d{2}:\d{2} \d{4}")
+
+def content_hash(html):
+    """Hashes thread HTML with the server clock masked, so an untouched thread hashes the same on every fetch."""
+    return hashlib.sha256(ANCHOR_PATTERN.sub("The current time is -", html).encode("utf-8")).hexdigest()
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class FetchStateStore:
+    """
+    Per-thread fetch state in metadata.db: HTTP validators, content hash, byte size,
+    fetch times, the hashes last parsed and inserted, and the parser version last run.
+    Safe to share between threads.
+    """
+    def __init__(self, path=METADATA_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS fetch_state (
+                    thread_id INTEGER PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    byte_size INTEGER,
+                    last_fetched TEXT,
+                    last_changed TEXT,
+                    parsed_hash TEXT,
+                    inserted_hash TEXT,
+                    parser_version INTEGER
+                );
+            """)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(fetch_state)")}
+            if "parser_version" not in columns:
+                # Stores created before the parser was versioned
+                self.conn.execute("ALTER TABLE fetch_state ADD COLUMN parser_version INTEGER")
+
+    def get(self, thread_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM fetch_state WHERE thread_id = ?", (thread_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _upsert(self, thread_id, **fields):
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO fetch_state (thread_id, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(thread_id) DO UPDATE SET {updates}",
+                (thread_id, *fields.values()),
+            )
+
+    def record_fetch(self, thread_id, etag, last_modified, digest, byte_size, changed=True):
+        fields = dict(etag=etag, last_modified=last_modified, content_hash=digest,
+                      byte_size=byte_size, last_fetched=_now())
+        if changed:
+            fields["last_changed"] = fields["last_fetched"]
+        self._upsert(thread_id, **fields)
+
+    def touch(self, thread_id):
+        """Records a fetch that found nothing new (304 or identical content)."""
+        self._upsert(thread_id, last_fetched=_now())
+
+    def mark_parsed(self, thread_id, digest, parser_version=None):
+        self._upsert(thread_id, parsed_hash=digest, parser_version=parser_version)
+
+    def mark_inserted(self, thread_id, digest):
+        self._upsert(thread_id, inserted_hash=digest)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store():
+    """Returns this process's shared store, opening it on first use."""
+    pid = os.getpid()
+    with _stores_lock:
+        if pid not in _stores:
+            _stores[pid] = FetchStateStore()
+        return _stores[pid]
@@ -0,0 +1,30 @@
+import json
+import os
+
+from config import PARSED_DIR
+
+# Parsed threads pass from html_parser to db_inserter as one compact JSON document each:
+# {"thread_id", "thread_title", "content_hash", "posts": [{post_id, thread_id, poster, tag,
+#  raw_timestamp, iso_timestamp, content}, ...]}
+# A tail-only parse also carries "tail_after": posts holds only the posts after that post_id.
+
+def handoff_path(thread_id):
+    return os.path.join(PARSED_DIR, f"thread_{thread_id}.json")
+
+def write_handoff(parsed):
+    """Writes a parsed thread atomically, so a crash never leaves a truncated file behind."""
+    os.makedirs(PARSED_DIR, exist_ok=True)
+    path = handoff_path(parsed["thread_id"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(parsed, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+def read_handoff(thread_id):
+    """Returns the parsed thread, or None if it has not been parsed."""
+    try:
+        with open(handoff_path(thread_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
@@ -1,125 +1,347 @@
+import hashlib
 import os
 import sys
 import re
-from bs4 import BeautifulSoup
+import io
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, NavigableString, CData, Tag
 from datetime import datetime
 
 # Fix for missing '__file__' on some environments
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.timestamp_utils import infer_year
-from config import HTML_RAW_DIR, TEXT_PHRASED_DIR, FORCE_PARSE
+from config import TEXT_PHRASED_DIR, FORCE_PARSE, PARSE_JOBS, WRITE_TEXT_DUMP, PARSE_CACHE
+from fetch_state import get_store, content_hash
+from handoff import handoff_path, write_handoff
+from raw_store import get_raw_store
+from parse_cache import get_parse_cache
+from cli_args import pop_option
+import metrics
 
-def extract_posts(soup, thread_id):
-    posts = []
+# Bump whenever a change here (or in infer_year) changes what is extracted from a page: threads
+# parsed by an older version are parsed again, and their parse cache entries are not used
+PARSER_VERSION = 1
 
-    full_text = soup.get_text()
-    anchor_match = re.search(r"The current time is (\w{3}) (\w{3}) (\d{1,2}) (\d{2}:\d{2}:\d{2}) (\d{4})", full_text)
-    if not anchor_match:
-        print(f"[!] Could not find anchor timestamp in thread {thread_id}")
-        return posts
+ANCHOR_PHRASE = "The current time is"
+ANCHOR_PATTERN = re.compile(r"The current time is (\w{3}) (\w{3}) (\d{1,2}) (\d{2}:\d{2}:\d{2}) (\d{4})")
 
-    anchor = datetime.strptime(" ".join(anchor_match.groups()[1:]), "%b %d %H:%M:%S %Y")
+TITLE_PATTERN = re.compile(r"<title\b.*?</title\s*>", re.IGNORECASE | re.DOTALL)
+
+# The string types Tag.get_text() returns for ordinary tags
+TEXT_TYPES = (NavigableString, CData)
+
+def _find_anchor(soup):
+    """
+    Finds the 'The current time is ...' match. Looks at the text around the first string
+    containing the phrase before falling back to the whole document's text.
+    """
+    node = soup.find(string=lambda text: ANCHOR_PHRASE in text)
+    if node is not None and node.parent is not None:
+        match = ANCHOR_PATTERN.search(node.parent.get_text())
+        if match:
+            return match
+    return ANCHOR_PATTERN.search(soup.get_text())
+
+def _strings(node, skip):
+    """Yields the text strings under `node` in document order, leaving out the subtree `skip`."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current is skip:
+            continue
+        if isinstance(current, Tag):
+            stack.extend(reversed(current.contents))
+        elif type(current) in TEXT_TYPES:
+            yield current
+
+def _post_content(td, font_tag):
+    """
+    Post text straight from the parsed <td>: the timestamp <font> is dropped and links become
+    [label](href). Same output as get_text(separator="\n", strip=True) on a cleaned copy of the cell.
+    """
+    lines = []
+    stack = list(reversed(td.contents))
+    while stack:
+        node = stack.pop()
+        if node is font_tag:
+            continue
+        if isinstance(node, Tag):
+            href = node.get('href') if node.name == 'a' else None
+            if href:
+                label = "".join(text.strip() for text in _strings(node, font_tag))
+                lines.append(f"[{label}]({href})".strip())
+            else:
+                stack.extend(reversed(node.contents))
+        elif type(node) in TEXT_TYPES:
+            text = node.strip()
+            if text:
+                lines.append(text)
+    return "\n".join(lines)
 
+def _post_rows(soup):
+    """Yields (poster cell, post cell, timestamp <font>) for every row shaped like a post."""
     for row in soup.find_all("tr"):
         tds = row.find_all("td")
         if len(tds) != 2:
             continue
         if not tds[0].get_text(strip=True):
             continue
-        if not tds[1].find("font"):
+        font_tag = tds[1].find("font")
+        if not font_tag:
             continue
+        yield tds[0], tds[1], font_tag
 
-        try:
-            username_lines = list(tds[0].stripped_strings)
-            username = username_lines[0].lower()
-            member_tag = username_lines[1] if len(username_lines) > 1 else "Unknown"
-
-            raw_timestamp = tds[1].find("font").get_text(strip=True)
-            dow, rest = raw_timestamp.split(" ", 1)
-            iso_timestamp = infer_year(anchor, dow, rest).isoformat()
-
-            # Get post content and remove the timestamp <font> tag
-            content_td = tds[1].decode_contents()
-            soup_block = BeautifulSoup(content_td, 'html.parser')
-            font_tag = soup_block.find("font")
-            if font_tag:
-                font_tag.extract()
-
-            for a in soup_block.find_all('a'):
-                href = a.get('href')
-                label = a.get_text(strip=True)
-                if href:
-                    a.replace_with(f"[{label}]({href})")
-
-            content = soup_block.get_text(separator="\n", strip=True)
-
-            posts.append({
-                "thread_id": thread_id,
-                "username": username,
-                "member_tag": member_tag,
-                "raw_timestamp": raw_timestamp,
-                "iso_timestamp": iso_timestamp,
-                "content": content
-            })
+def _read_post(thread_id, anchor, poster_td, post_td, font_tag):
+    username_lines = list(poster_td.stripped_strings)
+    username = username_lines[0].lower()
+    member_tag = username_lines[1] if len(username_lines) > 1 else "Unknown"
+
+    raw_timestamp = font_tag.get_text(strip=True)
+    dow, rest = raw_timestamp.split(" ", 1)
+    iso_timestamp = infer_year(anchor, dow, rest).isoformat()
+
+    # Post content without the timestamp <font> tag, read from the tree already parsed
+    content = _post_content(post_td, font_tag)
+
+    return {
+        "thread_id": thread_id,
+        "username": username,
+        "member_tag": member_tag,
+        "raw_timestamp": raw_timestamp,
+        "iso_timestamp": iso_timestamp,
+        "content": content
+    }
+
+@metrics.timed("extract")
+def extract_posts(soup, thread_id, tail=None):
+    """
+    Reads every post in the thread. With `tail` (the last stored post: "poster",
+    "iso_timestamp"), `soup` starts at that post's row and only the posts after it are
+    returned; None means the first row is not the stored post.
+    """
+    posts = []
+
+    anchor_match = _find_anchor(soup)
+    if not anchor_match:
+        print(f"[!] Could not find anchor timestamp in thread {thread_id}")
+        return None if tail else posts
+
+    anchor = datetime.strptime(" ".join(anchor_match.groups()[1:]), "%b %d %H:%M:%S %Y")
 
+    for cells in _post_rows(soup):
+        try:
+            post = _read_post(thread_id, anchor, *cells)
         except Exception as e:
             print(f"[!] Error parsing post in thread {thread_id}: {e}")
             continue
 
-    return posts
+        if tail:
+            if (post["username"], post["iso_timestamp"]) != (tail["poster"], tail["iso_timestamp"]):
+                return None
+            tail = None
+            continue
+        posts.append(post)
+
+    return None if tail else posts
 
-def parse_thread_html(thread_id):
-    html_path = os.path.join(HTML_RAW_DIR, f"thread_{thread_id}.html")
-    output_path = os.path.join(TEXT_PHRASED_DIR, f"thread_{thread_id}.txt")
+def _tail_fragment(html, tail):
+    """
+    The page from the row holding the last stored post onwards, found by its raw timestamp,
+    so a grown thread is parsed from there instead of from the top. None if it is not found.
+    """
+    position = html.rfind(tail["raw_timestamp"])
+    if position < 0:
+        return None
+    start = html.rfind("<tr", 0, position)
+    return html[start:] if start >= 0 else None
+
+def _thread_title(soup, thread_id):
+    title_tag = soup.find("title")
+    return title_tag.get_text(strip=True) if title_tag else f"Thread {thread_id}"
 
-    
+def _parse_tail(html, thread_id, tail):
+    """Returns (title, posts after the stored last post), or None to fall back to a full parse."""
+    fragment = _tail_fragment(html, tail)
+    if fragment is None:
+        return None
+    posts = extract_posts(BeautifulSoup(fragment, 'html.parser'), thread_id, tail)
+    if posts is None:
+        return None
+    title_match = TITLE_PATTERN.search(html)
+    head = BeautifulSoup(title_match.group(0) if title_match else "", 'html.parser')
+    return _thread_title(head, thread_id), posts
 
-    if not os.path.exists(html_path):
+def _parse_full(html, thread_id):
+    """(title, posts) of the whole page, from the parse cache when this version has seen it."""
+    cache = get_parse_cache() if PARSE_CACHE else None
+    # Keyed on the page as stored, not content_hash: the footer that hash masks out is the
+    # anchor infer_year dates every post from
+    page_hash = hashlib.sha256(html.encode("utf-8")).hexdigest() if cache else None
+    cached = cache.get(page_hash, PARSER_VERSION) if cache else None
+    if cached:
+        metrics.count("parse.cache_hit")
+        thread_title, posts = cached
+        for post in posts:
+            post["thread_id"] = thread_id
+        return thread_title, posts
+    soup = BeautifulSoup(html, 'html.parser')
+    thread_title = _thread_title(soup, thread_id)
+    posts = extract_posts(soup, thread_id)
+    if cache:
+        metrics.count("parse.cache_miss")
+        cache.put(page_hash, PARSER_VERSION, thread_title, posts)
+    return thread_title, posts
+
+@metrics.timed("parse")
+def parse_thread_html(thread_id, tail=None):
+    """
+    Parses one thread and writes its handoff file for the inserter. Returns the parsed
+    thread, or None if there was nothing to parse or it is unchanged since the last parse.
+    With `tail` (the last stored post, from db_inserter.get_tails), only the page from that
+    post onwards is parsed and the posts after it are handed off.
+    """
+    output_path = handoff_path(thread_id)
+    raw_store = get_raw_store()
+
+    if not raw_store.has(thread_id):
         print(f"[!] HTML not found for thread {thread_id}")
         return
 
-    with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
-        soup = BeautifulSoup(file.read(), 'html.parser')
-
-    # Extract the thread title
-    title_tag = soup.find("title")
-    thread_title = title_tag.get_text(strip=True) if title_tag else f"Thread {thread_id}"
+    with raw_store.open(thread_id) as file:
+        html = file.read()
 
-    posts = extract_posts(soup, thread_id)
-    if not posts:
-        print(f"[!] No posts found in thread {thread_id}")
+    digest = content_hash(html)
+    store = get_store()
+    state = store.get(thread_id)
+    if (not FORCE_PARSE and state and state["parsed_hash"] == digest
+            and state["parser_version"] == PARSER_VERSION and os.path.exists(output_path)):
+        print(f"[=] Thread {thread_id} unchanged since last parse, skipping")
+        metrics.count("parse.skipped")
         return
 
+    parsed_tail = _parse_tail(html, thread_id, tail) if tail and not FORCE_PARSE else None
+    if parsed_tail:
+        thread_title, posts = parsed_tail
+    else:
+        if tail and not FORCE_PARSE:
+            print(f"[!] Thread {thread_id} no longer matches post #{tail['after']} on record, parsing in full")
+        tail = None
+        thread_title, posts = _parse_full(html, thread_id)
+        if not posts:
+            print(f"[!] No posts found in thread {thread_id}")
+            return
+    after = tail["after"] if tail else 0
+
+    parsed = {
+        "thread_id": thread_id,
+        "thread_title": thread_title,
+        "content_hash": digest,
+        "posts": [
+            {
+                "post_id": i,
+                "thread_id": post["thread_id"],
+                "poster": post["username"],
+                "tag": post["member_tag"],
+                "raw_timestamp": post["raw_timestamp"],
+                "iso_timestamp": post["iso_timestamp"],
+                "content": post["content"],
+            }
+            for i, post in enumerate(posts, after + 1)
+        ],
+    }
+    if tail:
+        parsed["tail_after"] = after
+    write_handoff(parsed)
+    if WRITE_TEXT_DUMP:
+        write_text_dump(parsed)
+
+    store.mark_parsed(thread_id, digest, PARSER_VERSION)
+    metrics.count("parse.posts", len(posts))
+    metrics.count("parse.tail" if tail else "parse.full")
+    if tail:
+        print(f"[✓] Parsed {len(posts)} new posts of thread {thread_id} → {output_path}")
+    else:
+        print(f"[✓] Parsed thread {thread_id} → {output_path}")
+    return parsed
+
+def write_text_dump(parsed):
+    """Writes the human-readable text_phrased/ dump of a parsed thread."""
     os.makedirs(TEXT_PHRASED_DIR, exist_ok=True)
+    output_path = os.path.join(TEXT_PHRASED_DIR, f"thread_{parsed['thread_id']}.txt")
 
     with open(output_path, 'w', encoding='utf-8') as out:
-        out.write(f"=== THREAD TITLE ===\n{thread_title}\n=== END TITLE ===\n\n")
-        for i, post in enumerate(posts, 1):
-            out.write(f"PostID {i}\n")
+        out.write(f"=== THREAD TITLE ===\n{parsed['thread_title']}\n=== END TITLE ===\n\n")
+        for post in parsed["posts"]:
+            out.write(f"PostID {post['post_id']}\n")
             out.write(f"ThreadID: {post['thread_id']}\n")
-            out.write(f"Poster: {post['username']}\n")
-            out.write(f"Tag: {post['member_tag']}\n")
+            out.write(f"Poster: {post['poster']}\n")
+            out.write(f"Tag: {post['tag']}\n")
             out.write(f"RawTime: {post['raw_timestamp']}\n")
             out.write(f"ISOTime: {post['iso_timestamp']}\n")
             out.write(f"Content:\n{post['content']}\n")
             out.write(f"=== END POST ===\n\n")
 
-    print(f"[✓] Parsed thread {thread_id} → {output_path}")
+def _parse_captured(thread_id, tail=None, collect=False):
+    """
+    Parses one thread, capturing its console output so pool workers can be reported in order.
+    Returns (thread_id, output, error, metrics). With `collect` (pool workers), the worker's
+    metrics are returned for the parent to merge; otherwise that element is None.
+    """
+    buffer = io.StringIO()
+    error = None
+    with redirect_stdout(buffer):
+        try:
+            parse_thread_html(thread_id, tail)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return thread_id, buffer.getvalue(), error, metrics.drain() if collect else None
+
+def _report(results):
+    errors = {}
+    for thread_id, output, error, snapshot in results:
+        if snapshot:
+            metrics.merge(snapshot)
+        sys.stdout.write(output)
+        if error:
+            errors[thread_id] = error
+            print(f"[!] Error parsing thread {thread_id}: {error}")
+    if errors:
+        print(f"[!] {len(errors)} threads failed to parse")
+    return errors
 
-def batch_parse(thread_ids):
+def batch_parse(thread_ids, jobs=PARSE_JOBS, tails=None):
     """
-    Parses a list of threads.
+    Parses a list of threads, across `jobs` worker processes when jobs > 1.
+    Output and errors are reported in thread order either way.
+    `tails` maps thread IDs to the last stored post, for tail-only parses.
+    Returns {thread_id: error} for the threads whose parse raised.
     """
-    for thread_id in thread_ids:
-        parse_thread_html(thread_id)
+    thread_ids = list(thread_ids)
+    thread_tails = [(tails or {}).get(thread_id) for thread_id in thread_ids]
+    if jobs > 1 and len(thread_ids) > 1:
+        chunksize = max(1, min(64, len(thread_ids) // (jobs * 4)))
+        collect = [metrics.enabled()] * len(thread_ids)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=metrics.start_worker,
+                                 initargs=(metrics.enabled(),)) as pool:
+            results = pool.map(_parse_captured, thread_ids, thread_tails, collect, chunksize=chunksize)
+            return _report(results)
+    return _report(map(_parse_captured, thread_ids, thread_tails))
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python html_parser.py <id1> <id2> ...")
+    args = sys.argv[1:]
+    try:
+        jobs = pop_option(args, "--jobs", int, PARSE_JOBS)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not args:
+        print("Usage: python html_parser.py [--jobs N] <id1> <id2> ...")
     else:
         try:
-            thread_ids = [int(arg) for arg in sys.argv[1:]]
-            batch_parse(thread_ids)
+            thread_ids = [int(arg) for arg in args]
+            batch_parse(thread_ids, jobs=jobs)
         except ValueError:
             print("Error: Thread IDs must be integers.")
@@ -0,0 +1,137 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    DOWNLOAD_RATE, DOWNLOAD_BURST, DOWNLOAD_MAX_PER_HOST,
+    DOWNLOAD_RETRIES, DOWNLOAD_BACKOFF, DOWNLOAD_TIMEOUT, DOWNLOAD_MAX_RETRY_AFTER,
+)
+
+def retryable(status):
+    """429 Too Many Requests and every 5xx are worth another attempt."""
+    return status >= 500 or status == 429
+
+def retry_after(response, limit=DOWNLOAD_MAX_RETRY_AFTER):
+    """
+    Seconds a 429 or 503 asks the client to wait (Retry-After as seconds or an HTTP date),
+    capped at `limit`; None if the response sets no usable value.
+    """
+    if response.status_code not in (429, 503):
+        return None
+    value = response.headers.get("Retry-After", "").strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(0.0, seconds), limit)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Refills at `rate` tokens per second up to `burst`.
+    A rate of 0 (or None) disables limiting.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate or 0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HostLimiter:
+    """Caps the number of in-flight requests per host."""
+    def __init__(self, max_per_host):
+        self.max_per_host = max(1, max_per_host)
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with semaphore:
+            yield
+
+def create_session(pool_size=1):
+    """Creates a requests session whose connection pool fits `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(1, pool_size), pool_maxsize=max(1, pool_size))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+class Fetcher:
+    """
+    Shared HTTP client for all download workers: one pooled session, a global
+    token bucket, a per-host concurrency cap and retries with exponential backoff.
+    """
+    def __init__(self, rate=None, burst=None, max_per_host=None,
+                 retries=None, backoff=None, timeout=None, pool_size=1):
+        # Unset arguments fall back to the config defaults at construction time
+        max_per_host = DOWNLOAD_MAX_PER_HOST if max_per_host is None else max_per_host
+        self.session = create_session(max(pool_size, max_per_host))
+        self.bucket = TokenBucket(DOWNLOAD_RATE if rate is None else rate,
+                                  DOWNLOAD_BURST if burst is None else burst)
+        self.hosts = HostLimiter(max_per_host)
+        self.retries = DOWNLOAD_RETRIES if retries is None else retries
+        self.backoff = DOWNLOAD_BACKOFF if backoff is None else backoff
+        self.timeout = DOWNLOAD_TIMEOUT if timeout is None else timeout
+        self.retry_count = 0
+        self.lock = threading.Lock()  # download workers retry concurrently
+
+    def get(self, url, headers=None):
+        """
+        GETs `url`, retrying timeouts, connection errors and retryable statuses.
+        Returns the last response, or raises the last exception if every attempt failed.
+        """
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            self.bucket.acquire()
+            try:
+                with self.hosts.slot(url):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError):
+                if last_attempt:
+                    raise
+                wait = None
+            else:
+                if not retryable(response.status_code) or last_attempt:
+                    return response
+                wait = retry_after(response)
+            with self.lock:
+                self.retry_count += 1
+            if wait is None:
+                wait = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+            time.sleep(wait)
+
+    def close(self):
+        self.session.close()
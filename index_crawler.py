@@ -0,0 +1,253 @@
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from config import FORUM_INDEX_URL, FORUM_SECTIONS, METADATA_DB_PATH, INDEX_WORKERS, INDEX_RATE
+from cli_args import pop_option
+
+# Walks every page of a section's thread index. Pages are found by following the index's
+# own pagination links (any link to the same section's index page); a link to page N also
+# stands for every page before it. Pages are fetched a wave of `workers` at a time, in
+# page order, through the shared rate limiter. The board lists threads by latest
+# activity, so once a page holds only up-to-date threads, every later page does too.
+#
+# Index pages are read with the standard library's HTMLParser rather than BeautifulSoup, and
+# requests and the thread pool are only imported once a crawl starts, so a sync that reads
+# the first page and finds nothing new loads neither.
+
+THREAD_LINK = re.compile(r'thread=(\d+)')
+
+def index_url(section, base_url=FORUM_INDEX_URL):
+    return f"{base_url}?id={section}"
+
+def _same_index(url, first_url):
+    """True if `url` is another page of the index that starts at `first_url`."""
+    a, b = urlsplit(url), urlsplit(first_url)
+    if (a.netloc, a.path) != (b.netloc, b.path):
+        return False
+    return dict(parse_qsl(a.query)).get("id") == dict(parse_qsl(b.query)).get("id")
+
+def page_number(url):
+    """Sort key for index pages: the first number in the query besides the section id, or 1."""
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key != "id" and value.isdigit():
+            return int(value)
+    return 1
+
+def page_url(template, number):
+    """`template`, a link to some index page, rewritten to point at page `number`."""
+    parts = urlsplit(template)
+    query = parse_qsl(parts.query)
+    for i, (key, value) in enumerate(query):
+        if key != "id" and value.isdigit():
+            query[i] = (key, str(number))
+            break
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+class IndexPageParser(HTMLParser):
+    """
+    Collects the table rows of an index page, as {"header", "cells"} with each <td> cell's
+    text and first link (href, text), plus every link href on the page.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.hrefs = []
+        self.row = None
+        self.cell = None
+        self.link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            classes = (dict(attrs).get("class") or "").split()
+            self.row = {"header": "highlight" in classes, "cells": []}
+            self.rows.append(self.row)
+            self.cell = self.link = None
+        elif tag == "td" and self.row is not None:
+            self.cell = {"text": [], "link": None}
+            self.row["cells"].append(self.cell)
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href is None:
+                return
+            self.hrefs.append(href)
+            if self.cell is not None and self.cell["link"] is None:
+                self.link = [href, []]
+                self.cell["link"] = self.link
+
+    def handle_endtag(self, tag):
+        if tag == "a":
+            self.link = None
+        elif tag == "td":
+            self.cell = self.link = None
+        elif tag in ("tr", "table"):
+            self.row = self.cell = self.link = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell["text"].append(data)
+        if self.link is not None:
+            self.link[1].append(data)
+
+def _stripped(parts):
+    """Text parts joined the way BeautifulSoup's get_text(strip=True) joins them."""
+    return "".join(part.strip() for part in parts)
+
+def parse_index_page(html, page_url=None):
+    """
+    Reads one index page. Returns (threads, links): threads as {thread_id: {"title",
+    "post_count"}} in listing order, and the URLs of other pages of the same index.
+    """
+    parser = IndexPageParser()
+    parser.feed(html)
+    parser.close()
+    threads = {}
+    for row in parser.rows:
+        if row["header"]:
+            continue
+
+        cells = row["cells"]
+        if len(cells) < 2 or not cells[0]["link"]:
+            continue
+        href, title = cells[0]["link"]
+        match = THREAD_LINK.search(href)
+        if not match:
+            continue
+        thread_id = int(match.group(1))
+        try:
+            post_count = int(_stripped(cells[1]["text"]))
+        except ValueError:
+            print(f"[!] Could not parse post count for thread {thread_id}")
+            continue
+        threads[thread_id] = {"title": _stripped(title), "post_count": post_count}
+
+    links = []
+    if page_url:
+        for href in parser.hrefs:
+            url = urljoin(page_url, href)
+            if not THREAD_LINK.search(url) and _same_index(url, page_url):
+                links.append(url)
+    return threads, links
+
+def crawl_section(section, fetcher, workers=INDEX_WORKERS, is_current=None, base_url=FORUM_INDEX_URL):
+    """
+    Crawls one section's index. `is_current(threads)` says whether every thread on a page is
+    already up to date; the crawl stops after the first such page. Returns
+    {thread_id: {"title", "post_count", "page"}}.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    first = index_url(section, base_url)
+    seen = {page_number(first)}
+    frontier = [first]
+    found = {}
+    fetched = 0
+
+    def fetch(url):
+        try:
+            response = fetcher.get(url)
+        except Exception as e:
+            print(f"[!] Error fetching index page {url}: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"[!] Index page {url} returned status {response.status_code}")
+            return None
+        return parse_index_page(response.text, url)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while frontier:
+            frontier.sort(key=page_number)
+            wave, frontier = frontier[:workers], frontier[workers:]
+            fetched += len(wave)
+            stop = False
+            for url, result in zip(wave, pool.map(fetch, wave)):
+                if result is None:
+                    continue
+                threads, links = result
+                page = page_number(url)
+                for thread_id, info in threads.items():
+                    if thread_id not in found:
+                        found[thread_id] = dict(info, page=page)
+                for link in links:
+                    for number in range(2, page_number(link) + 1):
+                        if number not in seen:
+                            seen.add(number)
+                            frontier.append(page_url(link, number))
+                if is_current and is_current({t: info["post_count"] for t, info in threads.items()}):
+                    print(f"[=] {section}: page {page} is up to date, stopping")
+                    stop = True
+            if stop:
+                break
+            print(f"{section}: {len(found)} threads from {fetched} pages")
+    return found
+
+def save_index(threads, section, path=METADATA_DB_PATH):
+    """Records discovered threads in metadata.db's index_threads table."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS index_threads (
+                    thread_id INTEGER PRIMARY KEY,
+                    section TEXT,
+                    title TEXT,
+                    post_count INTEGER,
+                    page INTEGER,
+                    first_seen TEXT,
+                    last_seen TEXT
+                );
+            """)
+            conn.executemany("""
+                INSERT INTO index_threads (thread_id, section, title, post_count, page, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET
+                    section = excluded.section,
+                    title = excluded.title,
+                    post_count = excluded.post_count,
+                    page = excluded.page,
+                    last_seen = excluded.last_seen
+            """, [(thread_id, section, info["title"], info["post_count"], info["page"], now, now)
+                  for thread_id, info in threads.items()])
+    finally:
+        conn.close()
+
+def crawl_index(sections=FORUM_SECTIONS, workers=INDEX_WORKERS, rate=INDEX_RATE, is_current=None,
+                base_url=FORUM_INDEX_URL):
+    """
+    Crawls and records the index of each section. Returns {thread_id: post_count} across
+    all of them.
+    """
+    from http_client import Fetcher
+    fetcher = Fetcher(rate=rate, pool_size=workers)
+    post_counts = {}
+    try:
+        for section in sections:
+            print(f"Crawling index of {section}...")
+            threads = crawl_section(section, fetcher, workers, is_current, base_url)
+            save_index(threads, section)
+            post_counts.update((t, info["post_count"]) for t, info in threads.items())
+            print(f"[✓] {section}: {len(threads)} threads discovered")
+    finally:
+        fetcher.close()
+    return post_counts
+
+def main():
+    args = sys.argv[1:]
+    try:
+        workers = pop_option(args, "--workers", int, INDEX_WORKERS)
+        rate = pop_option(args, "--rate", float, INDEX_RATE)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    sections = args or FORUM_SECTIONS
+    post_counts = crawl_index(sections, workers=workers, rate=rate)
+    print(f"Discovered {len(post_counts)} threads in {len(sections)} sections.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config import METADATA_DB_PATH, JOB_MAX_ATTEMPTS, JOB_BACKOFF, JOB_LEASE
+
+# Durable per-thread pipeline progress in metadata.db's jobs table, so an interrupted run can
+# pick up where it stopped instead of starting over.
+#
+#   pending → downloaded → parsed → inserted      each state records the last stage completed
+#                                   failed        JOB_MAX_ATTEMPTS attempts at failed_stage
+#
+# Each pipeline run has a run_id; its workers (threads or processes, possibly several runs of
+# pipeline.py) claim batches of its jobs under BEGIN IMMEDIATE, so no two claim the same job.
+# A claim lapses after JOB_LEASE seconds without progress, or as soon as its process is gone.
+# A failed stage is retried after JOB_BACKOFF * 2^(attempt - 1) seconds.
+
+ACTIVE_STATES = ("pending", "downloaded", "parsed")
+STATE_BEFORE = {"download": "pending", "parse": "downloaded", "insert": "parsed"}
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def new_run_id():
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobQueue:
+    """Pipeline jobs for one process. Open one per process; safe to share between its threads."""
+    def __init__(self, path=METADATA_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.host = socket.gethostname()
+        self.worker = f"{self.host}:{os.getpid()}"
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            with self.conn:
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        thread_id INTEGER PRIMARY KEY,
+                        run_id TEXT NOT NULL,
+                        state TEXT NOT NULL DEFAULT 'pending',
+                        failed_stage TEXT,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        last_error TEXT,
+                        next_attempt REAL NOT NULL DEFAULT 0,
+                        claimed_by TEXT,
+                        claimed_at REAL,
+                        updated TEXT
+                    );
+                """)
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run_id, state, next_attempt)")
+
+    def enqueue(self, thread_ids, run_id, resume=False):
+        """
+        Adds threads to run `run_id`. Threads already in the table restart from pending,
+        unless `resume`, which keeps how far each one got. Jobs held by a live claim are
+        taken over only once it lapses.
+        """
+        self.release_dead()
+        now = time.time()
+        if resume:
+            sql = """
+                INSERT INTO jobs (thread_id, run_id, updated) VALUES (?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET run_id = excluded.run_id
+            """
+        else:
+            sql = """
+                INSERT INTO jobs (thread_id, run_id, updated) VALUES (?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET
+                    run_id = excluded.run_id, state = 'pending', failed_stage = NULL, attempts = 0,
+                    last_error = NULL, next_attempt = 0, claimed_by = NULL, claimed_at = NULL,
+                    updated = excluded.updated
+                WHERE jobs.claimed_by IS NULL OR jobs.claimed_at < ?
+            """
+        updated = _now()
+        params = [(thread_id, run_id, updated) if resume else (thread_id, run_id, updated, now - JOB_LEASE)
+                  for thread_id in thread_ids]
+        with self.lock, self.conn:
+            self.conn.executemany(sql, params)
+
+    def retry_failed(self, run_id=None):
+        """Puts failed jobs (of `run_id`, or all) back in the state before the stage that failed."""
+        sql = """
+            UPDATE jobs SET
+                state = CASE failed_stage WHEN 'download' THEN 'pending' WHEN 'parse' THEN 'downloaded'
+                        ELSE 'parsed' END,
+                attempts = 0, next_attempt = 0, updated = ?
+            WHERE state = 'failed'
+        """
+        params = [_now()]
+        if run_id:
+            sql += " AND run_id = ?"
+            params.append(run_id)
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params).rowcount
+
+    def claim(self, run_id, limit):
+        """Claims up to `limit` of the run's ready jobs, lowest thread first. Returns [(thread_id, state)]."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute("""
+                    SELECT thread_id, state FROM jobs
+                    WHERE run_id = ? AND state IN ('pending', 'downloaded', 'parsed') AND next_attempt <= ?
+                      AND (claimed_by IS NULL OR claimed_at < ?)
+                    ORDER BY thread_id LIMIT ?
+                """, (run_id, now, now - JOB_LEASE, limit)).fetchall()
+                self.conn.executemany("UPDATE jobs SET claimed_by = ?, claimed_at = ? WHERE thread_id = ?",
+                                      [(self.worker, now, thread_id) for thread_id, _ in rows])
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return rows
+
+    def advance(self, thread_ids, state):
+        """Records a completed stage for claimed jobs; an inserted job is released."""
+        claimed_by = None if state == "inserted" else self.worker
+        now = time.time()
+        updated = _now()
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                UPDATE jobs SET state = ?, attempts = 0, last_error = NULL, claimed_by = ?, claimed_at = ?,
+                    updated = ?
+                WHERE thread_id = ? AND claimed_by = ?
+            """, [(state, claimed_by, now, updated, thread_id, self.worker) for thread_id in thread_ids])
+
+    def fail(self, thread_id, stage, error):
+        """Records a failed stage and releases the job: retried after a backoff, or failed for good."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                UPDATE jobs SET
+                    attempts = attempts + 1, failed_stage = ?, last_error = ?,
+                    state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE state END,
+                    next_attempt = ? + ? * (1 << attempts), claimed_by = NULL, claimed_at = NULL, updated = ?
+                WHERE thread_id = ?
+            """, (stage, error, JOB_MAX_ATTEMPTS, now, JOB_BACKOFF, _now(), thread_id))
+
+    def next_retry(self, run_id):
+        """Seconds until the run's next job waiting on a backoff is due, or None if none is waiting."""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT MIN(next_attempt) FROM jobs
+                WHERE run_id = ? AND state IN ('pending', 'downloaded', 'parsed') AND claimed_by IS NULL
+            """, (run_id,)).fetchone()
+        return max(0.0, row[0] - time.time()) if row[0] is not None else None
+
+    def release(self):
+        """Drops this process's claims, e.g. on interrupt."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?",
+                              (self.worker,))
+
+    def release_dead(self):
+        """Drops claims held by processes on this host that no longer exist."""
+        with self.lock:
+            workers = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT claimed_by FROM jobs WHERE claimed_by LIKE ?", (f"{self.host}:%",))]
+        dead = [worker for worker in workers if not _alive(int(worker.rsplit(":", 1)[1]))]
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE jobs SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?",
+                                  [(worker,) for worker in dead])
+
+    def latest_run(self):
+        with self.lock:
+            return self.conn.execute("SELECT MAX(run_id) FROM jobs").fetchone()[0]
+
+    def unfinished(self, run_id):
+        """Thread IDs of the run not inserted yet, failed ones included."""
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT thread_id FROM jobs WHERE run_id = ? AND state != 'inserted' ORDER BY thread_id", (run_id,))]
+
+    def counts(self, run_id):
+        """{state: jobs} for a run."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY state",
+                                          (run_id,)).fetchall())
+
+    def failures(self, run_id=None):
+        """[(thread_id, failed_stage, attempts, last_error)] of failed jobs."""
+        sql = "SELECT thread_id, failed_stage, attempts, last_error FROM jobs WHERE state = 'failed'"
+        params = []
+        if run_id:
+            sql += " AND run_id = ?"
+            params.append(run_id)
+        with self.lock:
+            return self.conn.execute(sql + " ORDER BY thread_id", params).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+def main():
+    args = sys.argv[1:]
+    queue = JobQueue()
+    try:
+        run_id = queue.latest_run()
+        if not run_id:
+            print("No pipeline runs recorded.")
+        elif args == ["--failed"]:
+            for thread_id, stage, attempts, error in queue.failures():
+                print(f"{thread_id:>8}  {stage:<8}  {attempts} attempts  {error}")
+        elif args == ["--retry-failed"]:
+            print(f"[✓] {queue.retry_failed(run_id)} failed jobs of run {run_id} will be retried by pipeline.py --resume")
+        elif args:
+            print("Usage: python job_queue.py [--failed | --retry-failed]")
+        else:
+            counts = queue.counts(run_id)
+            summary = ", ".join(f"{counts.get(state, 0)} {state}" for state in ACTIVE_STATES + ("inserted", "failed"))
+            print(f"Run {run_id}: {summary}")
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()
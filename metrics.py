@@ -0,0 +1,296 @@
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from config import LOGS_DIR, METRICS_ENABLED, METRICS_PROFILE, METRICS_PROFILER
+from cli_args import pop_option, pop_flag
+
+# Run-wide timers, counters and latency histograms. Everything is a no-op until enable()
+# is called: a disabled timer costs one function call and a flag check.
+#
+#   @timed("parse")                    per-call latency histogram and error count for a stage
+#   count("download.bytes", n)         monotonically increasing counter
+#   observe("download.size", n)        histogram of an arbitrary value
+#
+# write_report() saves a JSON run report, write_prometheus() the same numbers in Prometheus
+# text format. With profiling on for a stage, its calls run under cProfile (or pyinstrument)
+# and the profile is saved next to the report.
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_counters = {}
+_histograms = {}
+_profile_stages = set()
+_profiler_kind = METRICS_PROFILER
+_profilers = {}
+_started = None
+
+class Histogram:
+    """Bucketed distribution with count, sum and max, merged across threads and processes."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 6),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+def enabled():
+    return _enabled
+
+def enable(profile=(), profiler=None):
+    """Starts collecting. `profile` names the stages to run under the profiler."""
+    global _enabled, _started, _profiler_kind
+    if profiler not in (None, "cprofile", "pyinstrument"):
+        raise ValueError(f"unknown profiler {profiler!r}")
+    with _lock:
+        _enabled = True
+        _started = _started or time.time()
+        _profile_stages.update(profile)
+        if profiler:
+            _profiler_kind = profiler
+
+def count(name, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def observe(name, value, buckets=LATENCY_BUCKETS):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(buckets)
+        histogram.add(value)
+
+def timed(stage):
+    """Decorator: records each call's latency under `stage`, and exceptions as errors."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            profiler = _start_profiler(stage)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                count(f"{stage}.errors")
+                raise
+            finally:
+                observe(f"{stage}.seconds", time.perf_counter() - start)
+                if profiler:
+                    _stop_profiler(profiler)
+        return wrapper
+    return decorate
+
+def _start_profiler(stage):
+    # One profiler per (stage, thread); nested stages in the same thread are not profiled
+    # separately, since only one profiler can be active per thread.
+    if stage not in _profile_stages or getattr(_local, "profiling", False):
+        return None
+    key = (stage, threading.get_ident())
+    with _lock:
+        profiler = _profilers.get(key)
+        if profiler is None:
+            if _profiler_kind == "pyinstrument":
+                from pyinstrument import Profiler
+                profiler = Profiler()
+            else:
+                import cProfile
+                profiler = cProfile.Profile()
+            _profilers[key] = profiler
+    _local.profiling = True
+    if _profiler_kind == "pyinstrument":
+        profiler.start()
+    else:
+        profiler.enable()
+    return profiler
+
+def _stop_profiler(profiler):
+    if _profiler_kind == "pyinstrument":
+        profiler.stop()
+    else:
+        profiler.disable()
+    _local.profiling = False
+
+def drain():
+    """Returns and clears this process's counters and histograms, for merging into the parent."""
+    with _lock:
+        snapshot = (dict(_counters), dict(_histograms))
+        _counters.clear()
+        _histograms.clear()
+    return snapshot
+
+def start_worker(enable_metrics):
+    """Pool initializer: drops whatever a forked worker inherited from its parent."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _profilers.clear()
+    if enable_metrics:
+        enable()
+
+def merge(snapshot):
+    counters, histograms = snapshot
+    with _lock:
+        for name, value in counters.items():
+            _counters[name] = _counters.get(name, 0) + value
+        for name, histogram in histograms.items():
+            if name in _histograms:
+                _histograms[name].merge(histogram)
+            else:
+                _histograms[name] = histogram
+
+def report():
+    """The run so far as a JSON-serialisable dict."""
+    with _lock:
+        return {
+            "started": datetime.fromtimestamp(_started).isoformat(timespec="seconds") if _started else None,
+            "wall_seconds": round(time.time() - _started, 3) if _started else 0.0,
+            "counters": dict(sorted(_counters.items())),
+            "histograms": {name: histogram.to_dict() for name, histogram in sorted(_histograms.items())},
+        }
+
+def _metric_name(name):
+    return "tui_" + "".join(c if c.isalnum() else "_" for c in name)
+
+def prometheus_text():
+    """The run so far in Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            metric = _metric_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, histogram in sorted(_histograms.items()):
+            metric = _metric_name(name)
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {histogram.sum:.6f}", f"{metric}_count {histogram.count}"]
+    return "\n".join(lines) + "\n"
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+def default_report_path():
+    return os.path.join(LOGS_DIR, f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+def write_report(path=None):
+    return _write(path or default_report_path(), json.dumps(report(), indent=2))
+
+def write_prometheus(path):
+    return _write(path, prometheus_text())
+
+def write_profiles(directory=LOGS_DIR):
+    """Saves each profiled stage's combined profile. Returns the paths written."""
+    paths = []
+    with _lock:
+        by_stage = {}
+        for (stage, _), profiler in _profilers.items():
+            by_stage.setdefault(stage, []).append(profiler)
+    for stage, profilers in by_stage.items():
+        if _profiler_kind == "pyinstrument":
+            text = "\n".join(profiler.output_text() for profiler in profilers)
+            paths.append(_write(os.path.join(directory, f"profile_{stage}.txt"), text))
+        else:
+            import pstats
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            path = os.path.join(directory, f"profile_{stage}.prof")
+            os.makedirs(directory, exist_ok=True)
+            stats.dump_stats(path)
+            paths.append(path)
+    return paths
+
+def print_summary():
+    data = report()
+    print(f"\n----- METRICS ({data['wall_seconds']:.1f}s wall) -----")
+    print(f"{'timer':<22} {'calls':>7} {'total s':>9} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, h in data["histograms"].items():
+        if name.endswith(".seconds"):
+            print(f"{name[:-8]:<22} {h['count']:>7} {h['sum']:>9.2f} {h['mean'] * 1000:>8.1f} "
+                  f"{h['p95'] * 1000:>8.1f} {h['max'] * 1000:>8.1f}")
+    for name, value in data["counters"].items():
+        print(f"{name:<22} {value:>7}")
+
+def finish(report_path=None, prometheus_path=None):
+    """Prints the summary and writes the report, the Prometheus file and any profiles."""
+    if not _enabled:
+        return
+    print_summary()
+    print(f"[✓] Metrics report → {write_report(report_path)}")
+    if prometheus_path:
+        print(f"[✓] Prometheus metrics → {write_prometheus(prometheus_path)}")
+    for path in write_profiles(os.path.dirname(os.path.abspath(report_path)) if report_path else LOGS_DIR):
+        print(f"[✓] Profile → {path}")
+
+def pop_metrics_options(args):
+    """
+    Removes the shared --metrics, --metrics-out PATH, --prometheus PATH, --profile STAGE[,STAGE]
+    and --profiler NAME options from args, enabling collection if any is given.
+    Returns (report path, Prometheus path).
+    """
+    report_path = pop_option(args, "--metrics-out")
+    prometheus_path = pop_option(args, "--prometheus")
+    profile = pop_option(args, "--profile", lambda value: [s for s in value.split(",") if s], [])
+    profiler = pop_option(args, "--profiler")
+    if pop_flag(args, "--metrics") or report_path or prometheus_path or profile:
+        enable(profile, profiler)
+    return report_path, prometheus_path
+
+if METRICS_ENABLED:
+    enable(METRICS_PROFILE)
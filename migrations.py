@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import sys
+
+from config import FORUM_DB_PATH
+from search import FTS_STATEMENTS
+
+# forum.db schema history. PRAGMA user_version records the last migration applied;
+# each migration runs in its own transaction. Append new steps, never edit old ones.
+
+def _create_posts(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER,
+            thread_id INTEGER,
+            thread_title TEXT,
+            poster TEXT,
+            tag TEXT,
+            raw_timestamp TEXT,
+            iso_timestamp TEXT,
+            content TEXT,
+            UNIQUE(thread_id, post_id)
+        );
+    """)
+
+def _create_search_index(conn):
+    for statement in FTS_STATEMENTS:
+        conn.execute(statement)
+
+def _normalize_and_index(conn):
+    # Title and poster name move to their own tables. posts keeps its text columns because
+    # the search index reads them, and gains poster_id for compact poster/time lookups.
+    # (thread_id, post_id) is already covered by the UNIQUE constraint's index.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS threads (
+            thread_id INTEGER PRIMARY KEY,
+            title TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS posters (
+            poster_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+    """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(posts)")]
+    if "poster_id" not in columns:
+        conn.execute("ALTER TABLE posts ADD COLUMN poster_id INTEGER REFERENCES posters(poster_id)")
+
+    conn.execute("""
+        INSERT OR IGNORE INTO threads (thread_id, title)
+        SELECT thread_id, thread_title FROM posts
+        WHERE id IN (SELECT MAX(id) FROM posts GROUP BY thread_id)
+    """)
+    conn.execute("INSERT OR IGNORE INTO posters (name) SELECT DISTINCT poster FROM posts WHERE poster IS NOT NULL")
+    conn.execute("""
+        UPDATE posts SET poster_id = (SELECT poster_id FROM posters WHERE name = posts.poster)
+        WHERE poster_id IS NULL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_poster_time ON posts(poster_id, iso_timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_time ON posts(iso_timestamp)")
+
+def _create_thread_state(conn):
+    # One row per thread, maintained by the inserter, so sync planning is a keyed lookup
+    # instead of an aggregate over posts.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thread_state (
+            thread_id INTEGER PRIMARY KEY,
+            post_count INTEGER NOT NULL,
+            max_post_id INTEGER,
+            last_post_time TEXT,
+            last_synced TEXT,
+            content_hash TEXT
+        );
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO thread_state (thread_id, post_count, max_post_id, last_post_time)
+        SELECT s.thread_id, s.post_count, s.max_post_id,
+               (SELECT iso_timestamp FROM posts p WHERE p.thread_id = s.thread_id AND p.post_id = s.max_post_id)
+        FROM (SELECT thread_id, COUNT(*) AS post_count, MAX(post_id) AS max_post_id
+              FROM posts GROUP BY thread_id) s
+    """)
+
+MIGRATIONS = [
+    (1, "posts table", _create_posts),
+    (2, "full-text search index", _create_search_index),
+    (3, "threads/posters tables and poster, time indexes", _normalize_and_index),
+    (4, "thread_state table", _create_thread_state),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, verbose=False):
+    """
+    Applies every migration newer than the database's user_version. Safe to run from
+    several processes at once: the version is re-read under a write lock before each step.
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    for number, name, step in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= number:
+                conn.execute("COMMIT")
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if verbose:
+            print(f"[✓] Applied migration {number}: {name}")
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(FORUM_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        before = schema_version(conn)
+        migrate(conn, verbose=True)
+        print(f"Schema version {before} → {schema_version(conn)}")
+    except sqlite3.Error as e:
+        print(f"[!] Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
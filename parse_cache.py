@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from config import PARSE_CACHE_DB_PATH, PARSE_CACHE_MAX_MB, RAW_CODEC
+from raw_store import _codec, compress, decompress
+
+# What html_parser extracted from a page, keyed on (sha256 of the page, parser version), in
+# database/parse_cache.db. The hash covers the whole page: the "The current time is" footer
+# that content_hash masks out is what post years are inferred from. A thread whose HTML is
+# unchanged is not run through BeautifulSoup again even when its handoff has to be rewritten
+# (FORCE_PARSE, a lost parsed/ directory, a reset metadata.db); bumping
+# html_parser.PARSER_VERSION misses every entry of the old version at once. Each entry is the
+# title and the posts as compact JSON rows, compressed with the raw pack's codec. Once the
+# stored bytes pass `max_mb`, other versions' entries and then the least recently used ones
+# are deleted until the cache is back under 90% of it.
+
+POST_FIELDS = ("username", "member_tag", "raw_timestamp", "iso_timestamp", "content")
+TRIM_TO = 0.9
+
+class ParseCache:
+    """Cached extract_posts output in a SQLite database. Safe to share between threads."""
+    def __init__(self, path=PARSE_CACHE_DB_PATH, max_mb=PARSE_CACHE_MAX_MB, codec=RAW_CODEC):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = int(max_mb * 2**20)
+        self.codec = _codec(codec)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # A cache: a lost last commit costs a re-parse, so no fsync per hit
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    digest TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (digest, version)
+                );
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)")
+            self.stored = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, digest, version):
+        """(title, [post dicts without thread_id]) for a page's sha256, or None if it is not cached."""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT codec, data FROM entries WHERE digest = ? AND version = ?",
+                                    (digest, version)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE digest = ? AND version = ?",
+                              (time.time(), digest, version))
+        entry = json.loads(decompress(row[1], row[0]))
+        return entry["title"], [dict(zip(POST_FIELDS, post)) for post in entry["posts"]]
+
+    def put(self, digest, version, title, posts):
+        """Stores what a full parse of a page returned, trimming the cache if it is over its size."""
+        entry = {"title": title, "posts": [[post[field] for field in POST_FIELDS] for post in posts]}
+        data = compress(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), self.codec)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (digest, version, codec, size, data, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, version, self.codec, len(data), data, time.time()),
+            )
+            self.stored += len(data)
+        if self.stored > self.max_bytes:
+            self.trim(version)
+
+    def prune(self, version):
+        """Deletes the entries of every other parser version. Returns how many there were."""
+        with self.lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM entries WHERE version != ?", (version,)).rowcount
+            self.stored = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return deleted
+
+    def trim(self, version):
+        """
+        Deletes entries of other parser versions, then the least recently used, until the
+        cache is under TRIM_TO of its size. Returns the number of entries deleted.
+        """
+        target = int(self.max_bytes * TRIM_TO)
+        with self.lock:
+            # Other processes write here too; start from the real total
+            self.stored = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if self.stored <= target:
+            return 0
+        deleted = self.prune(version)
+        with self.lock, self.conn:
+            victims, freed = [], 0
+            for digest, size in self.conn.execute("SELECT digest, size FROM entries ORDER BY last_used"):
+                if self.stored - freed <= target:
+                    break
+                victims.append((digest, version))
+                freed += size
+            self.conn.executemany("DELETE FROM entries WHERE digest = ? AND version = ?", victims)
+            self.stored -= freed
+        return deleted + len(victims)
+
+    def stats(self):
+        """[(parser version, entries, stored bytes)], newest version first."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT version, COUNT(*), SUM(size) FROM entries GROUP BY version ORDER BY version DESC"
+            ).fetchall()
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries")
+            self.stored = 0
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        self.conn.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_parse_cache():
+    """Returns this process's shared parse cache, opening it on first use."""
+    pid = os.getpid()
+    with _caches_lock:
+        if pid not in _caches:
+            _caches[pid] = ParseCache()
+        return _caches[pid]
+
+def main():
+    args = sys.argv[1:]
+    cache = ParseCache()
+    try:
+        if args == ["--clear"]:
+            cache.clear()
+            print("[✓] Parse cache cleared")
+            return
+        elif args == ["--prune"]:
+            from formatter.html_parser import PARSER_VERSION
+            print(f"[✓] Removed {cache.prune(PARSER_VERSION)} entries of other parser versions")
+            return
+        elif args:
+            print("Usage: python parse_cache.py [--clear | --prune]")
+            return
+
+        rows = cache.stats()
+        if not rows:
+            print("Parse cache is empty")
+        for version, entries, stored in rows:
+            print(f"parser version {version}: {entries} threads, {stored / 1e6:.1f} MB ({cache.codec})")
+        print(f"limit {cache.max_bytes / 1e6:.0f} MB")
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,329 @@
+import multiprocessing
+import os
 import sys
-from fetcher.thread_downloader import download_threads
-from formatter.html_parser import batch_parse
-from inserter.db_inserter import batch_insert
+import queue
+import threading
+import time
+from fetcher.thread_downloader import download_threads, download_thread
+from formatter.html_parser import batch_parse, parse_thread_html
+from inserter.db_inserter import batch_insert, insert_thread_to_db, connect_db, apply_bulk_pragmas, get_tails
+from config import (
+    FORUM_BASE_URL, DOWNLOAD_WORKERS, DOWNLOAD_RATE, PIPELINE_STREAMING, PIPELINE_QUEUE_DEPTH, PARSE_JOBS,
+    INSERT_BULK, PIPELINE_PROCESSES, JOB_BATCH_SIZE,
+)
+from handoff import handoff_path
+from http_client import Fetcher
+from job_queue import JobQueue, new_run_id, ACTIVE_STATES, STATE_BEFORE
+from cli_args import pop_option, pop_flag
+import metrics
 
-def run_pipeline(thread_ids):
+class StageStats:
+    """Items, busy time and downstream queue depth for one streaming stage."""
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.depth_samples = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        with self.lock:
+            self.items += 1
+            self.failed += 0 if ok else 1
+            self.busy += seconds
+
+    def sample_depth(self, depth):
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_total += depth
+            self.depth_samples += 1
+
+    def report(self, wall):
+        rate = self.items / wall if wall else 0.0
+        avg_depth = self.depth_total / self.depth_samples if self.depth_samples else 0.0
+        return (f"{self.name:<9} {self.items:>7} {self.failed:>6} {self.busy:>9.1f}s "
+                f"{rate:>8.2f}/s {avg_depth:>9.1f} {self.max_depth:>9}")
+
+def run_streaming_pipeline(thread_ids, workers=DOWNLOAD_WORKERS, rate=DOWNLOAD_RATE, refresh=False,
+                           queue_depth=PIPELINE_QUEUE_DEPTH, base_url=FORUM_BASE_URL, tails=None, fetcher=None,
+                           conn=None):
     """
-    Runs the full download, parse, and insert pipeline for a list of threads.
+    Runs download, parse and insert concurrently, connected by bounded queues, so each
+    thread moves through every stage as soon as it is ready. Returns the per-stage stats.
     """
-    print(f"Starting pipeline for {len(thread_ids)} threads...")
-    
+    tails = tails or {}
+    parse_queue = queue.Queue(maxsize=queue_depth)
+    insert_queue = queue.Queue(maxsize=queue_depth)
+    stats = {name: StageStats(name) for name in ("download", "parse", "insert")}
+    pending = iter(thread_ids)
+    pending_lock = threading.Lock()
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = Fetcher(rate=rate, pool_size=workers)
+
+    def download_worker():
+        while True:
+            with pending_lock:
+                thread_id = next(pending, None)
+            if thread_id is None:
+                return
+            start = time.perf_counter()
+            ok = download_thread(thread_id, fetcher, base_url, refresh)
+            stats["download"].record(time.perf_counter() - start, ok)
+            if ok:
+                parse_queue.put(thread_id)
+                stats["download"].sample_depth(parse_queue.qsize())
+
+    def parse_worker():
+        while True:
+            thread_id = parse_queue.get()
+            if thread_id is None:
+                insert_queue.put(None)
+                return
+            start = time.perf_counter()
+            try:
+                parsed = parse_thread_html(thread_id, tails.get(thread_id))
+                ok = True
+            except Exception as e:
+                print(f"[!] Error parsing thread {thread_id}: {e}")
+                ok = False
+            stats["parse"].record(time.perf_counter() - start, ok)
+            if ok:
+                # Parsed posts go straight to the inserter; None makes it read the handoff file
+                insert_queue.put((thread_id, parsed))
+                stats["parse"].sample_depth(insert_queue.qsize())
+
+    def close_downloads():
+        for t in downloaders:
+            t.join()
+        parse_queue.put(None)
+
+    wall_start = time.perf_counter()
+    downloaders = [threading.Thread(target=download_worker, daemon=True) for _ in range(max(1, workers))]
+    helpers = [threading.Thread(target=parse_worker, daemon=True),
+               threading.Thread(target=close_downloads, daemon=True)]
+    for t in downloaders + helpers:
+        t.start()
+
+    # The insert stage runs here so the SQLite connection stays on one thread
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    if INSERT_BULK:
+        apply_bulk_pragmas(conn)
+    try:
+        while True:
+            item = insert_queue.get()
+            if item is None:
+                break
+            thread_id, parsed = item
+            start = time.perf_counter()
+            try:
+                insert_thread_to_db(thread_id, conn, parsed=parsed)
+                ok = True
+            except Exception as e:
+                conn.rollback()
+                print(f"[!] Error inserting thread {thread_id}: {e}")
+                ok = False
+            stats["insert"].record(time.perf_counter() - start, ok)
+    finally:
+        if own_conn:
+            conn.close()
+        if own_fetcher:
+            fetcher.close()
+    wall = time.perf_counter() - wall_start
+
+    print(f"\n----- STREAMING STATS ({wall:.1f}s wall) -----")
+    print(f"{'stage':<9} {'items':>7} {'failed':>6} {'busy':>10} {'throughput':>10} {'avg queue':>9} {'max queue':>9}")
+    for stage in stats.values():
+        print(stage.report(wall))
+    return stats
+
+def _tails(thread_ids, conn=None):
+    """get_tails on `conn`, or on a connection opened for the lookup."""
+    if conn is not None:
+        return get_tails(conn, thread_ids)
+    conn = connect_db()
+    try:
+        return get_tails(conn, thread_ids)
+    finally:
+        conn.close()
+
+def run_batch(job_queue, claimed, workers=DOWNLOAD_WORKERS, rate=DOWNLOAD_RATE, refresh=False,
+              base_url=FORUM_BASE_URL, jobs=PARSE_JOBS, tail=False, fetcher=None, conn=None):
+    """
+    Takes a batch of claimed jobs through the stages each still needs, recording every
+    completed or failed stage in the job queue as it goes.
+    """
+    states = dict(claimed)
+    thread_ids = sorted(states)
+    print(f"\n===== {len(thread_ids)} THREADS ({thread_ids[0]}-{thread_ids[-1]}) =====")
+
+    def finish_stage(stage, done_state, errors):
+        for thread_id, error in errors.items():
+            job_queue.fail(thread_id, stage, error)
+            del states[thread_id]
+        done = [thread_id for thread_id, state in states.items() if state == STATE_BEFORE[stage]]
+        job_queue.advance(done, done_state)
+        states.update((thread_id, done_state) for thread_id in done)
+
     # Stage 1: Download
-    print("\n----- STAGE 1: DOWNLOADING -----")
-    download_threads(thread_ids)
-    
+    to_download = [thread_id for thread_id in thread_ids if states[thread_id] == "pending"]
+    if to_download:
+        print("\n----- STAGE 1: DOWNLOADING -----")
+        results = download_threads(to_download, workers=workers, rate=rate, base_url=base_url, refresh=refresh,
+                                   fetcher=fetcher)
+        finish_stage("download", "downloaded",
+                     {thread_id: "download failed, see the download log" for thread_id, ok in results.items() if not ok})
+
     # Stage 2: Parse
-    print("\n----- STAGE 2: PARSING -----")
-    batch_parse(thread_ids)
-    
+    to_parse = [thread_id for thread_id in thread_ids if states.get(thread_id) == "downloaded"]
+    if to_parse:
+        print("\n----- STAGE 2: PARSING -----")
+        tails = None
+        if tail:
+            tails = _tails(to_parse, conn)
+        errors = batch_parse(to_parse, jobs=jobs, tails=tails)
+        for thread_id in to_parse:
+            if thread_id not in errors and not os.path.exists(handoff_path(thread_id)):
+                errors[thread_id] = "no posts parsed"
+        finish_stage("parse", "parsed", errors)
+
     # Stage 3: Insert
-    print("\n----- STAGE 3: INSERTING -----")
-    batch_insert(thread_ids)
-    
-    print("\nPipeline complete.")
+    to_insert = [thread_id for thread_id in thread_ids if states.get(thread_id) == "parsed"]
+    if to_insert:
+        print("\n----- STAGE 3: INSERTING -----")
+        try:
+            errors = batch_insert(to_insert, conn=conn)
+        except Exception as e:
+            errors = {thread_id: f"{type(e).__name__}: {e}" for thread_id in to_insert}
+            print(f"[!] Insert batch failed: {e}")
+        finish_stage("insert", "inserted", errors)
+
+def work(run_id, batch_size=JOB_BATCH_SIZE, **options):
+    """
+    Claims and runs batches of the run's jobs until none are left, waiting out the backoff
+    of jobs due for a retry. Jobs claimed by other workers are left to them.
+    """
+    job_queue = JobQueue()
+    try:
+        while True:
+            claimed = job_queue.claim(run_id, batch_size)
+            if claimed:
+                run_batch(job_queue, claimed, **options)
+                continue
+            wait = job_queue.next_retry(run_id)
+            if wait is None:
+                return
+            print(f"[=] Retrying failed stages in {wait:.0f}s")
+            time.sleep(min(wait, 60) + 0.1)
+    finally:
+        job_queue.release()
+        job_queue.close()
+
+def _work_process(run_id, batch_size, snapshots, enable_metrics, options):
+    """work() in a --processes helper, sending its metrics back to the parent when it is done."""
+    metrics.start_worker(enable_metrics)
+    try:
+        work(run_id, batch_size, **options)
+    finally:
+        if enable_metrics:
+            snapshots.put(metrics.drain())
+
+def _collect_metrics(helpers, snapshots):
+    """Merges each helper's metrics; a helper that died without sending any is skipped."""
+    pending = len(helpers)
+    while pending:
+        try:
+            metrics.merge(snapshots.get(timeout=0.5))
+            pending -= 1
+        except queue.Empty:
+            if not any(helper.is_alive() for helper in helpers):
+                break
+    while pending:
+        try:
+            metrics.merge(snapshots.get_nowait())
+            pending -= 1
+        except queue.Empty:
+            break
+
+def run_pipeline(thread_ids, workers=DOWNLOAD_WORKERS, rate=DOWNLOAD_RATE, refresh=False, stream=PIPELINE_STREAMING,
+                 base_url=FORUM_BASE_URL, jobs=PARSE_JOBS, tail=False, resume=False, retry_failed=False,
+                 processes=PIPELINE_PROCESSES, batch_size=JOB_BATCH_SIZE, fetcher=None, conn=None):
+    """
+    Runs the full download, parse, and insert pipeline for a list of threads.
+    With `refresh`, already-downloaded threads are re-fetched conditionally.
+    With `stream`, the stages overlap instead of running one after another.
+    `jobs` sets the number of parse processes for the barrier mode.
+    With `tail`, threads already in the database only have their new posts parsed and inserted.
+
+    The barrier mode records each thread's progress in the job queue and works through it in
+    batches of `batch_size`, across `processes` worker processes. With `resume`, threads keep
+    the progress recorded by an earlier run (an empty `thread_ids` resumes the latest run), and
+    with `retry_failed` the threads that ran out of attempts get another go.
+
+    A long-lived `fetcher` and forum.db `conn` (sync_daemon's) are used for this process's
+    downloads and inserts instead of a new session and connection per batch; worker
+    processes still open their own.
+    """
+    job_queue = JobQueue()
+    run_id = new_run_id()
+    if resume and not thread_ids:
+        latest = job_queue.latest_run()
+        thread_ids = job_queue.unfinished(latest) if latest else []
+        print(f"Resuming run {latest}" if latest else "No earlier run to resume.")
+    print(f"Starting pipeline for {len(thread_ids)} threads...")
+    if not thread_ids:
+        job_queue.close()
+        return
+
+    if stream:
+        job_queue.close()
+        tails = None
+        if tail:
+            tails = _tails(thread_ids, conn)
+        run_streaming_pipeline(thread_ids, workers=workers, rate=rate, refresh=refresh, base_url=base_url,
+                               tails=tails, fetcher=fetcher, conn=conn)
+        print("\nPipeline complete.")
+        return
+
+    try:
+        job_queue.enqueue(thread_ids, run_id, resume=resume)
+        if retry_failed:
+            print(f"Retrying {job_queue.retry_failed(run_id)} failed threads")
+        counts = job_queue.counts(run_id)
+        if resume:
+            print(f"{counts.get('inserted', 0)} already inserted, {counts.get('failed', 0)} failed, "
+                  f"{sum(counts.get(state, 0) for state in ACTIVE_STATES)} to go")
+
+        options = dict(workers=workers, rate=rate, refresh=refresh, base_url=base_url, jobs=jobs, tail=tail)
+        snapshots = multiprocessing.Queue()
+        helpers = [multiprocessing.Process(target=_work_process,
+                                           args=(run_id, batch_size, snapshots, metrics.enabled(), options))
+                   for _ in range(max(1, processes) - 1)]
+        for helper in helpers:
+            helper.start()
+        try:
+            work(run_id, batch_size, fetcher=fetcher, conn=conn, **options)
+        finally:
+            if metrics.enabled():
+                # Before join: a helper does not exit until its snapshot has been read
+                _collect_metrics(helpers, snapshots)
+            for helper in helpers:
+                helper.join()
+        if any(helper.exitcode for helper in helpers):
+            # A worker died holding claims; pick up whatever it left
+            job_queue.release_dead()
+            work(run_id, batch_size, fetcher=fetcher, conn=conn, **options)
+
+        counts = job_queue.counts(run_id)
+        print(f"\nPipeline complete. {counts.get('inserted', 0)} inserted, {counts.get('failed', 0)} failed"
+              + (" (python job_queue.py --failed)" if counts.get("failed") else ""))
+    finally:
+        job_queue.close()
 
 def parse_thread_id_args(args):
     thread_ids = set()
@@ -34,11 +336,30 @@ def parse_thread_id_args(args):
     return sorted(list(thread_ids))
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python pipeline.py <id1> <id2>... or <start-end>")
+    args = sys.argv[1:]
+    try:
+        workers = pop_option(args, "--workers", int, DOWNLOAD_WORKERS)
+        rate = pop_option(args, "--rate", float, DOWNLOAD_RATE)
+        refresh = pop_flag(args, "--refresh")
+        stream = pop_flag(args, "--stream") or PIPELINE_STREAMING
+        jobs = pop_option(args, "--jobs", int, PARSE_JOBS)
+        tail = pop_flag(args, "--tail")
+        resume = pop_flag(args, "--resume")
+        retry_failed = pop_flag(args, "--retry-failed")
+        processes = pop_option(args, "--processes", int, PIPELINE_PROCESSES)
+        report_path, prometheus_path = metrics.pop_metrics_options(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not args and not resume:
+        print("Usage: python pipeline.py [--workers N] [--rate R] [--refresh] [--stream] [--jobs N] [--tail] [--resume] [--retry-failed] [--processes N] [--metrics] [--metrics-out PATH] [--prometheus PATH] [--profile STAGES] <id1> <id2>... or <start-end>")
     else:
         try:
-            thread_ids = parse_thread_id_args(sys.argv[1:])
-            run_pipeline(thread_ids)
+            thread_ids = parse_thread_id_args(args)
+            run_pipeline(thread_ids, workers=workers, rate=rate, refresh=refresh, stream=stream, jobs=jobs, tail=tail,
+                         resume=resume, retry_failed=retry_failed, processes=processes)
         except ValueError:
             print("Error: Thread IDs must be integers or valid ranges (e.g., 1-5).")
+        else:
+            metrics.finish(report_path, prometheus_path)
@@ -0,0 +1,163 @@
+import os
+import re
+import sqlite3
+import sys
+
+from config import FORUM_DB_PATH
+from cli_args import pop_option, pop_flag
+from search import _end_of
+
+# Read API for the common access patterns. Every query is built by a *_sql() function so
+# check_query_plans() can EXPLAIN exactly what the API runs. Lists are paged by key, not
+# OFFSET: `after` is the sort key of the last post already shown ((iso_timestamp, id) for
+# time-ordered lists, post_id within a thread), so every page is one index range scan.
+
+# Anything in a plan line that reads a whole table or index
+SCAN_PATTERN = re.compile(r"\bSCAN\b")
+
+POST_COLUMNS = "p.id, p.thread_id, p.post_id, p.thread_title, p.poster, p.tag, p.iso_timestamp, p.content"
+
+def poster_posts_sql(poster, since=None, until=None, limit=100, after=None):
+    sql = f"""
+        SELECT {POST_COLUMNS} FROM posts p
+        WHERE p.poster_id = (SELECT poster_id FROM posters WHERE name = ?)
+    """
+    params = [poster.lower()]
+    if after:
+        # Already past `since`, and the index range has to start at the cursor
+        sql += " AND (p.iso_timestamp, p.id) > (?, ?)"
+        params.extend(after)
+    elif since:
+        sql += " AND p.iso_timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND p.iso_timestamp <= ?"
+        params.append(_end_of(until))
+    sql += " ORDER BY p.iso_timestamp, p.id LIMIT ?"
+    params.append(limit)
+    return sql, params
+
+def window_posts_sql(since, until, limit=100, after=None):
+    sql = f"""
+        SELECT {POST_COLUMNS} FROM posts p
+        WHERE p.iso_timestamp <= ?
+    """
+    params = [_end_of(until)]
+    if after:
+        sql += " AND (p.iso_timestamp, p.id) > (?, ?)"
+        params.extend(after)
+    else:
+        sql += " AND p.iso_timestamp >= ?"
+        params.append(since)
+    sql += " ORDER BY p.iso_timestamp, p.id LIMIT ?"
+    params.append(limit)
+    return sql, params
+
+def thread_posts_sql(thread_id, after=0, limit=100):
+    sql = f"""
+        SELECT {POST_COLUMNS} FROM posts p
+        WHERE p.thread_id = ? AND p.post_id > ?
+        ORDER BY p.post_id LIMIT ?
+    """
+    return sql, [thread_id, after, limit]
+
+def latest_posts_sql(thread_id, limit=20):
+    sql = f"""
+        SELECT {POST_COLUMNS} FROM posts p
+        WHERE p.thread_id = ?
+        ORDER BY p.post_id DESC LIMIT ?
+    """
+    return sql, [thread_id, limit]
+
+def _fetch(conn, sql, params):
+    # On a cursor of our own, so the caller's connection keeps returning plain tuples
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return [dict(row) for row in cursor.execute(sql, params)]
+
+def poster_posts(conn, poster, since=None, until=None, limit=100, after=None):
+    """Posts by one poster in time order, optionally within an ISO date range."""
+    return _fetch(conn, *poster_posts_sql(poster, since, until, limit, after))
+
+def window_posts(conn, since, until, limit=100, after=None):
+    """Posts from every thread between two ISO dates, in time order."""
+    return _fetch(conn, *window_posts_sql(since, until, limit, after))
+
+def thread_posts(conn, thread_id, after=0, limit=100):
+    """A thread's posts in order, starting after post_id `after`."""
+    return _fetch(conn, *thread_posts_sql(thread_id, after, limit))
+
+def latest_posts(conn, thread_id, limit=20):
+    """The newest `limit` posts of a thread, newest first."""
+    return _fetch(conn, *latest_posts_sql(thread_id, limit))
+
+def explain(conn, sql, params):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a query."""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def check_query_plans(conn):
+    """
+    EXPLAINs every API query and returns {name: (plan, problems)}. A problem is a full scan
+    of a table or index, or a temporary b-tree for sorting.
+    """
+    samples = {
+        "poster_posts": poster_posts_sql("someone", "2015-01-01", "2016-01-01"),
+        "poster_posts_after": poster_posts_sql("someone", after=("2015-06-01T12:00:00", 1000)),
+        "window_posts": window_posts_sql("2015-01-01", "2015-02-01"),
+        "window_posts_after": window_posts_sql("2015-01-01", "2015-02-01", after=("2015-01-15T12:00:00", 1000)),
+        "thread_posts": thread_posts_sql(1, 50),
+        "latest_posts": latest_posts_sql(1),
+    }
+    results = {}
+    for name, (sql, params) in samples.items():
+        plan = explain(conn, sql, params)
+        problems = [line for line in plan if SCAN_PATTERN.search(line) or "TEMP B-TREE" in line]
+        results[name] = (plan, problems)
+    return results
+
+def _print_posts(posts):
+    for post in posts:
+        first_line = post["content"].split("\n", 1)[0]
+        print(f"[{post['thread_id']}#{post['post_id']}] {post['iso_timestamp']}  {post['poster']}  {first_line[:80]}")
+    print(f"{len(posts)} posts.")
+
+def main():
+    args = sys.argv[1:]
+    try:
+        limit = pop_option(args, "--limit", int, 100)
+        since = pop_option(args, "--since")
+        until = pop_option(args, "--until")
+        check = pop_flag(args, "--check-plans")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    if not os.path.exists(FORUM_DB_PATH):
+        print("Database not found. Run pipeline.py first.")
+        return
+
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        if check:
+            failed = False
+            for name, (plan, problems) in check_query_plans(conn).items():
+                print(f"{'FAIL' if problems else 'ok  '} {name}: {' | '.join(plan)}")
+                failed = failed or bool(problems)
+            sys.exit(1 if failed else 0)
+
+        if len(args) == 2 and args[0] == "poster":
+            _print_posts(poster_posts(conn, args[1], since, until, limit))
+        elif len(args) == 1 and args[0] == "window" and since and until:
+            _print_posts(window_posts(conn, since, until, limit))
+        elif len(args) == 2 and args[0] == "latest":
+            _print_posts(latest_posts(conn, int(args[1]), limit))
+        else:
+            print("Usage: python queries.py poster NAME [--since DATE] [--until DATE] [--limit N]")
+            print("       python queries.py window --since DATE --until DATE [--limit N]")
+            print("       python queries.py latest THREAD_ID [--limit N]")
+            print("       python queries.py --check-plans")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import gzip
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from config import HTML_RAW_DIR, RAW_STORE, RAW_DB_PATH, RAW_CODEC
+from fetch_state import content_hash
+
+# Where downloaded thread HTML lives. "files" is the original html_raw/thread_N.html layout.
+# "pack" keeps compressed blobs in database/raw.db: each distinct page is stored once, keyed
+# by the sha256 of its bytes, and every changed fetch of a thread adds a snapshot pointing
+# at one. Threads not in the pack yet are read from html_raw/ until they are migrated.
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _codec(name=RAW_CODEC):
+    if name == "auto":
+        return "zstd" if zstandard else "gzip"
+    if name == "zstd" and not zstandard:
+        raise RuntimeError("RAW_CODEC is 'zstd' but the zstandard package is not installed")
+    if name not in ("zstd", "gzip"):
+        raise ValueError(f"unknown RAW_CODEC {name!r}")
+    return name
+
+def compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    raise ValueError(f"unknown codec {codec!r}")
+
+def decompress(data, codec):
+    with _reader(codec, io.BytesIO(data)) as reader:
+        return reader.read()
+
+def _reader(codec, raw):
+    """Wraps a binary file object holding a compressed blob in a decompressing reader."""
+    if codec == "zstd":
+        if not zstandard:
+            raise RuntimeError("snapshot is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    raise ValueError(f"unknown codec {codec!r}")
+
+def _text(binary):
+    return io.TextIOWrapper(binary, encoding="utf-8", errors="ignore")
+
+class FileRawStore:
+    """The html_raw/thread_N.html layout: one uncompressed file per thread, latest fetch only."""
+    def __init__(self, directory=HTML_RAW_DIR):
+        self.directory = directory
+
+    def path(self, thread_id):
+        return os.path.join(self.directory, f"thread_{thread_id}.html")
+
+    def has(self, thread_id):
+        return os.path.exists(self.path(thread_id))
+
+    def put(self, thread_id, html, digest=None, fetched_at=None):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(thread_id), "w", encoding="utf-8") as f:
+            f.write(html)
+
+    @contextmanager
+    def open(self, thread_id, version=None):
+        """Streams a thread's HTML as text."""
+        with open(self.path(thread_id), "r", encoding="utf-8", errors="ignore") as f:
+            yield f
+
+    def read(self, thread_id, version=None):
+        with self.open(thread_id, version) as f:
+            return f.read()
+
+    def versions(self, thread_id):
+        return [None] if self.has(thread_id) else []
+
+class PackRawStore:
+    """
+    Compressed, deduplicated, versioned thread HTML in a SQLite pack. Safe to share between
+    threads; readers opened with open() use their own connection.
+    """
+    def __init__(self, path=RAW_DB_PATH, codec=RAW_CODEC, fallback_dir=HTML_RAW_DIR):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.codec = _codec(codec)
+        self.fallback = FileRawStore(fallback_dir) if fallback_dir else None
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL
+                );
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY,
+                    thread_id INTEGER NOT NULL,
+                    blob_hash TEXT NOT NULL REFERENCES blobs(hash),
+                    content_hash TEXT,
+                    fetched_at TEXT
+                );
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_thread ON snapshots(thread_id, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_fetched ON snapshots(thread_id, fetched_at)")
+
+    def _snapshot(self, thread_id, version=None):
+        """(blob rowid, codec) of a snapshot: the most recently fetched one, or snapshot id `version`."""
+        sql = """
+            SELECT b.rowid, b.codec FROM snapshots s JOIN blobs b ON b.hash = s.blob_hash
+            WHERE s.thread_id = ?
+        """
+        params = [thread_id]
+        if version is not None:
+            sql += " AND s.id = ?"
+            params.append(version)
+        # Migrated files can be added after newer downloads, so the order is by fetch time
+        sql += " ORDER BY s.fetched_at DESC, s.id DESC LIMIT 1"
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def has(self, thread_id):
+        return self._snapshot(thread_id) is not None or bool(self.fallback and self.fallback.has(thread_id))
+
+    def put(self, thread_id, html, digest=None, fetched_at=None):
+        """
+        Adds a snapshot of a thread, storing its bytes only if no snapshot has them yet.
+        Returns the snapshot id, or None if the thread's most recently fetched snapshot is
+        already this page.
+        """
+        data = html.encode("utf-8")
+        blob_hash = hashlib.sha256(data).hexdigest()
+        with self.lock, self.conn:
+            latest = self.conn.execute(
+                "SELECT blob_hash FROM snapshots WHERE thread_id = ? ORDER BY fetched_at DESC, id DESC LIMIT 1",
+                (thread_id,),
+            ).fetchone()
+            if latest and latest[0] == blob_hash:
+                return None
+            exists = self.conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+            if not exists:
+                self.conn.execute(
+                    "INSERT INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                    (blob_hash, self.codec, len(data), compress(data, self.codec)),
+                )
+            cursor = self.conn.execute(
+                "INSERT INTO snapshots (thread_id, blob_hash, content_hash, fetched_at) VALUES (?, ?, ?, ?)",
+                (thread_id, blob_hash, digest, fetched_at or _now()),
+            )
+        return cursor.lastrowid
+
+    @contextmanager
+    def open(self, thread_id, version=None):
+        """Streams a snapshot's HTML as text, decompressing straight from the blob."""
+        found = self._snapshot(thread_id, version)
+        if found is None:
+            if version is None and self.fallback and self.fallback.has(thread_id):
+                with self.fallback.open(thread_id) as f:
+                    yield f
+                return
+            raise FileNotFoundError(f"no snapshot of thread {thread_id}")
+        rowid, codec = found
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            with conn.blobopen("blobs", "data", rowid, readonly=True) as blob:
+                yield _text(_reader(codec, blob))
+        finally:
+            conn.close()
+
+    def read(self, thread_id, version=None):
+        with self.open(thread_id, version) as f:
+            return f.read()
+
+    def versions(self, thread_id):
+        """[(snapshot id, fetched_at, size)] for a thread, oldest first."""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT s.id, s.fetched_at, b.size FROM snapshots s JOIN blobs b ON b.hash = s.blob_hash
+                WHERE s.thread_id = ? ORDER BY s.fetched_at, s.id
+            """, (thread_id,)).fetchall()
+
+    def superseded(self, thread_id, html, fetched_at):
+        """
+        True if the thread already has a snapshot of exactly this page, or one fetched at or
+        after `fetched_at`: storing the page again would only hide newer HTML.
+        """
+        blob_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        with self.lock:
+            return self.conn.execute("""
+                SELECT 1 FROM snapshots WHERE thread_id = ? AND (blob_hash = ? OR fetched_at >= ?) LIMIT 1
+            """, (thread_id, blob_hash, fetched_at)).fetchone() is not None
+
+    def stats(self):
+        """(snapshots, distinct blobs, raw bytes, stored bytes)."""
+        with self.lock:
+            snapshots = self.conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+            blobs, raw, stored = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+            ).fetchone()
+        return snapshots, blobs, raw, stored
+
+    def close(self):
+        self.conn.close()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def open_store(kind=RAW_STORE):
+    return PackRawStore() if kind == "pack" else FileRawStore()
+
+def get_raw_store():
+    """Returns this process's shared raw store, opening it on first use."""
+    pid = os.getpid()
+    with _stores_lock:
+        if pid not in _stores:
+            _stores[pid] = open_store()
+        return _stores[pid]
+
+def migrate_directory(store, directory=HTML_RAW_DIR, delete=False):
+    """
+    Moves html_raw/thread_N.html files into the pack, oldest first, each as a snapshot dated
+    by the file's mtime. A file is skipped if the pack already holds the same page for its
+    thread or a snapshot fetched since the file was written, so running it again adds nothing.
+    With `delete`, each file is removed once its snapshot is committed (or found superseded).
+    """
+    names = [name for name in os.listdir(directory) if name.startswith("thread_") and name.endswith(".html")]
+    paths = sorted((os.path.join(directory, name) for name in names), key=os.path.getmtime)
+    moved = skipped = 0
+    for path in paths:
+        thread_id = int(os.path.basename(path)[len("thread_"):-len(".html")])
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            html = f.read()
+        fetched_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")
+        if store.superseded(thread_id, html, fetched_at):
+            skipped += 1
+        elif store.put(thread_id, html, content_hash(html), fetched_at) is None:
+            skipped += 1
+        else:
+            moved += 1
+        if delete:
+            os.remove(path)
+    return moved, skipped
+
+def main():
+    args = sys.argv[1:]
+    store = PackRawStore()
+    try:
+        if args and args[0] == "--migrate":
+            delete = "--delete" in args[1:]
+            if not os.path.isdir(HTML_RAW_DIR):
+                print(f"[!] {HTML_RAW_DIR} not found")
+                return
+            moved, skipped = migrate_directory(store, delete=delete)
+            print(f"[✓] Migrated {moved} threads ({skipped} already in the pack)"
+                  + (", removed the files" if delete else ""))
+        elif args and args[0] == "--versions" and len(args) == 2:
+            for snapshot_id, fetched_at, size in store.versions(int(args[1])):
+                print(f"{snapshot_id:>8}  {fetched_at}  {size:>9} bytes")
+            return
+        elif args:
+            print("Usage: python raw_store.py [--migrate [--delete] | --versions THREAD_ID]")
+            return
+
+        snapshots, blobs, raw, stored = store.stats()
+        ratio = raw / stored if stored else 0.0
+        print(f"{snapshots} snapshots, {blobs} distinct pages, {raw / 1e6:.1f} MB raw, "
+              f"{stored / 1e6:.1f} MB stored ({ratio:.1f}x, {store.codec})")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
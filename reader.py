@@ -0,0 +1,207 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import FORUM_DB_PATH, READER_POOL_SIZE, READER_PAGE_SIZE, READER_CACHE_ENTRIES
+from cli_args import pop_option
+from queries import thread_posts_sql, poster_posts_sql, window_posts_sql, latest_posts_sql
+import metrics
+
+# Read side of forum.db for a frontend that runs while sync_board/db_inserter write to it.
+#
+# forum.db is in WAL mode, so a reader sees the last commit before its query started and
+# neither waits for nor blocks the writer. ForumReader keeps a small pool of read-only
+# connections, handed to one caller thread at a time. Lists are paged by key (see queries.py):
+# each page returns the cursor for the next one, and page 1000 costs what page 1 does.
+#
+# Pages are cached in memory, least recently used out first. Before each lookup one extra
+# connection reads PRAGMA data_version, which changes whenever another connection commits;
+# a change empties the cache, so a page is never served from before the latest insert.
+
+def ensure_wal(path=FORUM_DB_PATH):
+    """Switches a database still on the rollback journal to WAL. Returns the journal mode."""
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if mode != "wal":
+            try:
+                mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            except sqlite3.OperationalError:
+                pass  # a writer holds the database; db_inserter switches it on its next connect
+        return mode
+    finally:
+        conn.close()
+
+class ForumReader:
+    """Paged, cached reads of forum.db over a pool of read-only connections. Safe to share between threads."""
+    def __init__(self, path=FORUM_DB_PATH, pool_size=READER_POOL_SIZE, cache_entries=READER_CACHE_ENTRIES):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run pipeline.py first")
+        if ensure_wal(path) != "wal":
+            print(f"[!] {os.path.basename(path)} is not in WAL mode; readers and the writer will wait on each other")
+        self.path = path
+        self.pool = queue.LifoQueue()
+        self.pool_size = max(1, pool_size)
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_entries = cache_entries
+        self.watch = self._connect()
+        self.data_version = self.watch.execute("PRAGMA data_version").fetchone()[0]
+        self.generation = 0
+        self.hits = self.misses = self.invalidations = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrows a pooled read-only connection, opening one if the pool is not full yet."""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                opened = self.opened < self.pool_size
+                self.opened += opened
+            conn = self._connect() if opened else self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def _check_version(self):
+        """Empties the cache if anything was committed since the last check. Returns the cache generation."""
+        with self.lock:
+            version = self.watch.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.data_version:
+                self.data_version = version
+                self.cache.clear()
+                self.generation += 1
+                self.invalidations += 1
+            return self.generation
+
+    def _fetch(self, sql, params):
+        """Rows of a query as dicts, from the cache when forum.db has not changed since it ran."""
+        key = (sql, tuple(params))
+        generation = self._check_version()
+        with self.lock:
+            rows = self.cache.get(key)
+            if rows is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+        if rows is not None:
+            metrics.count("reader.cache_hit")
+            return [dict(row) for row in rows]
+
+        with self.connection() as conn:
+            rows = tuple(conn.execute(sql, params).fetchall())
+        metrics.count("reader.cache_miss")
+        with self.lock:
+            self.misses += 1
+            # Not if a commit was noticed meanwhile: the rows may predate it
+            if generation == self.generation and self.cache_entries > 0:
+                self.cache[key] = rows
+                if len(self.cache) > self.cache_entries:
+                    self.cache.popitem(last=False)
+        return [dict(row) for row in rows]
+
+    def _page(self, sql, params, limit, cursor):
+        """(up to `limit` posts, cursor of the next page or None). The query asks for limit + 1 rows."""
+        posts = self._fetch(sql, params)
+        if len(posts) <= limit:
+            return posts, None
+        posts = posts[:limit]
+        return posts, cursor(posts[-1])
+
+    def thread_page(self, thread_id, after=0, limit=READER_PAGE_SIZE):
+        """A thread in post order, from post_id `after` on."""
+        return self._page(*thread_posts_sql(thread_id, after, limit + 1), limit, lambda post: post["post_id"])
+
+    def poster_page(self, poster, after=None, since=None, until=None, limit=READER_PAGE_SIZE):
+        """A poster's timeline in time order, from cursor `after` ((iso_timestamp, id)) on."""
+        return self._page(*poster_posts_sql(poster, since, until, limit + 1, after), limit,
+                          lambda post: (post["iso_timestamp"], post["id"]))
+
+    def window_page(self, since, until, after=None, limit=READER_PAGE_SIZE):
+        """Posts from every thread between two ISO dates, in time order, from cursor `after` on."""
+        return self._page(*window_posts_sql(since, until, limit + 1, after), limit,
+                          lambda post: (post["iso_timestamp"], post["id"]))
+
+    def latest_posts(self, thread_id, limit=20):
+        """The newest `limit` posts of a thread, newest first."""
+        return self._fetch(*latest_posts_sql(thread_id, limit))
+
+    def stats(self):
+        """{hits, misses, invalidations, cached pages, open connections}."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                    "cached": len(self.cache), "connections": self.opened}
+
+    def close(self):
+        with self.lock:
+            self.cache.clear()
+            self.opened = 0
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self.watch.close()
+
+def _parse_cursor(value):
+    """`--after` for time-ordered lists: "ISO_TIMESTAMP,ID" as printed after each page."""
+    timestamp, _, post_id = value.rpartition(",")
+    return timestamp, int(post_id)
+
+def _print_page(posts, cursor):
+    for post in posts:
+        first_line = post["content"].split("\n", 1)[0]
+        print(f"[{post['thread_id']}#{post['post_id']}] {post['iso_timestamp']}  {post['poster']}  {first_line[:80]}")
+    if cursor is None:
+        print(f"{len(posts)} posts, end of list.")
+    else:
+        after = cursor if isinstance(cursor, int) else f"{cursor[0]},{cursor[1]}"
+        print(f"{len(posts)} posts. Next page: --after {after}")
+
+def main():
+    args = sys.argv[1:]
+    try:
+        limit = pop_option(args, "--limit", int, READER_PAGE_SIZE)
+        after = pop_option(args, "--after")
+        since = pop_option(args, "--since")
+        until = pop_option(args, "--until")
+        if len(args) == 2 and args[0] == "thread":
+            thread_id, after = int(args[1]), int(after or 0)
+        elif after:
+            after = _parse_cursor(after)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    if not os.path.exists(FORUM_DB_PATH):
+        print("Database not found. Run pipeline.py first.")
+        return
+
+    reader = ForumReader(pool_size=1)
+    try:
+        if len(args) == 2 and args[0] == "thread":
+            _print_page(*reader.thread_page(thread_id, after, limit))
+        elif len(args) == 2 and args[0] == "poster":
+            _print_page(*reader.poster_page(args[1], after, since, until, limit))
+        elif len(args) == 1 and args[0] == "window" and since and until:
+            _print_page(*reader.window_page(since, until, after, limit))
+        else:
+            print("Usage: python reader.py thread THREAD_ID [--after POST_ID] [--limit N]")
+            print("       python reader.py poster NAME [--since DATE] [--until DATE] [--after CURSOR] [--limit N]")
+            print("       python reader.py window --since DATE --until DATE [--after CURSOR] [--limit N]")
+    finally:
+        reader.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import re
+import sqlite3
+import sys
+
+from config import FORUM_DB_PATH
+from cli_args import pop_option, pop_flag
+
+# External-content FTS5 index over posts: the text lives once, in posts, and the index
+# stores only tokens. posts is append-only (INSERT OR IGNORE), so the index is kept in
+# sync by indexing every row past the last indexed posts.id.
+FTS_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        content, poster, thread_title,
+        content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS search_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    );
+    """,
+]
+
+HIGHLIGHT_PLAIN = ("[", "]")
+HIGHLIGHT_TERMINAL = ("\033[1m", "\033[0m")
+
+def ensure_fts(conn):
+    """Creates the search index tables if they do not exist yet."""
+    for statement in FTS_STATEMENTS:
+        conn.execute(statement)
+
+def _last_indexed(conn):
+    row = conn.execute("SELECT value FROM search_state WHERE key = 'last_rowid'").fetchone()
+    return row[0] if row else 0
+
+def _set_last_indexed(conn, rowid):
+    conn.execute(
+        "INSERT INTO search_state (key, value) VALUES ('last_rowid', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (rowid,),
+    )
+
+def sync_fts(conn):
+    """
+    Indexes posts added since the last sync, inside the caller's transaction.
+    Returns the number of rows indexed.
+    """
+    last = _last_indexed(conn)
+    newest = conn.execute("SELECT MAX(id) FROM posts").fetchone()[0] or 0
+    if newest <= last:
+        return 0
+    cursor = conn.execute("""
+        INSERT INTO posts_fts (rowid, content, poster, thread_title)
+        SELECT id, content, poster, thread_title FROM posts WHERE id > ? ORDER BY id
+    """, (last,))
+    _set_last_indexed(conn, newest)
+    return cursor.rowcount
+
+def rebuild_fts(conn):
+    """Rebuilds the whole index from posts. Use after backfills run with FTS_SYNC_ON_INSERT off."""
+    ensure_fts(conn)
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+    _set_last_indexed(conn, conn.execute("SELECT MAX(id) FROM posts").fetchone()[0] or 0)
+    conn.commit()
+
+def optimize_fts(conn):
+    """Merges the index b-trees; worth running after large backfills."""
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('optimize')")
+    conn.commit()
+
+def build_match(query, raw=False):
+    """
+    Turns a user query into an FTS5 MATCH expression. Words are ANDed, "quoted text" is
+    a phrase and a trailing * makes a prefix search. With `raw`, the query is FTS5 syntax.
+    """
+    if raw:
+        return query
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        text = phrase if phrase else word
+        prefix = not phrase and text.endswith("*")
+        text = text.rstrip("*") if prefix else text
+        if not text:
+            continue
+        term = '"' + text.replace('"', '""') + '"'
+        terms.append(term + "*" if prefix else term)
+    return " ".join(terms)
+
+def _end_of(day):
+    """Makes a bare YYYY-MM-DD upper bound include the whole day."""
+    return day + "T23:59:59" if day and len(day) == 10 else day
+
+def search(conn, query, poster=None, thread_id=None, since=None, until=None, limit=20, raw=False,
+           highlight=HIGHLIGHT_PLAIN):
+    """
+    Ranks posts matching `query` by bm25, optionally filtered by poster, thread and an
+    ISO date range. Returns dicts with the post fields, a highlighted snippet and the score.
+    """
+    match = build_match(query, raw)
+    if not match:
+        return []
+    sql = """
+        SELECT p.id, p.thread_id, p.post_id, p.thread_title, p.poster, p.iso_timestamp,
+               snippet(posts_fts, 0, ?, ?, '…', 16) AS snippet,
+               bm25(posts_fts) AS score
+        FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+        WHERE posts_fts MATCH ?
+    """
+    params = [highlight[0], highlight[1], match]
+    if poster:
+        sql += " AND p.poster = ?"
+        params.append(poster.lower())
+    if thread_id is not None:
+        sql += " AND p.thread_id = ?"
+        params.append(thread_id)
+    if since:
+        sql += " AND p.iso_timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND p.iso_timestamp <= ?"
+        params.append(_end_of(until))
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+
+    # On a cursor of our own, so the caller's connection keeps returning plain tuples
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return [dict(row) for row in cursor.execute(sql, params)]
+
+def main():
+    args = sys.argv[1:]
+    try:
+        poster = pop_option(args, "--poster")
+        thread_id = pop_option(args, "--thread", int)
+        since = pop_option(args, "--since")
+        until = pop_option(args, "--until")
+        limit = pop_option(args, "--limit", int, 20)
+        raw = pop_flag(args, "--raw")
+        rebuild = pop_flag(args, "--rebuild")
+        sync = pop_flag(args, "--sync")
+        optimize = pop_flag(args, "--optimize")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    if not os.path.exists(FORUM_DB_PATH):
+        print("Database not found. Run pipeline.py first.")
+        return
+
+    conn = sqlite3.connect(FORUM_DB_PATH)
+    try:
+        if rebuild:
+            rebuild_fts(conn)
+            print("[✓] Search index rebuilt.")
+        if sync:
+            ensure_fts(conn)
+            indexed = sync_fts(conn)
+            conn.commit()
+            print(f"[✓] Indexed {indexed} new posts.")
+        if optimize:
+            optimize_fts(conn)
+            print("[✓] Search index optimized.")
+        if rebuild or sync or optimize:
+            return
+
+        if not args:
+            print('Usage: python search.py [--poster NAME] [--thread ID] [--since DATE] [--until DATE] '
+                  '[--limit N] [--raw] <query>')
+            print("       python search.py --rebuild | --sync | --optimize")
+            return
+
+        try:
+            highlight = HIGHLIGHT_TERMINAL if sys.stdout.isatty() else HIGHLIGHT_PLAIN
+            results = search(conn, " ".join(args), poster, thread_id, since, until, limit, raw, highlight)
+        except sqlite3.OperationalError as e:
+            print(f"[!] Search failed: {e}")
+            return
+        for hit in results:
+            print(f"[{hit['thread_id']}#{hit['post_id']}] {hit['iso_timestamp']}  {hit['poster']}  — {hit['thread_title']}")
+            print("    " + hit["snippet"].replace("\n", " / "))
+        print(f"{len(results)} results.")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,33 @@
-import requests
-from bs4 import BeautifulSoup
+import http.client
 import sqlite3
 import os
-import re
-from pipeline import run_pipeline
+import sys
+import urllib.request
+from config import (
+    FORUM_DB_PATH as DB_PATH, FORUM_SECTION, INDEX_WORKERS, INDEX_RATE, DAEMON_MIN_INTERVAL, DAEMON_MAX_INTERVAL,
+    DAEMON_HEALTH_PATH,
+)
+from migrations import migrate
+from index_crawler import index_url, parse_index_page, crawl_index
+from cli_args import pop_option, pop_flag
+import metrics
 
 # Configuration
-FORUM_INDEX_URL = "http://utopiaforums.com/boardforum?id=politics"
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "database", "forum.db")
+FORUM_INDEX_URL = index_url(FORUM_SECTION)
 
+# A sync usually finds nothing new, so this module keeps to the standard library until there
+# is work: the pipeline (and with it requests, BeautifulSoup and the parser and inserter) is
+# imported only when threads need processing.
+
+@metrics.timed("index")
 def fetch_index_page():
     """Fetches the HTML content of the forum index page."""
     print(f"Fetching index page: {FORUM_INDEX_URL}")
     try:
-        response = requests.get(FORUM_INDEX_URL, timeout=15)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        return response.text
-    except requests.exceptions.RequestException as e:
+        with urllib.request.urlopen(FORUM_INDEX_URL, timeout=15) as response:
+            # Same default as requests for text/html without a declared charset
+            return response.read().decode(response.headers.get_content_charset() or "iso-8859-1", errors="replace")
+    except (OSError, http.client.HTTPException, ValueError) as e:
         print(f"[!] Error fetching index page: {e}")
         return None
 
@@ -25,71 +35,120 @@ def parse_thread_data(html_content):
     """Parses the HTML to extract thread IDs and their post counts."""
     if not html_content:
         return {}
-    
+
     print("Parsing thread data from index page...")
-    soup = BeautifulSoup(html_content, 'html.parser')
-    thread_data = {} # {thread_id: post_count}
-    
-    # Find all table rows that are likely thread entries (excluding the header row)
-    # The header row has class 'highlight'
-    for row in soup.find_all('tr'):
-        if 'class' in row.attrs and 'highlight' in row['class']:
-            continue # Skip header row
-
-        tds = row.find_all('td')
-        if len(tds) >= 2: # Ensure there are at least two columns (topic and posts)
-            a_tag = tds[0].find('a', href=True)
-            if a_tag:
-                match = re.search(r'thread=(\d+)', a_tag['href'])
-                if match:
-                    thread_id = int(match.group(1))
-                    
-                    try:
-                        post_count = int(tds[1].get_text(strip=True))
-                        thread_data[thread_id] = post_count
-                    except ValueError:
-                        # If post count is not a number, skip or log an error
-                        print(f"[!] Could not parse post count for thread {thread_id}")
-                        continue
-            
+    threads, _ = parse_index_page(html_content)
+    thread_data = {thread_id: info["post_count"] for thread_id, info in threads.items()}  # {thread_id: post_count}
+
     print(f"Found {len(thread_data)} unique threads with post counts on the index page.")
     return thread_data
 
-def get_existing_thread_post_counts():
-    """Queries the database to get the highest post ID for each thread."""
+@metrics.timed("plan.lookup")
+def lookup_post_counts(conn, thread_ids):
+    """Returns {thread_id: highest stored post ID} for the listed threads already in thread_state."""
+    counts = {}
+    for thread_id in thread_ids:
+        row = conn.execute("SELECT max_post_id FROM thread_state WHERE thread_id = ?", (thread_id,)).fetchone()
+        if row:
+            counts[thread_id] = row[0] or 0
+    return counts
+
+@metrics.timed("plan")
+def get_existing_thread_post_counts(thread_ids):
+    """
+    Looks up the highest stored post ID of each listed thread in thread_state, one keyed
+    lookup per thread, so the cost does not grow with the size of the archive.
+    """
     if not os.path.exists(DB_PATH):
         print("Database not found. Returning no existing thread post counts.")
         return {}
-        
+
     print("Querying database for existing thread post counts...")
-    existing_thread_post_counts = {}
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            # Assuming post_id can be cast to INTEGER for MAX comparison
-            cursor.execute("SELECT thread_id, MAX(CAST(SUBSTR(post_id, INSTR(post_id, ' ') + 1) AS INTEGER)) FROM posts GROUP BY thread_id")
-            for row in cursor.fetchall():
-                thread_id, max_post_id = row
-                existing_thread_post_counts[int(thread_id)] = max_post_id
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            migrate(conn)
+            existing_thread_post_counts = lookup_post_counts(conn, thread_ids)
+        finally:
+            conn.close()
         print(f"Found post counts for {len(existing_thread_post_counts)} existing threads in the database.")
         return existing_thread_post_counts
     except sqlite3.Error as e:
         print(f"[!] Database error: {e}")
         return {}
 
+def crawl_thread_data(workers=INDEX_WORKERS, rate=INDEX_RATE, stop_early=True):
+    """
+    Crawls every page of the section's index instead of the first one. With `stop_early`,
+    stops at the first page whose threads are all up to date in the database.
+    """
+    conn = None
+    is_current = None
+    if stop_early and os.path.exists(DB_PATH):
+        conn = sqlite3.connect(DB_PATH)
+        migrate(conn)
+
+        def is_current(page):
+            known = lookup_post_counts(conn, page)
+            return all(thread_id in known and post_count <= known[thread_id]
+                       for thread_id, post_count in page.items())
+    try:
+        return crawl_index([FORUM_SECTION], workers=workers, rate=rate, is_current=is_current)
+    finally:
+        if conn:
+            conn.close()
+
 def main():
     """Main function to sync the board."""
-    html_content = fetch_index_page()
-    if not html_content:
+    args = sys.argv[1:]
+    try:
+        crawl = pop_flag(args, "--crawl")
+        stop_early = not pop_flag(args, "--all")
+        workers = pop_option(args, "--workers", int, INDEX_WORKERS)
+        rate = pop_option(args, "--rate", float, INDEX_RATE)
+        daemon = pop_flag(args, "--daemon")
+        min_interval = pop_option(args, "--min-interval", float, DAEMON_MIN_INTERVAL)
+        max_interval = pop_option(args, "--max-interval", float, DAEMON_MAX_INTERVAL)
+        health_path = pop_option(args, "--health", default=DAEMON_HEALTH_PATH)
+        report_path, prometheus_path = metrics.pop_metrics_options(args)
+    except ValueError as e:
+        print(f"Error: {e}")
         return
+    try:
+        if daemon:
+            from sync_daemon import SyncDaemon
+            SyncDaemon(crawl=crawl, index_workers=workers, index_rate=rate, min_interval=min_interval,
+                       max_interval=max_interval, health_path=health_path).run()
+        else:
+            sync(crawl, stop_early, workers, rate)
+    finally:
+        metrics.finish(report_path, prometheus_path)
 
-    online_thread_data = parse_thread_data(html_content)
+def sync(crawl, stop_early, workers, rate):
+    """Finds new or grown threads on the index and runs them through the pipeline."""
+    if crawl:
+        online_thread_data = crawl_thread_data(workers, rate, stop_early)
+    else:
+        html_content = fetch_index_page()
+        if not html_content:
+            return
+        online_thread_data = parse_thread_data(html_content)
     if not online_thread_data:
         print("No thread data found on the index page. Exiting.")
         return
 
-    existing_thread_post_counts = get_existing_thread_post_counts()
-    
+    existing_thread_post_counts = get_existing_thread_post_counts(online_thread_data)
+    sorted_threads = threads_to_sync(online_thread_data, existing_thread_post_counts)
+
+    if sorted_threads:
+        print(f"Processing {len(sorted_threads)} threads (new or updated)...")
+        from pipeline import run_pipeline
+        run_pipeline(sorted_threads, refresh=True, tail=True)
+    else:
+        print("No new or updated threads found on the index page.")
+
+def threads_to_sync(online_thread_data, existing_thread_post_counts):
+    """Sorted IDs of the threads that are new or have more posts online than in the database."""
     threads_to_process = set()
 
     for thread_id, online_post_count in online_thread_data.items():
@@ -103,12 +162,7 @@ def main():
                 threads_to_process.add(thread_id)
             # else: print(f"Thread {thread_id} is up to date.") # Optional: for verbose logging
 
-    if threads_to_process:
-        sorted_threads = sorted(list(threads_to_process))
-        print(f"Processing {len(sorted_threads)} threads (new or updated)...")
-        run_pipeline(sorted_threads)
-    else:
-        print("No new or updated threads found on the index page.")
+    return sorted(threads_to_process)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,184 @@
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from config import (
+    FORUM_DB_PATH, METADATA_DB_PATH, RAW_DB_PATH, DOWNLOAD_WORKERS, DOWNLOAD_RATE, INDEX_WORKERS, INDEX_RATE,
+    DAEMON_MIN_INTERVAL, DAEMON_MAX_INTERVAL, DAEMON_BACKOFF, DAEMON_MAINTENANCE_INTERVAL, DAEMON_HEALTH_PATH,
+)
+from http_client import Fetcher
+from inserter.db_inserter import connect_db
+from pipeline import run_pipeline
+from sync_board import FORUM_INDEX_URL, parse_thread_data, lookup_post_counts, crawl_thread_data, threads_to_sync
+import metrics
+
+# sync_board.py --daemon: one long-running process instead of a daily cron job.
+#
+# Each poll reads the first index page and runs the threads that are new or grew through the
+# pipeline, in this process, over one HTTP session and one forum.db connection kept for the
+# daemon's lifetime. The sync lookup, the tail lookup and the inserts all use that connection,
+# so a poll neither reopens forum.db nor re-runs its migrations (extra --processes workers
+# still open their own). A poll that finds work resets the wait to `min_interval`; each quiet
+# or failed poll multiplies it by `backoff`, up to `max_interval`. Every `maintenance_interval`
+# forum.db gets PRAGMA optimize and every WAL database a TRUNCATE checkpoint, so the -wal
+# files a long-lived writer leaves behind do not keep growing.
+#
+# SIGTERM or SIGINT stops the daemon once the current poll is done; a second one interrupts
+# the poll (the job queue keeps its progress for pipeline.py --resume). The state is written
+# to `health_path` as JSON after every poll and state change.
+
+WAL_DATABASES = (FORUM_DB_PATH, METADATA_DB_PATH, RAW_DB_PATH)
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class SyncDaemon:
+    def __init__(self, crawl=False, index_workers=INDEX_WORKERS, index_rate=INDEX_RATE,
+                 workers=DOWNLOAD_WORKERS, rate=DOWNLOAD_RATE, min_interval=DAEMON_MIN_INTERVAL,
+                 max_interval=DAEMON_MAX_INTERVAL, backoff=DAEMON_BACKOFF,
+                 maintenance_interval=DAEMON_MAINTENANCE_INTERVAL, health_path=DAEMON_HEALTH_PATH,
+                 pipeline_options=None):
+        self.crawl = crawl
+        self.index_workers = index_workers
+        self.index_rate = index_rate
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.maintenance_interval = maintenance_interval
+        self.health_path = health_path
+        self.pipeline_options = dict(pipeline_options or {})
+        self.fetcher = Fetcher(rate=rate, pool_size=workers)
+        self.conn = connect_db(FORUM_DB_PATH)
+        self.stop = threading.Event()
+        self.interval = min_interval
+        self.last_maintenance = time.monotonic()
+        self.health = {
+            "pid": os.getpid(), "status": "starting", "started": _now(), "updated": None,
+            "polls": 0, "active_polls": 0, "errors": 0, "consecutive_errors": 0, "last_error": None,
+            "last_poll": None, "last_poll_seconds": None, "last_change": None, "threads_synced": 0,
+            "interval": self.interval, "next_poll": None, "maintenance_runs": 0, "last_maintenance": None,
+            "checkpoints": {},
+        }
+
+    def write_health(self, **changes):
+        """Updates the health record and rewrites the health file atomically."""
+        self.health.update(changes, updated=_now())
+        if not self.health_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.health_path)), exist_ok=True)
+        tmp_path = f"{self.health_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.health, f, indent=2)
+        os.replace(tmp_path, self.health_path)
+
+    @metrics.timed("index")
+    def fetch_index(self):
+        """The first index page, fetched over the daemon's session."""
+        response = self.fetcher.get(FORUM_INDEX_URL)
+        if response.status_code != 200:
+            raise RuntimeError(f"index page returned status {response.status_code}")
+        return response.text
+
+    def poll(self, crawl=False):
+        """Finds new or grown threads and runs them through the pipeline. Returns how many there were."""
+        if crawl:
+            online_thread_data = crawl_thread_data(self.index_workers, self.index_rate)
+        else:
+            online_thread_data = parse_thread_data(self.fetch_index())
+        if not online_thread_data:
+            raise RuntimeError("no threads found on the index page")
+        existing = lookup_post_counts(self.conn, online_thread_data)
+        thread_ids = threads_to_sync(online_thread_data, existing)
+        if thread_ids:
+            print(f"Processing {len(thread_ids)} threads (new or updated)...")
+            self.write_health(status="syncing")
+            run_pipeline(thread_ids, refresh=True, tail=True, workers=self.workers, fetcher=self.fetcher,
+                         conn=self.conn, **self.pipeline_options)
+        return len(thread_ids)
+
+    def maintain(self):
+        """PRAGMA optimize on forum.db, then a TRUNCATE checkpoint of each WAL database."""
+        self.conn.execute("PRAGMA optimize")
+        checkpoints = {}
+        for path in WAL_DATABASES:
+            if not os.path.exists(path):
+                continue
+            conn = self.conn if path == FORUM_DB_PATH else sqlite3.connect(path, timeout=60)
+            try:
+                busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            finally:
+                if conn is not self.conn:
+                    conn.close()
+            checkpoints[os.path.basename(path)] = {"busy": bool(busy), "wal_pages": wal_pages,
+                                                   "checkpointed": checkpointed}
+        self.last_maintenance = time.monotonic()
+        self.write_health(maintenance_runs=self.health["maintenance_runs"] + 1, last_maintenance=_now(),
+                          checkpoints=checkpoints)
+        print(f"[✓] Maintenance: optimized forum.db, checkpointed {', '.join(checkpoints) or 'nothing'}")
+
+    def next_interval(self, changed):
+        if changed:
+            return self.min_interval
+        return min(self.max_interval, self.interval * self.backoff)
+
+    def handle_signal(self, signum, frame):
+        if self.stop.is_set():
+            raise KeyboardInterrupt
+        print(f"\n[=] {signal.Signals(signum).name} received, stopping after the current poll")
+        self.stop.set()
+
+    def run(self):
+        """Polls until a signal or `stop` is set. Must run on the main thread to receive signals."""
+        handlers = {signum: signal.signal(signum, self.handle_signal) for signum in (signal.SIGTERM, signal.SIGINT)}
+        print(f"[✓] Sync daemon started (pid {os.getpid()}), polling every {self.min_interval:g}-"
+              f"{self.max_interval:g}s")
+        crawl = self.crawl
+        try:
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                self.write_health(status="polling")
+                try:
+                    changed = self.poll(crawl)
+                    crawl = False
+                except Exception as e:
+                    changed = 0
+                    print(f"[!] Poll failed: {e}")
+                    metrics.count("daemon.errors")
+                    self.write_health(errors=self.health["errors"] + 1,
+                                      consecutive_errors=self.health["consecutive_errors"] + 1,
+                                      last_error=f"{type(e).__name__}: {e}")
+                else:
+                    self.write_health(consecutive_errors=0)
+                    if changed:
+                        self.write_health(active_polls=self.health["active_polls"] + 1, last_change=_now(),
+                                          threads_synced=self.health["threads_synced"] + changed)
+                elapsed = time.perf_counter() - start
+                metrics.count("daemon.polls")
+                self.interval = self.next_interval(changed)
+                if time.monotonic() - self.last_maintenance >= self.maintenance_interval:
+                    try:
+                        self.maintain()
+                    except sqlite3.Error as e:
+                        print(f"[!] Maintenance failed: {e}")
+                next_poll = datetime.now() + timedelta(seconds=self.interval)
+                self.write_health(status="stopping" if self.stop.is_set() else "idle", polls=self.health["polls"] + 1, last_poll=_now(),
+                                  last_poll_seconds=round(elapsed, 4), interval=self.interval,
+                                  next_poll=next_poll.isoformat(timespec="seconds"))
+                self.stop.wait(self.interval)
+        except KeyboardInterrupt:
+            print("[!] Interrupted during a poll; pipeline.py --resume picks up its threads")
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self.close()
+            self.write_health(status="stopped", next_poll=None)
+            print("[✓] Sync daemon stopped")
+
+    def close(self):
+        self.fetcher.close()
+        self.conn.close()
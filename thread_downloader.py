@@ -4,71 +4,148 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import requests
-import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from config import HTML_RAW_DIR, FORUM_BASE_URL, FORUM_SECTION, LOG_FILE_PATH, FORCE_DOWNLOAD
+from config import (
+    FORUM_BASE_URL, FORUM_SECTION, LOG_FILE_PATH, FORCE_DOWNLOAD,
+    DOWNLOAD_WORKERS, DOWNLOAD_RATE,
+)
+from http_client import Fetcher
+from fetch_state import get_store, content_hash
+from raw_store import get_raw_store
+import metrics
+from cli_args import pop_option, pop_flag
 
-# Ensure HTML output directory exists
-os.makedirs(HTML_RAW_DIR, exist_ok=True)
-
-# Logger setup
 logger = logging.getLogger("ThreadDownloader")
 logger.setLevel(logging.INFO)
-file_handler = logging.FileHandler(LOG_FILE_PATH)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+_logger_lock = threading.Lock()
+
+def setup_logging():
+    """Attaches the log file on first download, so importing this module touches no files."""
+    with _logger_lock:
+        if logger.handlers:
+            return
+        os.makedirs(os.path.dirname(LOG_FILE_PATH), exist_ok=True)
+        file_handler = logging.FileHandler(LOG_FILE_PATH)
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
 
-def construct_thread_url(thread_id):
-    return f"{FORUM_BASE_URL}?id={FORUM_SECTION}&thread={thread_id}"
+def construct_thread_url(thread_id, base_url=FORUM_BASE_URL):
+    return f"{base_url}?id={FORUM_SECTION}&thread={thread_id}"
 
-def download_thread(thread_id):
-    url = construct_thread_url(thread_id)
-    output_path = os.path.join(HTML_RAW_DIR, f"thread_{thread_id}.html")
+@metrics.timed("download")
+def download_thread(thread_id, fetcher=None, base_url=FORUM_BASE_URL, refresh=False):
+    """
+    Downloads one thread. Existing files are skipped unless `refresh` or FORCE_DOWNLOAD is set;
+    a refresh sends the stored ETag/Last-Modified and treats a 304 or identical content as no work.
+    """
+    setup_logging()
+    url = construct_thread_url(thread_id, base_url)
+    raw_store = get_raw_store()
+    exists = raw_store.has(thread_id)
 
-    if os.path.exists(output_path) and not FORCE_DOWNLOAD:
+    if exists and not (FORCE_DOWNLOAD or refresh):
         logger.info(f"Skipping download for thread {thread_id}: File already exists and FORCE_DOWNLOAD is False.")
+        metrics.count("download.skipped")
         return True
 
+    if fetcher is None:
+        fetcher = Fetcher()
+
+    store = get_store()
+    state = store.get(thread_id) if exists else None
+    headers = {}
+    if state and not FORCE_DOWNLOAD:
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+
     try:
-        response = requests.get(url, timeout=30)
-        if response.status_code == 200:
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(response.text)
-            logger.info(f"Downloaded thread {thread_id}")
+        response = fetcher.get(url, headers=headers or None)
+        if response.status_code == 304:
+            store.touch(thread_id)
+            metrics.count("download.not_modified")
+            logger.info(f"Thread {thread_id} not modified")
+            return True
+        elif response.status_code == 200:
+            html = response.text
+            digest = content_hash(html)
+            changed = not (state and state["content_hash"] == digest)
+            metrics.count("download.bytes", len(response.content))
+            metrics.count("download.changed" if changed else "download.unchanged")
+            if changed:
+                raw_store.put(thread_id, html, digest)
+                logger.info(f"Downloaded thread {thread_id}")
+            else:
+                logger.info(f"Thread {thread_id} unchanged since last fetch")
+            store.record_fetch(thread_id, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                               digest, len(response.content), changed)
             return True
         else:
             logger.warning(f"Thread {thread_id} returned status {response.status_code}")
+            metrics.count("download.failed")
             return False
     except Exception as e:
         logger.error(f"Failed to download thread {thread_id}: {e}")
+        metrics.count("download.failed")
         return False
 
-def download_threads(thread_ids):
+def download_threads(thread_ids, workers=DOWNLOAD_WORKERS, rate=DOWNLOAD_RATE, base_url=FORUM_BASE_URL, refresh=False,
+                     fetcher=None):
     """
-    Downloads a list of threads.
+    Downloads a list of threads, `workers` at a time, sharing one rate-limited session.
+    A long-lived `fetcher` (whose own rate limit then applies) is used and left open.
+    Returns {thread_id: success}.
     """
     print(f"Downloading {len(thread_ids)} threads...")
-    for thread_id in thread_ids:
+    setup_logging()
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = Fetcher(rate=rate, pool_size=workers)
+    retries = fetcher.retry_count
+
+    def fetch(thread_id):
         logger.info(f"Fetching thread {thread_id}")
-        download_thread(thread_id)
-        time.sleep(1.0)  # Avoid hammering the site
-    print("Download complete.")
+        return download_thread(thread_id, fetcher, base_url, refresh)
+
+    try:
+        if workers <= 1:
+            results = [fetch(thread_id) for thread_id in thread_ids]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(fetch, thread_ids))
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    print(f"Download complete. {sum(results)}/{len(results)} succeeded, {fetcher.retry_count - retries} retries.")
+    return dict(zip(thread_ids, results))
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python thread_downloader.py <id1> <id2> ...")
+    args = sys.argv[1:]
+    try:
+        workers = pop_option(args, "--workers", int, DOWNLOAD_WORKERS)
+        rate = pop_option(args, "--rate", float, DOWNLOAD_RATE)
+        refresh = pop_flag(args, "--refresh")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    if not args:
+        print("Usage: python thread_downloader.py [--workers N] [--rate R] [--refresh] <id1> <id2> ...")
         return
 
     try:
-        thread_ids = [int(arg) for arg in sys.argv[1:]]
+        thread_ids = [int(arg) for arg in args]
     except ValueError:
         print("Error: Thread IDs must be integers.")
         return
 
-    download_threads(thread_ids)
+    download_threads(thread_ids, workers=workers, rate=rate, refresh=refresh)
 
 if __name__ == "__main__":
     main()
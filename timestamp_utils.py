@@ -1,5 +1,15 @@
 import re
-from datetime import datetime
+from datetime import datetime, date
+from functools import lru_cache
+
+EARLIEST_YEAR = 2008
+
+MONTHS = {name: number for number, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# The board's own format, e.g. 'Mar 19 14:16:08'. Anything else goes through infer_year_slow.
+POST_DATE_PATTERN = re.compile(r"([A-Z][a-z]{2}) ([0-9]{1,2}) ([0-9]{2}):([0-9]{2}):([0-9]{2})")
 
 def get_anchor_date(html: str) -> datetime:
     """
@@ -12,12 +22,12 @@ def get_anchor_date(html: str) -> datetime:
     dow, month, day, time_str, year = match.groups()
     return datetime.strptime(f"{month} {day} {year} {time_str}", "%b %d %Y %H:%M:%S")
 
-def infer_year(anchor: datetime, post_dow: str, post_date_str: str) -> datetime:
+def infer_year_slow(anchor: datetime, post_dow: str, post_date_str: str) -> datetime:
     """
     Given the anchor date, post weekday (abbr like 'Wed'), and a string like 'Mar 19 14:16:08',
     infer the full datetime by matching against the anchor.
     """
-    for year in reversed(range(2008, anchor.year + 1)):
+    for year in reversed(range(EARLIEST_YEAR, anchor.year + 1)):
         try:
             dt = datetime.strptime(f"{post_date_str} {year}", "%b %d %H:%M:%S %Y")
             if dt.strftime("%a") == post_dow and dt <= anchor:
@@ -25,3 +35,52 @@ def infer_year(anchor: datetime, post_dow: str, post_date_str: str) -> datetime:
         except ValueError:
             continue
     raise ValueError(f"No matching year for {post_dow}, {post_date_str}")
+
+@lru_cache(maxsize=64)
+def year_table(anchor_year):
+    """
+    {(month, day, weekday): candidate years, newest first} for every date from
+    EARLIEST_YEAR up to `anchor_year`. Feb 29 only appears under leap years.
+    """
+    table = {}
+    for year in range(anchor_year, EARLIEST_YEAR - 1, -1):
+        ordinal = date(year, 1, 1).toordinal()
+        end = date(year, 12, 31).toordinal()
+        while ordinal <= end:
+            day = date.fromordinal(ordinal)
+            table.setdefault((day.month, day.day, WEEKDAYS[day.weekday()]), []).append(year)
+            ordinal += 1
+    return {key: tuple(years) for key, years in table.items()}
+
+@lru_cache(maxsize=65536)
+def infer_year(anchor: datetime, post_dow: str, post_date_str: str) -> datetime:
+    """
+    Same result as infer_year_slow, from a per-anchor-year lookup table. Memoized on
+    (anchor, weekday, date string); strings not in the board's format take the slow path.
+    """
+    match = POST_DATE_PATTERN.fullmatch(post_date_str)
+    month = MONTHS.get(match.group(1)) if match else None
+    if month is None:
+        return infer_year_slow(anchor, post_dow, post_date_str)
+    hour, minute, second = int(match.group(3)), int(match.group(4)), int(match.group(5))
+    if hour > 23 or minute > 59 or second > 59:
+        return infer_year_slow(anchor, post_dow, post_date_str)
+
+    for year in year_table(anchor.year).get((month, int(match.group(2)), post_dow), ()):
+        dt = datetime(year, month, int(match.group(2)), hour, minute, second)
+        if dt <= anchor:
+            return dt
+    raise ValueError(f"No matching year for {post_dow}, {post_date_str}")
+
+def infer_years(anchor: datetime, stamps):
+    """
+    Resolves a thread's post timestamps in one call: `stamps` is a list of (weekday, date
+    string) pairs. Returns a list of datetimes, with None where no year matches.
+    """
+    results = []
+    for post_dow, post_date_str in stamps:
+        try:
+            results.append(infer_year(anchor, post_dow, post_date_str))
+        except ValueError:
+            results.append(None)
+    return results